@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for telegram-mcp response parsers."""
+
+import random
+import timeit
+from src.parsers import parse_chat_list, parse_message_context, parse_message_list
+
+
+def make_chat_list(count: int) -> str:
+    """Synthetic list_chats response with one chat per line."""
+    types = ["group", "channel", "user"]
+    return "\n".join(
+        f"Chat ID: {2000000000 + i}, Title: Chat {i} / Team, Type: {types[i % 3]}"
+        for i in range(count)
+    )
+
+
+def make_message_list(count: int) -> str:
+    """Synthetic get_messages response with replies, pipes and multi-line bodies."""
+    rng = random.Random(42)
+    lines = []
+    for i in range(count):
+        msg_id = 100000 - i
+        reply = f" | reply to {msg_id - rng.randint(1, 50)}" if i % 4 == 0 else ""
+        lines.append(
+            f"ID: {msg_id} | Автор {i % 37} | Date: 2025-12-12 08:{i % 60:02d}:16+00:00{reply}"
+            f" | Message: сообщение {i} про релиз | деплой"
+        )
+        if i % 5 == 0:
+            lines.append("продолжение сообщения на второй строке")
+            lines.append("и на третьей")
+    return "\n".join(lines)
+
+
+def make_message_context(count: int) -> str:
+    """Synthetic get_message_context response."""
+    lines = ["Context for message 50000 in chat -1002083014011:"]
+    for i in range(count):
+        lines.append(f"ID: {50000 + i} | Автор {i % 11} | 2025-12-12 08:03:16+00:00")
+        lines.append(f"полный текст сообщения {i}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def legacy_parse_message_list(text: str) -> list:
+    """Line-splitting parser the client used before src/parsers.py."""
+    messages = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line and line.startswith('ID:') and '|' in line:
+            parts = line.split(" | ")
+            if len(parts) >= 4:
+                messages.append({
+                    "id": parts[0].replace("ID: ", "").strip(),
+                    "author": parts[1].strip(),
+                    "date": parts[2].replace("Date: ", "").strip(),
+                    "text": " | ".join(parts[3:]).replace("Message: ", "").strip()
+                })
+    return messages
+
+
+def bench(name: str, func, text: str, repeat: int = 5, number: int = 3):
+    """Print the best time per call and the throughput in lines per second."""
+    line_count = text.count("\n") + 1
+    best = min(timeit.repeat(lambda: func(text), repeat=repeat, number=number)) / number
+    print(f"{name:<32} {line_count:>8} lines {best * 1000:>9.2f} ms {line_count / best:>12,.0f} lines/s")
+
+
+def main():
+    chat_list = make_chat_list(20000)
+    message_list = make_message_list(10000)
+    message_context = make_message_context(10000)
+
+    assert len(parse_chat_list(chat_list)) == 20000
+    assert len(parse_message_list(message_list)) == 10000
+    assert len(parse_message_context(message_context)) == 10000
+
+    print("Parser benchmarks (best of 5)")
+    bench("parse_chat_list", parse_chat_list, chat_list)
+    bench("parse_message_list", parse_message_list, message_list)
+    bench("legacy line-split messages", legacy_parse_message_list, message_list)
+    bench("parse_message_context", parse_message_context, message_context)
+
+
+if __name__ == "__main__":
+    main()
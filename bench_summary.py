@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Benchmarks for rendering large digests into Telegram-sized parts."""
+
+import random
+import timeit
+from src.summary import TELEGRAM_MAX_LENGTH, format_message_entry, split_summary, telegram_length
+
+
+def make_messages(count: int, emoji: bool = False, markup_share: float = 0.1) -> list:
+    """Synthetic processed messages; ``markup_share`` of them use Markdown and links."""
+    rng = random.Random(42)
+    words = ["релиз", "деплой", "сервис", "ок.", "завтра", "обновили"]
+    if emoji:
+        words += ["🚀", "🔥", "👍🏻", "🇷🇺"]
+    markup = ["**важно**", "`make test`", "[тикет](https://tracker.example/T-1)"]
+    messages = []
+    for i in range(count):
+        length = rng.choice([5, 20, 60, 200])
+        vocabulary = words + markup if rng.random() < markup_share else words
+        messages.append({
+            "id": 100000 + i,
+            "author": f"Автор {i % 37}",
+            "date": "2025-12-12T08:03:16+00:00",
+            "text": " ".join(rng.choice(vocabulary) for _ in range(length)),
+            "mentioned": i % 11 == 0,
+        })
+    return messages
+
+
+def legacy_split_summary(messages: list, title: str, max_length: int = 4000) -> list:
+    """Concatenating chunker used before parts were built from fragments."""
+    parts = []
+    current = f"{title}\n\n"
+    has_entries = False
+    for index, msg in enumerate(messages, 1):
+        entry = format_message_entry(msg, index)
+        if has_entries and len(current + entry) > max_length:
+            parts.append(current.strip())
+            current = f"{title} (продолжение)\n\n" + entry
+        else:
+            current += entry
+            has_entries = True
+    if has_entries:
+        parts.append(current.strip())
+    return parts
+
+
+def bench(name: str, func, messages: list, repeat: int = 5, number: int = 3):
+    """Print the best time per digest and the throughput in messages per second."""
+    best = min(timeit.repeat(lambda: func(messages, "Сводка"), repeat=repeat, number=number)) / number
+    print(f"{name:<32} {len(messages):>8} msgs {best * 1000:>9.2f} ms {len(messages) / best:>12,.0f} msgs/s")
+
+
+def main():
+    plain = make_messages(10000)
+    emoji = make_messages(10000, emoji=True)
+    markup = make_messages(10000, markup_share=1.0)
+    oversized = make_messages(200) + [{"id": 1, "author": "Бот", "date": "", "text": "длинный отчёт 🚀 " * 5000}]
+
+    for messages in (plain, emoji, markup, oversized):
+        assert all(telegram_length(part) <= TELEGRAM_MAX_LENGTH for part in split_summary(messages, "Сводка"))
+    # The legacy chunker counts code points, so emoji-heavy parts can exceed the limit
+    legacy_over = sum(telegram_length(part) > TELEGRAM_MAX_LENGTH for part in legacy_split_summary(oversized, "Сводка"))
+    print(f"Legacy parts over Telegram's limit in the oversized digest: {legacy_over}")
+
+    print("Summary chunking benchmarks (best of 5)")
+    bench("split_summary", split_summary, plain)
+    bench("legacy concatenation", legacy_split_summary, plain)
+    bench("split_summary, emoji", split_summary, emoji)
+    bench("legacy concatenation, emoji", legacy_split_summary, emoji)
+    bench("split_summary, all markup", split_summary, markup)
+    bench("legacy concatenation, all markup", legacy_split_summary, markup)
+    bench("split_summary, oversized", split_summary, oversized)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Prompts and LLM decision handling for message analysis."""
+
+import asyncio
+import json
+import logging
+import re
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from .json_stream import JsonStreamDecoder
+from .metrics import MESSAGES
+from . import tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+# Rough size of one token for mixed Russian/English chat text. Cyrillic
+# tokenizes denser than English, so this errs on the side of smaller batches.
+CHARS_PER_TOKEN = 2.5
+
+# Per-message overhead in a batch: the JSON wrapper around the input and the
+# {"id", "action", "mentioned"} envelope around the decision
+BATCH_ITEM_OVERHEAD_TOKENS = 30
+
+JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+# Called with the index of a message in the analyzed list and its decision
+DecisionCallback = Callable[[int, Dict[str, Any]], None]
+
+ANALYSIS_RULES = """1. ПЕРЕФРАЗИРОВАТЬ - если сообщение содержит полезную информацию (включая реакции на важные темы, планы, решения)
+2. ОТФИЛЬТРОВАТЬ - только если сообщение явно бесполезное (спам, одиночные эмодзи, "ок", "да", "+1")
+
+ВАЖНО:
+- Реакции на важные темы, обещания изучить что-то, планы встреч - это полезная информация, НЕ фильтруй их
+- "прод" = "продакшн" (production), не "продажа"
+- Сохраняй IT-терминологию: релиз, хотфикс, бэкенд, эндпоинт, аппрув и т.д.
+- Используй ТОЛЬКО русский язык, английский допустим только для устоявшихся IT-терминов (API, backend, frontend, deploy и т.д.)
+- Сохраняй английские слова из оригинального сообщения, но не добавляй новые английские слова
+- При перефразировании используй только русские слова: "впечатляющий" вместо "impressive", "отзыв" вместо "feedback"
+- ОБЯЗАТЕЛЬНО сохраняй все упоминания пользователей (@username) из оригинального сообщения
+- НЕ используй квадратные скобки [ ] в тексте - они мешают Markdown ссылкам"""
+
+
+def _custom_rules_text(custom_filter_rules: List[str]) -> str:
+    if not custom_filter_rules:
+        return ""
+    return "\n\nДОПОЛНИТЕЛЬНЫЕ ПРАВИЛА ФИЛЬТРАЦИИ:\n" + "\n".join(f"- {rule}" for rule in custom_filter_rules)
+
+
+def _mentions_text(user_mentions: List[str]) -> str:
+    return ", ".join(user_mentions) if user_mentions else "не указаны"
+
+
+def build_system_prompt(user_mentions: List[str], custom_filter_rules: List[str]) -> str:
+    """System prompt for analyzing one message per request."""
+    return f"""Ты анализируешь сообщения из IT-чата разработчиков. Для каждого сообщения выполни одно из действий:
+
+{ANALYSIS_RULES}{_custom_rules_text(custom_filter_rules)}
+
+ДОПОЛНИТЕЛЬНО: Определи, упомянут ли ТОЧНО текущий пользователь в сообщении.
+Текущий пользователь может быть упомянут как: {_mentions_text(user_mentions)}
+ВНИМАНИЕ: Ставь mentioned=true ТОЛЬКО если в тексте есть ТОЧНОЕ совпадение с одним из вариантов выше.
+
+Отвечай ТОЛЬКО в формате JSON:
+{{"action": "rephrase", "text": "исправленный текст", "mentioned": true/false}}
+или
+{{"action": "filter", "reason": "причина фильтрации", "mentioned": false}}
+
+Перефразируй на правильном русском языке, сохраняя смысл и IT-контекст."""
+
+
+def build_batch_system_prompt(user_mentions: List[str], custom_filter_rules: List[str]) -> str:
+    """System prompt for analyzing a JSON array of messages per request."""
+    return f"""Ты анализируешь сообщения из IT-чата разработчиков. На вход приходит JSON-массив сообщений вида {{"id": 1, "text": "...", "context": "..."}}, где context - сообщение, на которое отвечает автор (может отсутствовать). Для каждого сообщения выполни одно из действий:
+
+{ANALYSIS_RULES}{_custom_rules_text(custom_filter_rules)}
+
+ДОПОЛНИТЕЛЬНО: Для каждого сообщения определи, упомянут ли ТОЧНО текущий пользователь.
+Текущий пользователь может быть упомянут как: {_mentions_text(user_mentions)}
+ВНИМАНИЕ: Ставь mentioned=true ТОЛЬКО если в тексте есть ТОЧНОЕ совпадение с одним из вариантов выше.
+
+Анализируй каждое сообщение независимо, контекст используй только для понимания смысла.
+Отвечай ТОЛЬКО JSON-массивом, по одному элементу на каждое входное сообщение, с тем же id:
+[{{"id": 1, "action": "rephrase", "text": "исправленный текст", "mentioned": true/false}},
+ {{"id": 2, "action": "filter", "reason": "причина фильтрации", "mentioned": false}}]
+
+Перефразируй на правильном русском языке, сохраняя смысл и IT-контекст."""
+
+
+def build_user_content(msg: Dict[str, Any]) -> str:
+    """User message for single-message analysis."""
+    full_context = f"Сообщение: {msg.get('text', '')}"
+    if msg.get("context"):
+        full_context += f"\nКонтекст (на что отвечает): {msg['context']}"
+    return full_context
+
+
+def build_batch_user_content(messages: List[Dict[str, Any]]) -> str:
+    """User message for batch analysis, messages are numbered from 1."""
+    items = []
+    for index, msg in enumerate(messages, 1):
+        item = {"id": index, "text": msg.get("text", "")}
+        if msg.get("context"):
+            item["context"] = msg["context"]
+        items.append(item)
+    return json.dumps(items, ensure_ascii=False)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate without a tokenizer."""
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def message_tokens(msg: Dict[str, Any]) -> int:
+    """Estimated tokens one message adds to a batch request."""
+    return (
+        estimate_tokens(msg.get("text", ""))
+        + estimate_tokens(msg.get("context", ""))
+        + BATCH_ITEM_OVERHEAD_TOKENS
+    )
+
+
+def pack_batches(
+    messages: List[Dict[str, Any]],
+    token_budget: int,
+    max_batch_size: int = 30
+) -> List[List[Dict[str, Any]]]:
+    """Greedily pack messages, in order, into batches within the token budget.
+
+    A message that alone exceeds the budget gets a batch of its own.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+
+    for msg in messages:
+        tokens = message_tokens(msg)
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(msg)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_json_response(response: str) -> Any:
+    """Parse a JSON answer, tolerating a Markdown code fence around it."""
+    return json.loads(JSON_FENCE_RE.sub("", response.strip()))
+
+
+def apply_decision(msg: Dict[str, Any], analysis: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the processed message, or None if the LLM filtered it out."""
+    if analysis.get("action") == "rephrase":
+        processed_msg = msg.copy()
+        processed_msg["text"] = analysis["text"]
+        # Keep a mention already found by local matching
+        processed_msg["mentioned"] = bool(analysis.get("mentioned", False) or msg.get("mentioned", False))
+        return processed_msg
+
+    logger.debug("Filtered out: %s", analysis.get("reason", "No reason"))
+    return None
+
+
+def apply_decisions(
+    messages: List[Dict[str, Any]],
+    decisions: List[Optional[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Apply decisions in order, dropping filtered messages.
+
+    A missing decision (analysis failed) keeps the original message.
+    """
+    processed_messages = []
+    unanalyzed = 0
+    for msg, analysis in zip(messages, decisions):
+        if analysis is None:
+            processed_messages.append(msg)
+            unanalyzed += 1
+            continue
+        processed_msg = apply_decision(msg, analysis)
+        if processed_msg is not None:
+            processed_messages.append(processed_msg)
+    MESSAGES.inc(len(processed_messages) - unanalyzed, stage="rephrased")
+    MESSAGES.inc(len(messages) - len(processed_messages), stage="filtered")
+    MESSAGES.inc(unanalyzed, stage="unanalyzed")
+    return processed_messages
+
+
+def build_chat_messages(system_prompt: str, msg: Dict[str, Any]) -> List[BaseMessage]:
+    """LLM input for single-message analysis."""
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=build_user_content(msg))
+    ]
+
+
+def _is_decision(analysis: Any) -> bool:
+    """Whether a parsed answer is a usable decision for one message."""
+    if not isinstance(analysis, dict):
+        return False
+    if analysis.get("action") == "rephrase":
+        return isinstance(analysis.get("text"), str) and bool(analysis["text"].strip())
+    return True
+
+
+def _is_batch_decision(analysis: Any) -> bool:
+    return (
+        _is_decision(analysis)
+        and analysis.get("action") in ("rephrase", "filter")
+        and isinstance(analysis.get("id"), int)
+    )
+
+
+def _streams(llm: Any) -> bool:
+    """Whether to read the model's answers incrementally."""
+    return bool(getattr(llm, "streaming", False)) and hasattr(llm, "_astream")
+
+
+def _parse_decision(msg: Dict[str, Any], response: str) -> Dict[str, Any]:
+    """Parse the LLM answer for one message; raises if it is unusable."""
+    analysis = parse_json_response(response)
+
+    logger.debug("Message from %s: %.50s...", msg.get("author"), msg.get("text", ""))
+    logger.debug("AI decision: %s", analysis)
+
+    if not _is_decision(analysis):
+        raise ValueError(f"Unusable decision: {analysis}")
+    return analysis
+
+
+async def analyze_message(llm: Any, system_prompt: str, msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Analyze one message; raises if the LLM call or its answer is unusable.
+    
+    With a streaming model a "filter" verdict is returned as soon as it is
+    generated and the rest of the answer is not waited for.
+    """
+    chat_messages = build_chat_messages(system_prompt, msg)
+    with tracing.span("analyze_message", message_id=msg.get("id"), channel=msg.get("channel", "")) as span:
+        if not _streams(llm):
+            result = await llm._agenerate(chat_messages)
+            analysis = _parse_decision(msg, result.generations[0].message.content)
+            span.set_attribute("action", analysis["action"])
+            return analysis
+        
+        decoder = JsonStreamDecoder()
+        async with aclosing(llm._astream(chat_messages)) as stream:
+            async for chunk in stream:
+                decoder.feed(chunk.message.content)
+                if decoder.fields.get("action") == "filter":
+                    # The message is dropped whatever follows, stop generation
+                    analysis = {
+                        "action": "filter",
+                        "reason": decoder.fields.get("reason", "filter verdict streamed"),
+                        "mentioned": False
+                    }
+                    logger.debug("Message from %s: %.50s...", msg.get("author"), msg.get("text", ""))
+                    logger.debug("AI decision (early): %s", analysis)
+                    span.set_attributes(action="filter", early=True)
+                    return analysis
+        analysis = _parse_decision(msg, decoder.text)
+        span.set_attribute("action", analysis["action"])
+        return analysis
+
+
+async def analyze_message_safe(llm: Any, system_prompt: str, msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Analyze one message, returning None if analysis fails."""
+    try:
+        return await analyze_message(llm, system_prompt, msg)
+    except Exception as e:
+        logger.warning("Error analyzing message: %s", e)
+        return None
+
+
+async def analyze_messages_concurrently(
+    llm: Any,
+    system_prompt: str,
+    messages: List[Dict[str, Any]]
+) -> List[Optional[Dict[str, Any]]]:
+    """Analyze messages one per request, with the model's concurrency limit.
+
+    Returns one decision per input message, in order, or None for a message
+    whose request or answer failed.
+    """
+    if _streams(llm):
+        # The client's limiter caps requests in flight
+        return await asyncio.gather(*[
+            analyze_message_safe(llm, system_prompt, msg) for msg in messages
+        ])
+    
+    inputs = [build_chat_messages(system_prompt, msg) for msg in messages]
+    outputs = await llm.abatch(inputs, return_exceptions=True)
+
+    decisions = []
+    for msg, output in zip(messages, outputs):
+        try:
+            if isinstance(output, Exception):
+                raise output
+            decisions.append(_parse_decision(msg, output.content))
+        except Exception as e:
+            logger.warning("Error analyzing message: %s", e)
+            decisions.append(None)
+    return decisions
+
+
+async def iter_batch_decisions(
+    llm: Any,
+    batch_prompt: str,
+    messages: List[Dict[str, Any]]
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Yield ``(id, decision)`` pairs of a batch answer.
+
+    With a streaming model each element is yielded as soon as it has been
+    generated; otherwise all of them once the answer is complete. Unusable
+    elements are skipped.
+    """
+    chat_messages = [
+        SystemMessage(content=batch_prompt),
+        HumanMessage(content=build_batch_user_content(messages))
+    ]
+    # The answer repeats every message, so leave room for all of them
+    max_tokens = max(llm.max_tokens, sum(message_tokens(msg) for msg in messages) * 2)
+
+    if not _streams(llm):
+        result = await llm._agenerate(chat_messages, max_tokens=max_tokens)
+        parsed = parse_json_response(result.generations[0].message.content)
+        for analysis in parsed if isinstance(parsed, list) else []:
+            if _is_batch_decision(analysis):
+                yield analysis.pop("id"), analysis
+        return
+
+    decoder = JsonStreamDecoder()
+    async with aclosing(llm._astream(chat_messages, max_tokens=max_tokens)) as stream:
+        async for chunk in stream:
+            for analysis in decoder.feed(chunk.message.content):
+                if _is_batch_decision(analysis):
+                    yield analysis.pop("id"), analysis
+
+
+def _remapped(on_decision: Optional[DecisionCallback], indices: List[int]) -> Optional[DecisionCallback]:
+    """Callback for a sub-list of messages, reporting their indices in the full list."""
+    if on_decision is None:
+        return None
+    return lambda index, analysis: on_decision(indices[index], analysis)
+
+
+async def analyze_batch(
+    llm: Any,
+    batch_prompt: str,
+    single_prompt: str,
+    messages: List[Dict[str, Any]],
+    on_decision: Optional[DecisionCallback] = None
+) -> List[Optional[Dict[str, Any]]]:
+    """Analyze a batch of messages in one request.
+
+    Returns one decision per input message, in order, or None for a message
+    whose analysis failed. Messages the batch answer does not cover
+    (malformed or partial JSON) are retried in two halves, down to
+    single-message analysis. ``on_decision`` is called with each decision
+    as soon as it arrives, before the rest of the batch is done.
+    """
+    if len(messages) == 1:
+        analysis = await analyze_message_safe(llm, single_prompt, messages[0])
+        if analysis is not None and on_decision is not None:
+            on_decision(0, analysis)
+        return [analysis]
+
+    decisions: Dict[int, Dict[str, Any]] = {}
+    with tracing.span(
+        "analyze_batch", messages=len(messages), message_ids=[msg.get("id") for msg in messages]
+    ) as span:
+        try:
+            async for message_id, analysis in iter_batch_decisions(llm, batch_prompt, messages):
+                if message_id in decisions or not 1 <= message_id <= len(messages):
+                    continue
+                decisions[message_id] = analysis
+                if on_decision is not None:
+                    on_decision(message_id - 1, analysis)
+            logger.debug("Batch of %d messages: %d decisions", len(messages), len(decisions))
+        except Exception as e:
+            # Decisions streamed before the failure are kept
+            logger.warning(
+                "Error analyzing batch of %d messages after %d decisions: %s", len(messages), len(decisions), e
+            )
+            span.set_attribute("error", str(e))
+        span.set_attribute("decisions", len(decisions))
+
+    results: List[Optional[Dict[str, Any]]] = [decisions.get(index + 1) for index in range(len(messages))]
+    missing = [index for index, analysis in enumerate(results) if analysis is None]
+
+    if missing:
+        logger.info("Retrying %d messages missing from batch answer", len(missing))
+        retry_messages = [messages[index] for index in missing]
+        if len(missing) == len(messages):
+            # Nothing usable came back: split the batch
+            middle = len(retry_messages) // 2
+            retried = (
+                await analyze_batch(
+                    llm, batch_prompt, single_prompt, retry_messages[:middle],
+                    _remapped(on_decision, missing[:middle])
+                )
+                + await analyze_batch(
+                    llm, batch_prompt, single_prompt, retry_messages[middle:],
+                    _remapped(on_decision, missing[middle:])
+                )
+            )
+        else:
+            retried = await analyze_batch(
+                llm, batch_prompt, single_prompt, retry_messages, _remapped(on_decision, missing)
+            )
+        for index, analysis in zip(missing, retried):
+            results[index] = analysis
+
+    return results
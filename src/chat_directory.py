@@ -0,0 +1,197 @@
+"""Cached directory of Telegram chats known to telegram-mcp."""
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict, Union
+from .parsers import parse_chat_list
+from .paths import get_cache_dir
+from .metrics import CACHE_LOOKUPS
+
+
+logger = logging.getLogger(__name__)
+
+
+# Offset Telegram adds to supergroup/channel IDs in the "-100..." marked form
+CHANNEL_ID_OFFSET = 1000000000000
+
+
+class ChatEntry(TypedDict):
+    """One chat from the directory."""
+    id: int            # Bare ID as printed by list_chats
+    title: str
+    type: str          # Lower-cased type from list_chats (user, group, channel)
+    canonical_id: int  # Marked ID usable with every telegram-mcp tool
+
+
+def id_variants(chat_id: Union[int, str]) -> List[int]:
+    """Return the plain, negative and -100-prefixed forms of a chat ID."""
+    bare = bare_id(chat_id)
+    return [bare, -bare, -(CHANNEL_ID_OFFSET + bare)]
+
+
+def bare_id(chat_id: Union[int, str]) -> int:
+    """Strip the sign and the -100 channel prefix from a chat ID."""
+    value = abs(int(chat_id))
+    if value > CHANNEL_ID_OFFSET:
+        value -= CHANNEL_ID_OFFSET
+    return value
+
+
+def canonical_id(chat_id: Union[int, str], chat_type: str) -> int:
+    """Return the marked ID Telegram uses for a chat of the given type."""
+    bare = bare_id(chat_id)
+    if chat_type == "user":
+        return bare
+    # Groups listed by telegram-mcp are supergroups, which use the channel form
+    return -(CHANNEL_ID_OFFSET + bare)
+
+
+def build_entries(text: str) -> List[ChatEntry]:
+    """Turn a list_chats response into directory entries."""
+    return [
+        {
+            "id": bare_id(record["id"]),
+            "title": record["title"],
+            "type": record["type"],
+            "canonical_id": canonical_id(record["id"], record["type"]),
+        }
+        for record in parse_chat_list(text)
+    ]
+
+
+class ChatDirectory:
+    """Map chat titles and ID forms to canonical chat entries.
+
+    The directory is loaded from disk on first use, refreshed from
+    ``list_chats`` in the background once it is older than ``ttl_seconds``,
+    and refreshed in the foreground when a lookup misses.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        cache_path: Optional[Path] = None,
+        ttl_seconds: float = 3600.0,
+        list_limit: int = 1000,
+        min_refresh_interval: float = 30.0,
+    ):
+        self.client = client
+        self.cache_path = Path(cache_path) if cache_path else get_cache_dir() / "chats.json"
+        self.ttl_seconds = ttl_seconds
+        self.list_limit = list_limit
+        self.min_refresh_interval = min_refresh_interval
+
+        self._by_title: Dict[str, ChatEntry] = {}
+        self._by_id: Dict[int, ChatEntry] = {}
+        self._updated_at = 0.0
+        self._loaded = False
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self._updated_at > self.ttl_seconds
+
+    def _index(self, entries: List[ChatEntry], updated_at: float):
+        """Rebuild lookup tables from a list of entries."""
+        by_title = {}
+        by_id = {}
+        for entry in entries:
+            # Keep the first chat for duplicated titles, list_chats is ordered by activity
+            by_title.setdefault(entry["title"], entry)
+            by_title.setdefault(entry["title"].casefold(), entry)
+            by_id[entry["id"]] = entry
+        self._by_title = by_title
+        self._by_id = by_id
+        self._updated_at = updated_at
+
+    def _load(self):
+        """Load the persisted directory, if any."""
+        self._loaded = True
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            self._index(data.get("chats", []), data.get("updated_at", 0.0))
+            logger.debug("Loaded %d chats from %s", len(self._by_id), self.cache_path)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load chat directory cache: %s", e)
+
+    def _save(self):
+        """Persist the directory atomically."""
+        data = {"updated_at": self._updated_at, "chats": list(self._by_id.values())}
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, ensure_ascii=False)
+            tmp_path.replace(self.cache_path)
+        except OSError as e:
+            logger.warning("Could not save chat directory cache: %s", e)
+
+    async def refresh(self, force: bool = False) -> bool:
+        """Reload the directory from list_chats.
+
+        Refreshes are serialized; a non-forced refresh is skipped while the
+        directory is fresh, and any refresh is skipped if another one
+        finished less than ``min_refresh_interval`` seconds ago.
+        """
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+
+        async with self._refresh_lock:
+            age = time.time() - self._updated_at
+            if age < self.min_refresh_interval or (not force and not self.is_stale):
+                return False
+
+            result = await self.client.call_tool("list_chats", {"limit": self.list_limit})
+            if not result.content:
+                logger.warning("No content in list_chats result")
+                return False
+
+            entries = build_entries(result.content[0].text)
+            self._index(entries, time.time())
+            self._save()
+            logger.info("Chat directory refreshed: %d chats", len(entries))
+            return True
+
+    def _refresh_in_background(self):
+        """Start a background refresh unless one is already running."""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning("Background chat directory refresh failed: %s", e)
+
+    def lookup(self, chat: Union[int, str]) -> Optional[ChatEntry]:
+        """Find a chat by title or by any form of its ID without refreshing."""
+        if isinstance(chat, str):
+            entry = self._by_title.get(chat) or self._by_title.get(chat.casefold())
+            if entry or not chat.lstrip("-").isdigit():
+                return entry
+        return self._by_id.get(bare_id(chat))
+
+    async def resolve(self, chat: Union[int, str]) -> Optional[ChatEntry]:
+        """Resolve a title or chat ID, refreshing the directory on a miss."""
+        if not self._loaded:
+            self._load()
+
+        entry = self.lookup(chat)
+        if entry is not None:
+            CACHE_LOOKUPS.inc(cache="chat_directory", result="hit")
+            if self.is_stale:
+                self._refresh_in_background()
+            return entry
+
+        # Miss: the chat may be new or renamed, invalidate and retry once
+        CACHE_LOOKUPS.inc(cache="chat_directory", result="miss")
+        logger.info("Chat '%s' not in directory, refreshing", chat)
+        await self.refresh(force=True)
+        return self.lookup(chat)
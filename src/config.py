@@ -0,0 +1,176 @@
+"""Job configuration loaded from a TOML file."""
+
+import logging
+import os
+import tomllib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict
+from .prefilter import DEFAULT_PREFILTER_RULES, PrefilterRules
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_CONFIG_PATH = "config.toml"
+
+
+class JobConfig(TypedDict):
+    """One source -> target pipeline and its schedule."""
+    name: str
+    source_channels: List[str]
+    target_channel: str
+    time_period_minutes: Optional[int]  # None = from 8 AM MSK today
+    custom_filter_rules: List[str]
+    interval_minutes: float             # Used when no cron expression is set
+    cron: Optional[str]                 # "minute hour day month weekday"
+    overlap: str                        # "skip" or "coalesce"
+    jitter_seconds: float
+    run_immediately: bool
+    enabled: bool
+    analysis_mode: str
+    batch_token_budget: int
+    max_concurrent_fetches: int
+    streaming: bool
+    use_watermarks: bool
+    use_prefilter: bool
+    prefilter: PrefilterRules           # Overrides of DEFAULT_PREFILTER_RULES
+
+
+class BotConfig(TypedDict):
+    """Process-wide settings and the list of jobs."""
+    max_concurrent_jobs: int            # Job runs in progress at once
+    max_concurrent_llm_requests: int    # Shared by all jobs
+    llm_streaming: bool                 # Read LLM answers over SSE, decoding them incrementally
+    log_level: str                      # DEBUG, INFO, WARNING or ERROR
+    metrics_port: int                   # Serve /metrics on this port, 0 disables
+    metrics_host: str
+    metrics_textfile: str               # Also write metrics here after every run, "" disables
+    trace_file: str                     # Append trace spans of every run here as OTLP JSON lines, "" disables
+    jobs: List[JobConfig]
+
+
+JOB_DEFAULTS: Dict[str, Any] = {
+    "time_period_minutes": 10,
+    "custom_filter_rules": [],
+    "interval_minutes": 5,
+    "cron": None,
+    "overlap": "skip",
+    "jitter_seconds": 5,
+    "run_immediately": True,
+    "enabled": True,
+    "analysis_mode": "batch",
+    "batch_token_budget": 1500,
+    "max_concurrent_fetches": 5,
+    "streaming": False,
+    "use_watermarks": True,
+    "use_prefilter": True,
+    "prefilter": {},
+}
+
+BOT_DEFAULTS: Dict[str, Any] = {
+    "max_concurrent_jobs": 2,
+    "max_concurrent_llm_requests": 4,
+    "llm_streaming": True,
+    "log_level": "INFO",
+    "metrics_port": 0,
+    "metrics_host": "127.0.0.1",
+    "metrics_textfile": "",
+    "trace_file": "",
+}
+
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+# The single pipeline the bot ran before jobs were configurable
+DEFAULT_JOB: Dict[str, Any] = {
+    "name": "bitkogan-development",
+    "source_channels": ["BitKogan / Development"],
+    "target_channel": "infotest",
+    "custom_filter_rules": [
+        "Фильтровать сообщения с только эмодзи",
+        "Фильтровать односложные ответы типа 'да', 'нет', 'ок'"
+    ],
+}
+
+
+def _build_job(raw: Dict[str, Any], index: int) -> JobConfig:
+    """Apply defaults to one [[jobs]] table and validate it."""
+    unknown = set(raw) - set(JOB_DEFAULTS) - {"name", "source_channels", "target_channel"}
+    if unknown:
+        raise ValueError(f"Job #{index + 1}: unknown settings {sorted(unknown)}")
+
+    job = {**JOB_DEFAULTS, **raw}
+    job.setdefault("name", f"job-{index + 1}")
+    name = job["name"]
+
+    if not job.get("source_channels") or not isinstance(job["source_channels"], list):
+        raise ValueError(f"Job {name}: source_channels must be a non-empty list")
+    if not job.get("target_channel"):
+        raise ValueError(f"Job {name}: target_channel is required")
+    if job["overlap"] not in ("skip", "coalesce"):
+        raise ValueError(f"Job {name}: overlap must be 'skip' or 'coalesce'")
+    if job["analysis_mode"] not in ("batch", "single"):
+        raise ValueError(f"Job {name}: analysis_mode must be 'batch' or 'single'")
+    if not job["cron"] and job["interval_minutes"] <= 0:
+        raise ValueError(f"Job {name}: interval_minutes must be positive")
+    unknown_rules = set(job["prefilter"]) - set(DEFAULT_PREFILTER_RULES)
+    if unknown_rules:
+        raise ValueError(f"Job {name}: unknown prefilter rules {sorted(unknown_rules)}")
+    # TOML has no null, 0 keeps the "from 8 AM MSK" default reachable
+    if not job["time_period_minutes"]:
+        job["time_period_minutes"] = None
+
+    job["target_channel"] = str(job["target_channel"])
+    return job
+
+
+def parse_config(data: Dict[str, Any]) -> BotConfig:
+    """Build a validated config from parsed TOML."""
+    raw_jobs = data.get("jobs", [])
+    settings = {key: value for key, value in data.items() if key != "jobs"}
+    unknown = set(settings) - set(BOT_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown settings {sorted(unknown)}")
+    if "log_level" in settings:
+        settings["log_level"] = str(settings["log_level"]).upper()
+        if settings["log_level"] not in LOG_LEVELS:
+            raise ValueError(f"log_level must be one of {', '.join(LOG_LEVELS)}")
+
+    jobs = [_build_job(raw, index) for index, raw in enumerate(raw_jobs)]
+    names = [job["name"] for job in jobs]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate job names: {sorted(duplicates)}")
+
+    # Watermarks are kept per (source, target), two jobs sharing one would
+    # skip each other's messages
+    pairs = {}
+    for job in jobs:
+        if not job["enabled"] or not job["use_watermarks"]:
+            continue
+        for source in job["source_channels"]:
+            pair = (source, job["target_channel"])
+            if pair in pairs:
+                raise ValueError(
+                    f"Jobs {pairs[pair]} and {job['name']} both send {source} to {job['target_channel']}"
+                )
+            pairs[pair] = job["name"]
+
+    return {**BOT_DEFAULTS, **settings, "jobs": jobs}
+
+
+def load_config(path: Optional[str] = None) -> BotConfig:
+    """Load the config from ``path``, $BOT_CONFIG or ./config.toml.
+
+    Without a config file the bot runs its original single job.
+    """
+    config_path = Path(path or os.getenv("BOT_CONFIG") or DEFAULT_CONFIG_PATH).expanduser()
+    if not config_path.exists():
+        if path:
+            raise FileNotFoundError(f"Config file {config_path} not found")
+        logger.info("%s not found, using the default job", config_path)
+        return parse_config({"jobs": [DEFAULT_JOB]})
+
+    with open(config_path, "rb") as f:
+        config = parse_config(tomllib.load(f))
+    logger.info("Loaded %d jobs from %s", len(config["jobs"]), config_path)
+    return config
@@ -0,0 +1,129 @@
+"""Full-text hydration of messages truncated by list_messages/get_messages."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypedDict
+from .parsers import MessageRecord
+
+
+logger = logging.getLogger(__name__)
+
+
+# list_messages cuts long texts, marking the cut with an ellipsis;
+# get_messages returns full texts
+TRUNCATION_MARKERS = ("...", "…")
+
+
+class ContextWindow(TypedDict):
+    """One get_message_context call covering a run of message IDs."""
+    message_id: int    # Center of the window
+    context_size: int  # Messages fetched on each side of the center
+    ids: List[int]     # Requested IDs the window is guaranteed to cover
+
+
+class HydrationStats(TypedDict):
+    requested: int  # Messages that looked truncated
+    hydrated: int   # Messages whose full text was found
+    missing: int    # Messages no window returned (deleted, or text-less)
+    calls: int      # get_message_context calls made
+    failed_calls: int
+
+
+def looks_truncated(text: str, min_length: Optional[int] = None) -> bool:
+    """Whether a listed message text ends with a truncation marker.
+
+    With ``min_length``, texts at least that long count as truncated too,
+    for a server that cuts at a known length without a marker.
+    """
+    text = text.rstrip()
+    return text.endswith(TRUNCATION_MARKERS) or (min_length is not None and len(text) >= min_length)
+
+
+def plan_windows(message_ids: List[int], radius: int) -> List[ContextWindow]:
+    """Cover every ID with the fewest context windows of at most ``radius``.
+
+    get_message_context returns ``context_size`` messages on each side of the
+    center by count. Every existing message has its own ID, so a window
+    always covers at least the ID range ``[center - size, center + size]``
+    however sparse the IDs are. Windows are centered on requested IDs, which
+    are known to exist: the greedy choice is the highest ID still within
+    ``radius`` of the lowest uncovered one, and each window is then shrunk
+    to just span the IDs it covers.
+    """
+    windows = []
+    ids = sorted(set(message_ids))
+    i = 0
+    while i < len(ids):
+        first = ids[i]
+        center_index = i
+        while center_index + 1 < len(ids) and ids[center_index + 1] - first <= radius:
+            center_index += 1
+        center = ids[center_index]
+        j = center_index
+        while j + 1 < len(ids) and ids[j + 1] - center <= radius:
+            j += 1
+        last = ids[j]
+        windows.append({
+            "message_id": center,
+            "context_size": max(1, center - first, last - center),
+            "ids": ids[i:j + 1],
+        })
+        i = j + 1
+    return windows
+
+
+async def hydrate_messages(
+    fetch_context: Callable[[int, int], Awaitable[Dict[str, MessageRecord]]],
+    messages: List[Dict[str, Any]],
+    radius: int = 20,
+    max_concurrent: int = 3,
+    min_length: Optional[int] = None,
+) -> HydrationStats:
+    """Replace truncated message texts with full ones, in place.
+
+    ``fetch_context(message_id, context_size)`` returns the records of one
+    get_message_context call keyed by message ID. Only messages that look
+    truncated are requested, the planned windows run concurrently, at most
+    ``max_concurrent`` at a time, and a failing window only leaves its own
+    messages with the listed text.
+    """
+    targets = {
+        int(msg["id"]): msg
+        for msg in messages
+        if str(msg.get("id", "")).isdigit() and looks_truncated(msg.get("text", ""), min_length)
+    }
+    stats: HydrationStats = {
+        "requested": len(targets),
+        "hydrated": 0,
+        "missing": 0,
+        "calls": 0,
+        "failed_calls": 0,
+    }
+    if not targets:
+        return stats
+
+    windows = plan_windows(list(targets), radius)
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+    async def run_window(window: ContextWindow) -> Dict[str, MessageRecord]:
+        async with semaphore:
+            try:
+                return await fetch_context(window["message_id"], window["context_size"])
+            except Exception as e:
+                logger.warning("Context window around %s failed: %s", window["message_id"], e)
+                stats["failed_calls"] += 1
+                return {}
+
+    stats["calls"] = len(windows)
+    results = await asyncio.gather(*[run_window(window) for window in windows])
+
+    for window, records in zip(windows, results):
+        for message_id in window["ids"]:
+            record = records.get(str(message_id))
+            if record and record["text"]:
+                targets[message_id]["text"] = record["text"]
+                stats["hydrated"] += 1
+            else:
+                stats["missing"] += 1
+
+    return stats
@@ -0,0 +1,156 @@
+"""Cached identity of the Telegram account and mention matching."""
+
+import asyncio
+import json
+import logging
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from .paths import get_cache_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+# Endings dropped from names before matching inflected forms:
+# "Егор" -> "Егора", "Ирина" -> "Ирину", "Игорь" -> "Игоря"
+NAME_ENDINGS = "аяоеиыйьуюё"
+# Case endings added to a name stem ("Егор" -> "Егором", "Андрей" -> "Андреем")
+CASE_ENDINGS = (
+    "ом", "ем", "ём", "ой", "ей", "ою", "ею", "ым", "им",
+    "а", "я", "у", "ю", "ы", "и", "е", "ь", "й",
+)
+# Shorter stems inflect into ordinary words ("Лев" -> "левая", "Маша" ->
+# "машин"), such names only match as written
+MIN_STEM_LENGTH = 4
+
+_CASE_ENDINGS_PATTERN = "|".join(CASE_ENDINGS)
+
+
+def _name_pattern(name: str) -> str:
+    """Pattern for a name and its case forms, without word boundaries."""
+    stem = name[:-1] if name[-1].lower() in NAME_ENDINGS else name
+    if len(stem) < MIN_STEM_LENGTH:
+        return re.escape(name)
+    return rf"(?:{re.escape(name)}|{re.escape(stem)}(?:{_CASE_ENDINGS_PATTERN})?)"
+
+
+class MentionMatcher:
+    """Precompiled matcher for mentions of the current user.
+
+    Matches ``@username`` and the first, last and full name in any letter
+    case, always on whole words. Names with a stem of ``MIN_STEM_LENGTH``
+    letters or more also match in their case forms ("Егору", "Егором").
+    """
+
+    def __init__(self, user_info: Optional[Dict[str, Any]] = None):
+        user_info = user_info or {}
+        username = str(user_info.get("username") or "").lstrip("@")
+        first_name = str(user_info.get("first_name") or "").strip()
+        last_name = str(user_info.get("last_name") or "").strip()
+        full_name = str(user_info.get("name") or "").strip() or f"{first_name} {last_name}".strip()
+        if not first_name and full_name:
+            first_name = full_name.split()[0]
+
+        # Variants listed in the system prompt, as the analyze node always did
+        aliases = []
+        if username:
+            aliases.append(f"@{username}")
+        aliases.extend([first_name, full_name])
+        self.aliases: List[str] = list(dict.fromkeys(alias for alias in aliases if alias))
+
+        patterns = []
+        if username:
+            patterns.append(rf"@{re.escape(username)}(?!\w)")
+        names = {first_name, last_name}
+        if full_name != first_name:
+            names.update(full_name.split())
+        patterns.extend(
+            rf"(?<![\w@]){_name_pattern(name)}(?!\w)"
+            for name in sorted(names, key=len, reverse=True)
+            if name
+        )
+        self._pattern = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+
+    def __bool__(self) -> bool:
+        return self._pattern is not None
+
+    def matches(self, text: str) -> bool:
+        """Whether the text mentions the current user."""
+        return bool(self._pattern and text and self._pattern.search(text))
+
+
+class IdentityCache:
+    """The current account from get_me, cached in memory and on disk.
+
+    The account rarely changes, so it is only re-read from telegram-mcp
+    once older than ``ttl_seconds``; if that fails the stale identity is
+    still used.
+    """
+
+    def __init__(self, client: Any, cache_path: Optional[Path] = None, ttl_seconds: float = 7 * 24 * 3600):
+        self.client = client
+        self.cache_path = Path(cache_path) if cache_path else get_cache_dir() / "identity.json"
+        self.ttl_seconds = ttl_seconds
+        self._user_info: Dict[str, Any] = {}
+        self._updated_at = 0.0
+        self._loaded = False
+        self._lock: Optional[asyncio.Lock] = None
+        self._matcher: Optional[MentionMatcher] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() - self._updated_at > self.ttl_seconds
+
+    def _load(self):
+        """Load the persisted identity, if any."""
+        self._loaded = True
+        if not self.cache_path.exists():
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+            self._user_info = data.get("user", {})
+            self._updated_at = data.get("updated_at", 0.0)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load identity cache: %s", e)
+
+    def _save(self):
+        """Persist the identity atomically."""
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"updated_at": self._updated_at, "user": self._user_info}, f, ensure_ascii=False)
+            tmp_path.replace(self.cache_path)
+        except OSError as e:
+            logger.warning("Could not save identity cache: %s", e)
+
+    async def get(self) -> Dict[str, Any]:
+        """Return the current user's info, calling get_me only when stale."""
+        if not self._loaded:
+            self._load()
+        if self._user_info and not self.is_stale:
+            return self._user_info
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._user_info and not self.is_stale:
+                return self._user_info
+            user_info = await self.client.get_current_user()
+            if user_info:
+                self._user_info = user_info
+                self._updated_at = time.time()
+                self._matcher = None
+                self._save()
+            elif self._user_info:
+                logger.warning("get_me failed, using cached identity")
+        return self._user_info
+
+    async def get_matcher(self) -> MentionMatcher:
+        """Mention matcher for the current user, compiled once per identity."""
+        user_info = await self.get()
+        if self._matcher is None:
+            self._matcher = MentionMatcher(user_info)
+        return self._matcher
@@ -0,0 +1,102 @@
+"""Incremental decoding of JSON answers streamed by the LLM."""
+
+import json
+from typing import Any, Dict, List, Optional
+
+
+class JsonStreamDecoder:
+    """Scan a JSON answer chunk by chunk without waiting for its end.
+
+    Text before the first ``[`` or ``{`` (such as a Markdown code fence) is
+    skipped. For an array answer ``feed`` returns every object element as
+    soon as its closing brace arrives. For an object answer the top-level
+    string fields are collected in ``fields`` as they complete, so a
+    decision can be acted on before the rest of the answer is generated.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self.root: Optional[str] = None  # "[" or "{" once the answer starts
+        self.fields: Dict[str, str] = {}
+        self.done = False
+
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._element_start = 0
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume the next chunk; returns the array elements it completed."""
+        self._buffer += chunk
+        completed = []
+        buffer = self._buffer
+
+        for pos in range(self._pos, len(buffer)):
+            if self.done:
+                break
+            char = buffer[pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self.root == "{":
+                        self._on_top_level_string(buffer[self._string_start:pos + 1])
+                continue
+
+            if self.root is None:
+                if char in "[{":
+                    self.root = char
+                    self._depth = 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char in "[{":
+                self._depth += 1
+                if self._depth == 2 and self.root == "[" and char == "{":
+                    self._element_start = pos
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 1 and self.root == "[" and char == "}":
+                    element = self._decode(buffer[self._element_start:pos + 1])
+                    if element is not None:
+                        completed.append(element)
+                elif self._depth == 0:
+                    self.done = True
+            elif self._depth == 1 and self.root == "{":
+                if char == ":":
+                    self._key = self._last_string
+                elif char == ",":
+                    self._key = None
+
+        self._pos = len(buffer)
+        return completed
+
+    def _on_top_level_string(self, literal: str):
+        value = self._decode(literal)
+        if self._key is not None:
+            self.fields[self._key] = value
+            self._key = None
+        else:
+            self._last_string = value
+
+    @staticmethod
+    def _decode(text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return self._buffer
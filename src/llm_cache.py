@@ -0,0 +1,146 @@
+"""Persistent cache of LLM analysis decisions."""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+from .metrics import count_cache_lookups
+from .paths import get_cache_dir
+
+
+class DecisionCache:
+    """SQLite-backed cache of per-message analysis decisions.
+
+    Entries are keyed by a hash of everything that determines the answer:
+    the system prompt (which embeds custom filter rules and mention aliases),
+    model name, temperature, message text and reply context. Entries older
+    than ``max_age_seconds`` are ignored and evicted; beyond ``max_entries``
+    the least recently used ones are dropped. ``enabled=False`` bypasses the
+    cache entirely.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: int = 50000,
+        max_age_seconds: float = 7 * 24 * 3600,
+        enabled: bool = True,
+    ):
+        self.path = Path(path) if path else get_cache_dir() / "llm_cache.sqlite3"
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS decisions (
+                    key TEXT PRIMARY KEY,
+                    decision TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS decisions_used_at ON decisions (used_at)")
+        return self._conn
+
+    @staticmethod
+    def make_key(
+        system_prompt: str,
+        model: str,
+        temperature: float,
+        text: str,
+        context: str = "",
+    ) -> str:
+        """Hash the inputs that determine a decision."""
+        payload = json.dumps(
+            [system_prompt, model, temperature, text, context or ""],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return cached decisions for the given keys, counting hits and misses."""
+        keys = list(keys)
+        if not self.enabled or not keys:
+            return {}
+
+        conn = self._connect()
+        now = time.time()
+        min_created = now - self.max_age_seconds
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, decision FROM decisions WHERE created_at >= ? AND key IN ({placeholders})",
+                [min_created, *chunk],
+            )
+            for key, decision in rows:
+                found[key] = json.loads(decision)
+
+        if found:
+            conn.executemany("UPDATE decisions SET used_at = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+
+        misses = len(set(keys)) - len(found)
+        self.hits += len(found)
+        self.misses += misses
+        count_cache_lookups("llm_decisions", len(found), misses)
+        return found
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, decisions: Dict[str, Dict[str, Any]]):
+        """Store decisions and evict expired or excess entries."""
+        if not self.enabled or not decisions:
+            return
+
+        conn = self._connect()
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO decisions (key, decision, created_at, used_at) VALUES (?, ?, ?, ?)",
+            [(key, json.dumps(decision, ensure_ascii=False), now, now) for key, decision in decisions.items()],
+        )
+        conn.commit()
+        self.evict()
+
+    def put(self, key: str, decision: Dict[str, Any]):
+        self.put_many({key: decision})
+
+    def evict(self):
+        """Drop entries past their age and the least recently used beyond the size limit."""
+        conn = self._connect()
+        conn.execute("DELETE FROM decisions WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        conn.execute(
+            """DELETE FROM decisions WHERE key IN (
+                SELECT key FROM decisions ORDER BY used_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+        conn.commit()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters since this cache object was created."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "enabled": self.enabled,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
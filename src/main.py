@@ -1,59 +1,152 @@
 """Main script for Telegram message processing bot."""
 
 import asyncio
-import schedule
-import time
-from datetime import datetime
+import logging
+import sys
+from typing import Optional
 from .workflow import run_processing_workflow
+from .telegram_mcp_client import TelegramMCPClient
+from .qwen_langchain import QwenChatModel
+from .llm_cache import DecisionCache
+from .watermarks import WatermarkStore
+from .outbox import Outbox, OutboxDrainer
+from .config import JobConfig, load_config
+from .metrics import REGISTRY, MetricsServer
+from .tracing import TRACER, span
+from .scheduler import AsyncScheduler, CronTrigger, IntervalTrigger
 
 
-async def process_and_send_messages():
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+
+def configure_logging(level: str = "INFO"):
+    """Log to stderr at ``level``; below it log calls return immediately."""
+    logging.basicConfig(format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(level if level == "DEBUG" else "WARNING")
+
+
+def write_metrics_textfile(path: str):
+    if not path:
+        return
+    try:
+        REGISTRY.write_textfile(path)
+    except OSError as e:
+        logger.warning("Could not write metrics to %s: %s", path, e)
+
+
+async def process_and_send_messages(
+    job: JobConfig,
+    telegram_client: TelegramMCPClient,
+    llm: QwenChatModel,
+    llm_cache: DecisionCache,
+    watermarks: WatermarkStore,
+    outbox: Outbox,
+    metrics_textfile: str = ""
+):
     """Process messages from Telegram channels and send results."""
-    print(f"\n{'='*60}")
-    print(f"Telegram Processing - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*60}")
-    
+    logger.info("Telegram Processing [%s] started", job["name"])
+
     try:
-        result = await run_processing_workflow(
-            source_channels=["BitKogan / Development"],
-            time_period_minutes=10,
-            target_channel="infotest",
-            custom_filter_rules=[
-                "Фильтровать сообщения с только эмодзи",
-                "Фильтровать односложные ответы типа 'да', 'нет', 'ок'"
-            ]
-        )
-        print(result)
+        with span("job", job=job["name"]):
+            result = await run_processing_workflow(
+                source_channels=job["source_channels"],
+                time_period_minutes=job["time_period_minutes"],
+                target_channel=job["target_channel"],
+                custom_filter_rules=job["custom_filter_rules"],
+                telegram_client=telegram_client,
+                max_concurrent_fetches=job["max_concurrent_fetches"],
+                analysis_mode=job["analysis_mode"],
+                batch_token_budget=job["batch_token_budget"],
+                llm=llm,
+                llm_cache=llm_cache,
+                watermarks=watermarks,
+                use_watermarks=job["use_watermarks"],
+                streaming=job["streaming"],
+                use_prefilter=job["use_prefilter"],
+                prefilter_rules=job["prefilter"],
+                outbox=outbox
+            )
+        logger.info("[%s] %s", job["name"], result)
     except Exception as e:
-        print(f"Error processing messages: {e}")
-    
-    print(f"{'='*60}\n")
+        logger.error("[%s] Error processing messages: %s", job["name"], e)
+    finally:
+        write_metrics_textfile(metrics_textfile)
+
+
+async def run_bot(config_path: Optional[str] = None):
+    """Run every configured job until SIGTERM/SIGINT."""
+    config = load_config(config_path)
+    configure_logging(config["log_level"])
+    TRACER.configure(config["trace_file"])
+
+    # Created inside the event loop and shared by every job and run, so the
+    # MCP session, chat directory, pooled Qwen connections and caches
+    # survive between ticks
+    telegram_client = TelegramMCPClient()
+    llm = QwenChatModel(
+        max_concurrency=config["max_concurrent_llm_requests"],
+        streaming=config["llm_streaming"]
+    )
+    llm_cache = DecisionCache()
+    watermarks = WatermarkStore()
+    # Summary parts that failed to send, including in earlier processes,
+    # are retried from here without new LLM calls
+    outbox = Outbox()
+    drainer = OutboxDrainer(outbox, telegram_client.send_queue)
 
+    scheduler = AsyncScheduler(max_concurrent_runs=config["max_concurrent_jobs"])
+    for job in config["jobs"]:
+        if not job["enabled"]:
+            logger.info("Job %s is disabled", job["name"])
+            continue
+        trigger = CronTrigger(job["cron"]) if job["cron"] else IntervalTrigger(minutes=job["interval_minutes"])
+        scheduler.add_job(
+            job["name"],
+            lambda job=job: process_and_send_messages(
+                job, telegram_client, llm, llm_cache, watermarks, outbox, config["metrics_textfile"]
+            ),
+            trigger,
+            overlap=job["overlap"],
+            jitter_seconds=job["jitter_seconds"],
+            run_immediately=job["run_immediately"]
+        )
+
+    metrics_server = None
+    if config["metrics_port"]:
+        metrics_server = MetricsServer(host=config["metrics_host"], port=config["metrics_port"])
+        await metrics_server.start()
 
-def run_scheduled_processing():
-    """Run the message processing in async context."""
-    asyncio.run(process_and_send_messages())
+    drainer.start()
+    try:
+        await scheduler.run()
+    finally:
+        await drainer.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        write_metrics_textfile(config["metrics_textfile"])
+        await telegram_client.close()
+        TRACER.flush()
+        await llm.qwen_client.aclose()
+        llm_cache.close()
+        outbox.close()
 
 
 def main():
     """Main function to set up scheduling and run the bot."""
-    print("Starting Telegram Message Processing Bot...")
-    print("Will process messages every 5 minutes")
-    print("Press Ctrl+C to stop")
-    
-    # Schedule the task to run every 5 minutes
-    schedule.every(5).minutes.do(run_scheduled_processing)
-    
-    # Run once immediately
-    run_scheduled_processing()
-    
-    # Keep the script running
+    configure_logging()
+    logger.info("Starting Telegram Message Processing Bot, press Ctrl+C to stop")
+
+    # Optional config path: python -m src.main config.toml
+    config_path = sys.argv[1] if len(sys.argv) > 1 else None
     try:
-        while True:
-            schedule.run_pending()
-            time.sleep(1)
+        asyncio.run(run_bot(config_path))
     except KeyboardInterrupt:
-        print("\nStopping Telegram Message Processing Bot...")
+        pass
+    logger.info("Stopping Telegram Message Processing Bot...")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,226 @@
+"""Long-lived MCP session manager for telegram-mcp server."""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from . import tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownOutcomeError(RuntimeError):
+    """A non-idempotent tool call failed after it was sent.
+
+    The server may have carried it out, so it is not repeated.
+    """
+
+
+class MCPSessionManager:
+    """Keep one warm MCP session to the telegram-mcp server.
+
+    The server process is started lazily on the first call and reused for
+    every following call. The stdio transport and the session are owned by a
+    dedicated background task, so they can be opened in one task (one
+    workflow run) and closed from another (shutdown) without breaking the
+    anyio cancel scopes of the MCP client.
+    """
+
+    def __init__(
+        self,
+        server_params: StdioServerParameters,
+        start_timeout: float = 60.0,
+        health_check_interval: float = 60.0,
+        health_check_timeout: float = 10.0,
+    ):
+        self.server_params = server_params
+        self.start_timeout = start_timeout
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+
+        self._session: Optional[ClientSession] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._start_error: Optional[BaseException] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._last_used = 0.0
+        self._broken = False
+        self.tool_names: list = []
+        self.starts = 0
+
+    @property
+    def is_running(self) -> bool:
+        """Whether the background session task is alive and initialized."""
+        return (
+            self._session is not None
+            and self._runner is not None
+            and not self._runner.done()
+        )
+
+    async def _run_session(self):
+        """Own the stdio transport and MCP session until asked to stop."""
+        try:
+            async with stdio_client(self.server_params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    # The server answers once the process has started, so
+                    # this includes the spawn of uv and Python
+                    with tracing.span("mcp.initialize", tracing.SPAN_KIND_CLIENT):
+                        await session.initialize()
+
+                    with tracing.span("mcp.list_tools", tracing.SPAN_KIND_CLIENT):
+                        tools = await session.list_tools()
+                    self.tool_names = [tool.name for tool in tools.tools]
+                    logger.info("Session started, available tools: %s", self.tool_names)
+
+                    self._session = session
+                    self._ready.set()
+                    await self._stop.wait()
+        except Exception as e:
+            self._start_error = e
+            logger.warning("Session terminated: %s", e)
+        finally:
+            self._session = None
+            # Unblock a pending start() if the server died during startup
+            self._ready.set()
+
+    async def _start(self):
+        """Spawn the server process and wait for session initialization."""
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._start_error = None
+        self._broken = False
+        self.starts += 1
+
+        logger.info("Starting session (start #%d)", self.starts)
+        with tracing.span(
+            "mcp.start",
+            command=" ".join([self.server_params.command, *self.server_params.args]),
+            start=self.starts,
+        ):
+            # The runner copies the context here, so its spans nest under this one
+            self._runner = asyncio.create_task(self._run_session())
+
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=self.start_timeout)
+            except asyncio.TimeoutError:
+                await self._shutdown()
+                raise RuntimeError(f"MCP session did not start within {self.start_timeout}s")
+
+            if self._session is None:
+                error = self._start_error
+                await self._shutdown()
+                raise RuntimeError(f"MCP session failed to start: {error}")
+
+        self._last_used = time.monotonic()
+
+    async def _shutdown(self):
+        """Stop the background session task and wait for the process to exit."""
+        runner = self._runner
+        self._runner = None
+        self._session = None
+        if runner is None:
+            return
+
+        if self._stop is not None:
+            self._stop.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(runner), timeout=10.0)
+        except asyncio.TimeoutError:
+            runner.cancel()
+
+        if not runner.done():
+            try:
+                await runner
+            except asyncio.CancelledError:
+                pass
+
+    async def _ping(self, session: ClientSession) -> bool:
+        """Check that the server behind the session still answers."""
+        try:
+            await asyncio.wait_for(session.send_ping(), timeout=self.health_check_timeout)
+            return True
+        except Exception as e:
+            logger.warning("Health check failed: %s", e)
+            return False
+
+    async def _is_healthy(self) -> bool:
+        """Ping the server if the session has been idle for a while."""
+        if self._broken or not self.is_running:
+            return False
+
+        if time.monotonic() - self._last_used < self.health_check_interval:
+            return True
+
+        return await self._ping(self._session)
+
+    async def get_session(self) -> ClientSession:
+        """Return a ready session, starting or restarting the server if needed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not await self._is_healthy():
+                if self._runner is not None:
+                    logger.warning("Session is not healthy, reconnecting")
+                    await self._shutdown()
+                await self._start()
+            return self._session
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: Optional[Dict[str, Any]] = None,
+        idempotent: bool = True,
+    ) -> Any:
+        """Call an MCP tool, reconnecting once if the server has died.
+
+        Only an ``idempotent`` call is repeated on the new session. Any other
+        call that fails once sent raises ``UnknownOutcomeError``: the server
+        may have carried it out, and a repeated ``send_message`` would post
+        the message twice.
+        """
+        arguments = arguments or {}
+        session = await self.get_session()
+
+        try:
+            result = await session.call_tool(name, arguments)
+        except Exception as e:
+            alive = self._session is session and await self._ping(session)
+            if not idempotent:
+                if not alive:
+                    # Reconnect on the next call
+                    self._broken = True
+                raise UnknownOutcomeError(f"'{name}' failed after it was sent, it may have taken effect: {e}") from e
+            if alive:
+                # Server is still alive, this is a genuine tool failure
+                raise
+
+            logger.warning("Session lost during '%s' (%s), reconnecting", name, e)
+            self._broken = True
+            tracing.set_attributes(reconnected=True)
+            session = await self.get_session()
+            result = await session.call_tool(name, arguments)
+
+        self._last_used = time.monotonic()
+        return result
+
+    async def close(self):
+        """Shut down the server process."""
+        if self._lock is None:
+            await self._shutdown()
+            return
+
+        async with self._lock:
+            if self._runner is not None:
+                logger.info("Closing session")
+            await self._shutdown()
+
+    async def __aenter__(self) -> "MCPSessionManager":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
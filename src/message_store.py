@@ -0,0 +1,163 @@
+"""Local store of fetched messages for reply-context resolution."""
+
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from .metrics import count_cache_lookups
+from .parsers import MessageRecord
+from .paths import get_cache_dir
+
+
+class MessageStore:
+    """Messages indexed by (chat_id, message_id).
+
+    Recently used records stay in an in-memory LRU of ``max_memory_entries``;
+    every record is also written to SQLite so reply chains resolve across
+    runs and restarts. The database keeps at most ``max_entries`` records
+    no older than ``max_age_seconds``.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_memory_entries: int = 5000,
+        max_entries: int = 200000,
+        max_age_seconds: float = 30 * 24 * 3600,
+    ):
+        self.path = Path(path) if path else get_cache_dir() / "messages.sqlite3"
+        self.max_memory_entries = max_memory_entries
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[Tuple[int, str], MessageRecord]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS messages (
+                    chat_id INTEGER NOT NULL,
+                    message_id TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    reply_to TEXT,
+                    stored_at REAL NOT NULL,
+                    PRIMARY KEY (chat_id, message_id)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS messages_stored_at ON messages (stored_at)")
+        return self._conn
+
+    def _remember(self, key: Tuple[int, str], record: MessageRecord):
+        self._memory[key] = record
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def put_many(self, chat_id: int, records: Iterable[Dict[str, Any]]):
+        """Store message records of one chat, skipping those without text."""
+        rows = []
+        now = time.time()
+        for record in records:
+            if not record.get("text"):
+                continue
+            stored: MessageRecord = {
+                "id": str(record["id"]),
+                "author": record.get("author", ""),
+                "date": record.get("date", ""),
+                "text": record["text"],
+                "reply_to": record.get("reply_to"),
+            }
+            self._remember((chat_id, stored["id"]), stored)
+            rows.append((
+                chat_id, stored["id"], stored["author"], stored["date"],
+                stored["text"], stored["reply_to"], now,
+            ))
+        if not rows:
+            return
+
+        conn = self._connect()
+        conn.executemany(
+            """INSERT OR REPLACE INTO messages
+                (chat_id, message_id, author, date, text, reply_to, stored_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        conn.commit()
+        self.evict()
+
+    def get_many(self, chat_id: int, message_ids: Iterable[str]) -> Dict[str, MessageRecord]:
+        """Return stored records of one chat, memory first, then SQLite."""
+        found = {}
+        pending = []
+        misses_before = self.misses
+        for message_id in dict.fromkeys(str(message_id) for message_id in message_ids):
+            record = self._memory.get((chat_id, message_id))
+            if record is not None:
+                self._memory.move_to_end((chat_id, message_id))
+                found[message_id] = record
+                self.memory_hits += 1
+            else:
+                pending.append(message_id)
+
+        if pending:
+            conn = self._connect()
+            min_stored = time.time() - self.max_age_seconds
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(pending), 500):
+                chunk = pending[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"""SELECT message_id, author, date, text, reply_to FROM messages
+                        WHERE chat_id = ? AND stored_at >= ? AND message_id IN ({placeholders})""",
+                    [chat_id, min_stored, *chunk],
+                )
+                for message_id, author, date, text, reply_to in rows:
+                    record = {"id": message_id, "author": author, "date": date, "text": text, "reply_to": reply_to}
+                    self._remember((chat_id, message_id), record)
+                    found[message_id] = record
+                    self.disk_hits += 1
+            self.misses += len(pending) - sum(1 for message_id in pending if message_id in found)
+
+        misses = self.misses - misses_before
+        count_cache_lookups("message_store", len(found), misses)
+        return found
+
+    def get(self, chat_id: int, message_id: str) -> Optional[MessageRecord]:
+        return self.get_many(chat_id, [message_id]).get(str(message_id))
+
+    def evict(self):
+        """Drop records past their age and the oldest beyond the size limit."""
+        conn = self._connect()
+        conn.execute("DELETE FROM messages WHERE stored_at < ?", (time.time() - self.max_age_seconds,))
+        conn.execute(
+            """DELETE FROM messages WHERE rowid IN (
+                SELECT rowid FROM messages ORDER BY stored_at DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+        conn.commit()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Lookup counters since this store was created."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
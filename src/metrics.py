@@ -0,0 +1,312 @@
+"""Prometheus-style metrics of workflow stages and external calls.
+
+Metrics live in one process-wide ``REGISTRY`` and are rendered in the
+Prometheus text format, either served at ``/metrics`` by ``MetricsServer``
+or written to a file for node_exporter's textfile collector.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached lookup to a slow LLM answer
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """A metric family: one value per combination of label values."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames) or set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in sorted(self._values.items()):
+            yield self.name, self._labels(key), value
+
+    def clear(self):
+        self._values.clear()
+
+
+class Counter(Metric):
+    """A value that only goes up, such as requests made."""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any):
+        if amount < 0:
+            raise ValueError(f"Counter {self.name} can only increase")
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down, such as parts waiting in the outbox."""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative ``le`` buckets, with their sum."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Per-bucket counts (the last one is +Inf), sum, count
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Observe the duration of the ``with`` block, even if it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def value(self, **labels: Any) -> float:
+        """Number of observations."""
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def sum(self, **labels: Any) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def samples(self) -> Iterator[Sample]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """Named metric families rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def clear(self):
+        """Reset every value, keeping the metric families."""
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels.items())
+                    lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Path):
+        """Write ``render()`` atomically, as the textfile collector expects."""
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render(), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+REGISTRY = MetricsRegistry()
+
+WORKFLOW_NODE_SECONDS = REGISTRY.histogram(
+    "bot_workflow_node_duration_seconds", "Time spent in a LangGraph node", ["node"]
+)
+WORKFLOW_NODE_RUNS = REGISTRY.counter(
+    "bot_workflow_node_runs_total", "LangGraph node runs by outcome", ["node", "status"]
+)
+JOB_RUN_SECONDS = REGISTRY.histogram(
+    "bot_job_run_duration_seconds", "Duration of scheduled job runs", ["job"]
+)
+JOB_RUNS = REGISTRY.counter(
+    "bot_job_runs_total", "Scheduled job runs by outcome (ok, failed, skipped)", ["job", "status"]
+)
+MCP_CALL_SECONDS = REGISTRY.histogram(
+    "bot_mcp_call_duration_seconds", "Latency of telegram-mcp tool calls", ["tool"]
+)
+MCP_CALLS = REGISTRY.counter(
+    "bot_mcp_calls_total", "telegram-mcp tool calls by outcome (ok, error, exception)", ["tool", "status"]
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "bot_llm_request_duration_seconds", "Latency of Qwen requests, including retries", ["mode"]
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "bot_llm_requests_total", "Qwen requests by mode (complete, stream) and outcome", ["mode", "status"]
+)
+LLM_RETRIES = REGISTRY.counter(
+    "bot_llm_retries_total", "Qwen attempts retried, by reason", ["reason"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "bot_llm_tokens_total", "Tokens from the usage field of Qwen completions", ["type"]
+)
+MESSAGES = REGISTRY.counter(
+    "bot_messages_total",
+    "Messages by pipeline stage (fetched, prefiltered, filtered, rephrased, unanalyzed, summarized)",
+    ["stage"],
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "bot_cache_lookups_total", "Cache lookups by cache and result (hit, miss)", ["cache", "result"]
+)
+TELEGRAM_SENDS = REGISTRY.counter(
+    "bot_telegram_sends_total", "Messages sent to Telegram by outcome", ["status"]
+)
+TELEGRAM_FLOOD_WAIT_SECONDS = REGISTRY.counter(
+    "bot_telegram_flood_wait_seconds_total", "Time spent waiting out Telegram flood limits"
+)
+OUTBOX_PARTS = REGISTRY.gauge(
+    "bot_outbox_parts", "Summary parts in the outbox by status", ["status"]
+)
+
+
+def count_cache_lookups(cache: str, hits: int, misses: int):
+    if hits:
+        CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    if misses:
+        CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+class MetricsServer:
+    """Serve a registry at ``GET /metrics`` over plain HTTP/1.0.
+
+    Bind to localhost unless a scraper on another host needs access; port 0
+    picks a free port, available as ``port`` after ``start``.
+    """
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Serving metrics at http://%s:%d/metrics", self.host, self.port)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip the headers, the request has no body
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            method, path, *_ = request_line.decode("latin-1").split() + ["", ""]
+            if method in ("GET", "HEAD") and path.split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", CONTENT_TYPE, self.registry.render().encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not found\n"
+            head = (
+                f"HTTP/1.0 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+            )
+            writer.write(head.encode("latin-1") + (body if method != "HEAD" else b""))
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.debug("Metrics request failed: %s", e)
+        finally:
+            writer.close()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,349 @@
+"""Durable outbox of rendered summary parts awaiting delivery."""
+
+import asyncio
+import logging
+import random
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict, Union
+from .paths import get_cache_dir
+from .metrics import OUTBOX_PARTS
+
+
+logger = logging.getLogger(__name__)
+
+
+SENDING = "sending"  # Claimed by the caller that enqueued it
+PENDING = "pending"  # Left to the drainer
+SENT = "sent"
+DEAD = "dead"   # Gave up after max_attempts or max_age_seconds, or the send may have been posted
+
+
+class OutboxPart(TypedDict):
+    id: int
+    batch_id: str       # Parts of one summary share a batch
+    chat_id: str
+    part: int
+    text: str
+    attempts: int
+    last_error: str
+    created_at: float
+
+
+class Outbox:
+    """SQLite-backed outbox of summary parts.
+
+    Parts are written before the first send attempt and marked sent once
+    Telegram accepts them, so a failed delivery is retried from the stored
+    text, across restarts, without fetching or analyzing anything again.
+    A part being sent by its caller is claimed and never due; it is handed
+    to the drainer only by ``mark_failed`` or ``release``. Failed parts are
+    retried with jittered exponential backoff; parts of one batch are always
+    delivered in order.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        base_delay: float = 30.0,
+        max_delay: float = 3600.0,
+        max_attempts: int = 30,
+        max_age_seconds: float = 3 * 24 * 3600,
+        keep_sent_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = Path(path) if path else get_cache_dir() / "outbox.sqlite3"
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.max_age_seconds = max_age_seconds
+        self.keep_sent_seconds = keep_sent_seconds
+        self.opened_at = time.time()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS parts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    batch_id TEXT NOT NULL,
+                    chat_id TEXT NOT NULL,
+                    part INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    sent_at REAL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS parts_status_next ON parts (status, next_attempt_at)"
+            )
+        return self._conn
+
+    @staticmethod
+    def new_batch_id() -> str:
+        return uuid.uuid4().hex
+
+    def enqueue(
+        self,
+        chat_id: Union[int, str],
+        parts: List[str],
+        batch_id: Optional[str] = None,
+        first_part: int = 1,
+    ) -> List[int]:
+        """Persist parts claimed by the caller; returns their outbox IDs in order.
+
+        The caller sends them and records the outcome with ``mark_sent`` or
+        ``mark_failed``, or hands unsent ones to the drainer with ``release``.
+        However long the sends take, the drainer does not send them too.
+        """
+        batch_id = batch_id or self.new_batch_id()
+        conn = self._connect()
+        now = time.time()
+        ids = []
+        with conn:
+            for number, text in enumerate(parts, first_part):
+                cursor = conn.execute(
+                    "INSERT INTO parts (batch_id, chat_id, part, text, status, next_attempt_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (batch_id, str(chat_id), number, text, SENDING, now, now),
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def mark_sent(self, part_id: int):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE parts SET status = ?, sent_at = ?, attempts = attempts + 1, last_error = '' WHERE id = ?",
+                (SENT, time.time(), part_id),
+            )
+
+    def mark_failed(self, part_id: int, error: str):
+        """Schedule the next attempt with backoff, or give up on the part."""
+        conn = self._connect()
+        row = conn.execute("SELECT attempts, created_at FROM parts WHERE id = ?", (part_id,)).fetchone()
+        if row is None:
+            return
+        attempts = row[0] + 1
+        now = time.time()
+        status = PENDING
+        if attempts >= self.max_attempts or now - row[1] > self.max_age_seconds:
+            status = DEAD
+            logger.error("Outbox part %d given up after %d attempts: %s", part_id, attempts, error)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        with conn:
+            conn.execute(
+                "UPDATE parts SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (status, attempts, error, now + random.uniform(delay / 2, delay), part_id),
+            )
+
+    def mark_maybe_sent(self, part_id: int, error: str):
+        """Give up on a part whose send was cut off after reaching the server.
+
+        It may have been posted, and sending it again could post it twice.
+        """
+        logger.error("Outbox part %d may have been sent, not retrying: %s", part_id, error)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "UPDATE parts SET status = ?, attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (DEAD, error, part_id),
+            )
+
+    def record(self, part_id: int, delivery: Dict[str, Any]):
+        """Store the outcome of one send of the part."""
+        if delivery["ok"]:
+            self.mark_sent(part_id)
+        elif delivery["maybe_sent"]:
+            self.mark_maybe_sent(part_id, delivery["error"])
+        else:
+            self.mark_failed(part_id, delivery["error"])
+
+    def release(self, part_ids: List[int]):
+        """Hand claimed parts that were not sent to the drainer, due now."""
+        if not part_ids:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "UPDATE parts SET status = ?, next_attempt_at = ? WHERE id = ? AND status = ?",
+                [(PENDING, time.time(), part_id, SENDING) for part_id in part_ids],
+            )
+
+    def release_claims(self) -> int:
+        """Release parts claimed before this outbox was opened.
+
+        Those were left by a process that died mid-send; parts claimed since
+        belong to senders in this process and are left alone.
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE parts SET status = ?, next_attempt_at = ? WHERE status = ? AND created_at < ?",
+                (PENDING, time.time(), SENDING, self.opened_at),
+            )
+        return cursor.rowcount
+
+    def due(self, limit: int = 100) -> List[OutboxPart]:
+        """Pending parts to retry now, in enqueue order.
+
+        A part is only due if no earlier part of its batch is still pending
+        or being sent, so summaries are never delivered out of order.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            """SELECT id, batch_id, chat_id, part, text, attempts, last_error, created_at
+            FROM parts p
+            WHERE status = ? AND next_attempt_at <= ?
+              AND NOT EXISTS (
+                SELECT 1 FROM parts earlier
+                WHERE earlier.batch_id = p.batch_id AND earlier.status IN (?, ?) AND earlier.id < p.id
+              )
+            ORDER BY id LIMIT ?""",
+            (PENDING, time.time(), PENDING, SENDING, limit),
+        ).fetchall()
+        keys = ("id", "batch_id", "chat_id", "part", "text", "attempts", "last_error", "created_at")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def purge(self):
+        """Drop sent and dead parts older than ``keep_sent_seconds``."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM parts WHERE status IN (?, ?) AND created_at < ?",
+                (SENT, DEAD, time.time() - self.keep_sent_seconds),
+            )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM parts GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (SENDING, PENDING, SENT, DEAD)}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def deferred_result(chat_id: Union[int, str], part: int) -> Dict[str, Any]:
+    """DeliveryResult of a part left in the outbox without a send attempt."""
+    return {
+        "part": part, "chat_id": chat_id, "ok": False, "attempts": 0,
+        "flood_wait_sec": 0.0, "duration_sec": 0.0,
+        "error": "Deferred to the outbox after an earlier part failed", "maybe_sent": False
+    }
+
+
+async def deliver_parts(
+    outbox: Optional[Outbox],
+    send_queue: Any,
+    chat_id: Union[int, str],
+    parts: List[str],
+    part_ids: Optional[List[int]] = None,
+    first_part: int = 1,
+) -> List[Dict[str, Any]]:
+    """Send enqueued parts in order, recording each outcome in the outbox.
+
+    After a failure the remaining parts are released to the drainer, which
+    delivers the batch in order; they are reported as not delivered with no
+    attempts. Parts left unsent by an exception or cancellation are released
+    too. Without an outbox every part is just sent.
+    """
+    results = []
+    settled = 0  # Parts whose outcome is in the outbox
+    deferred = False
+    try:
+        for offset, text in enumerate(parts):
+            part = first_part + offset
+            if deferred:
+                results.append(deferred_result(chat_id, part))
+                continue
+            delivery = await send_queue.send(chat_id, text, part=part)
+            results.append(delivery)
+            if outbox is None or part_ids is None:
+                continue
+            outbox.record(part_ids[offset], delivery)
+            deferred = not delivery["ok"]
+            settled = offset + 1
+    finally:
+        if outbox is not None and part_ids is not None:
+            outbox.release(part_ids[settled:])
+    return results
+
+
+class OutboxDrainer:
+    """Background task retrying due outbox parts every ``interval`` seconds.
+
+    The first pass runs right away, so parts left by a previous process,
+    including those it was sending when it died, are delivered on startup.
+    """
+
+    def __init__(self, outbox: Outbox, send_queue: Any, interval: float = 30.0):
+        self.outbox = outbox
+        self.send_queue = send_queue
+        self.interval = interval
+        self.delivered = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def drain_once(self) -> int:
+        """Retry every due part once; returns how many were delivered.
+
+        Later parts of a batch become due only once the earlier ones are
+        sent, so ``run`` repeats passes while parts are being delivered.
+        """
+        delivered = 0
+        failed_batches = set()
+        for part in self.outbox.due():
+            if part["batch_id"] in failed_batches:
+                continue  # Keep the batch in order, retry it next pass
+            delivery = await self.send_queue.send(part["chat_id"], part["text"], part=part["part"])
+            self.outbox.record(part["id"], delivery)
+            if delivery["ok"]:
+                delivered += 1
+            else:
+                failed_batches.add(part["batch_id"])
+                self.failed += 1
+        if delivered:
+            logger.info("Outbox drainer delivered %d parts", delivered)
+        self.delivered += delivered
+        return delivered
+
+    async def run(self):
+        try:
+            released = self.outbox.release_claims()
+            if released:
+                logger.info("Outbox drainer took over %d parts left mid-send", released)
+        except Exception as e:
+            logger.error("Outbox drainer error: %s", e)
+        while True:
+            try:
+                while await self.drain_once():
+                    pass
+                self.outbox.purge()
+                for status, count in self.outbox.stats.items():
+                    OUTBOX_PARTS.set(count, status=status)
+            except Exception as e:
+                logger.error("Outbox drainer error: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
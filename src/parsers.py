@@ -0,0 +1,161 @@
+"""Parsers for the text responses of telegram-mcp tools.
+
+Every parser makes a single pass over the response with precompiled
+patterns and returns typed records. Message records may span several lines:
+everything up to the next ``ID: ...`` header belongs to the message body, so
+multi-line texts and ``|`` characters inside them survive intact.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple, TypedDict
+
+
+# "Chat ID: 2083014011, Title: BitKogan / Development, Type: group"
+CHAT_LINE_RE = re.compile(r"^Chat ID: (-?\d+), Title: (.*), Type: ([^,\n]+)", re.MULTILINE)
+
+# Start of a message record in list_messages, get_messages and get_message_context.
+# The common list layout "ID | author | Date | [reply to N |] Message: text" is
+# captured by the first alternative in the same match; anything else falls
+# back to field splitting of the whole header.
+MESSAGE_HEADER_RE = re.compile(
+    r"^ID: (\d+) \| (?:"
+    r"([^|\n]*) \| Date: ([^|\n]*)(?: \| reply to (\d+))? \| Message:(?: |$)([^\n]*)"
+    r"|([^\n]*))",
+    re.MULTILINE,
+)
+
+# "Date: 2025-12-12 08:03:16+00:00" in lists, a bare date in message context
+DATE_FIELD_RE = re.compile(
+    r"^(?:Date: )?(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)"
+)
+REPLY_FIELD_RE = re.compile(r"^reply to (\d+)")
+REPLY_PREFIX_RE = re.compile(r"^reply to (\d+) \| ")
+
+MESSAGE_MARKER = " | Message: "
+FIELD_SEPARATOR = " | "
+
+
+class ChatRecord(TypedDict):
+    """One line of list_chats."""
+    id: int
+    title: str
+    type: str
+
+
+class MessageRecord(TypedDict):
+    """One message of list_messages, get_messages or get_message_context."""
+    id: str
+    author: str
+    date: str
+    text: str
+    reply_to: Optional[str]
+
+
+def parse_chat_list(text: str) -> List[ChatRecord]:
+    """Parse the list_chats response."""
+    return [
+        {"id": int(chat_id), "title": title.strip(), "type": chat_type.strip().lower()}
+        for chat_id, title, chat_type in CHAT_LINE_RE.findall(text)
+    ]
+
+
+def _iter_message_blocks(text: str) -> Iterator[Tuple[re.Match, str]]:
+    """Yield (header match, continuation body) for each message record."""
+    previous = None
+    for match in MESSAGE_HEADER_RE.finditer(text):
+        if previous is not None:
+            yield previous, text[previous.end():match.start()]
+        previous = match
+    if previous is not None:
+        yield previous, text[previous.end():]
+
+
+def _parse_record(match: re.Match, body: str) -> MessageRecord:
+    """Build a record from a header match and its continuation lines."""
+    msg_id, author, date, reply_to, inline_text, header = match.groups()
+    if header is not None:
+        return _parse_header(msg_id, header, body)
+
+    # Single-line records only have the newline before the next header
+    if body == "\n" or not body.strip():
+        text = inline_text.strip()
+    else:
+        text = (inline_text + body).strip()
+    if reply_to is None and text.startswith("reply to "):
+        reply_match = REPLY_PREFIX_RE.match(text)
+        if reply_match:
+            reply_to = reply_match.group(1)
+            text = text[reply_match.end():]
+
+    return {"id": msg_id, "author": author.strip(), "date": date.strip(), "text": text, "reply_to": reply_to}
+
+
+def _parse_header(msg_id: str, header: str, body: str) -> MessageRecord:
+    """Split an unusual record header into fields and join the message text."""
+    fields_text, marker, inline_text = header.partition(MESSAGE_MARKER)
+    fields = fields_text.split(FIELD_SEPARATOR)
+
+    date = ""
+    reply_to = None
+    extra = []
+    for field in fields[1:]:
+        if not date:
+            date_match = DATE_FIELD_RE.match(field)
+            if date_match:
+                date = date_match.group(1)
+                continue
+        reply_match = REPLY_FIELD_RE.match(field)
+        if reply_match:
+            reply_to = reply_match.group(1)
+        elif not marker:
+            # Without a "Message:" marker the trailing fields are the text
+            extra.append(field)
+
+    if extra:
+        inline_text = FIELD_SEPARATOR.join(extra)
+
+    text = (inline_text + body).strip()
+    reply_match = REPLY_PREFIX_RE.match(text)
+    if reply_match:
+        reply_to = reply_to or reply_match.group(1)
+        text = text[reply_match.end():]
+
+    return {
+        "id": msg_id,
+        "author": fields[0].strip(),
+        "date": date,
+        "text": text,
+        "reply_to": reply_to,
+    }
+
+
+def parse_message_list(text: str) -> List[MessageRecord]:
+    """Parse list_messages/get_messages responses, newest message first.
+
+    Messages without text (media, service messages) are kept with an empty
+    ``text`` so callers can still see their IDs and dates.
+    """
+    return [_parse_record(match, body) for match, body in _iter_message_blocks(text)]
+
+
+def parse_message_context(text: str) -> Dict[str, MessageRecord]:
+    """Parse a get_message_context response into records keyed by message ID."""
+    records = {}
+    for match, body in _iter_message_blocks(text):
+        record = _parse_record(match, body)
+        records[record["id"]] = record
+    return records
+
+
+def parse_user_info(text: str) -> Dict[str, Any]:
+    """Parse the get_me response, JSON or "Key: value" lines."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        user_info = {}
+        for line in text.split('\n'):
+            key, separator, value = line.partition(':')
+            if separator:
+                user_info[key.strip().lower().replace(' ', '_')] = value.strip()
+        return user_info
@@ -0,0 +1,15 @@
+"""Filesystem locations for persistent bot state."""
+
+import os
+from pathlib import Path
+
+
+def get_cache_dir() -> Path:
+    """Directory for caches that should survive restarts.
+
+    Defaults to ``~/.cache/telegram-summary-bot`` and can be overridden with
+    the ``BOT_CACHE_DIR`` environment variable.
+    """
+    cache_dir = Path(os.getenv("BOT_CACHE_DIR", "~/.cache/telegram-summary-bot")).expanduser()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
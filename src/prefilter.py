@@ -0,0 +1,125 @@
+"""Deterministic local rules that drop trivial messages before the LLM."""
+
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+
+
+class PrefilterRules(TypedDict, total=False):
+    drop_patterns: List[str]    # Regexes; a full match of the text drops the message
+    keep_patterns: List[str]    # Regexes; a search match always passes the message
+    drop_emoji_only: bool       # Drop texts made only of emoji and punctuation
+    min_length: int             # Drop texts shorter than this, after stripping
+    allow_authors: List[str]    # Always pass messages of these authors
+    deny_authors: List[str]     # Always drop messages of these authors
+    drop_duplicates: bool       # Drop repeats of a text already seen in this run
+
+
+# Local equivalents of the default custom filter rules: emoji-only
+# messages and one-word replies like "да", "нет", "ок"
+DEFAULT_PREFILTER_RULES: PrefilterRules = {
+    "drop_patterns": [
+        r"(ок|окей|окс|ok|okay|да|нет|ага|угу|неа|\+|\+1|спс|спасибо|пасиб|thx|ясно|понял|поняла|принято)[\s.!)]*",
+    ],
+    "keep_patterns": [],
+    "drop_emoji_only": True,
+    "min_length": 2,
+    "allow_authors": [],
+    "deny_authors": [],
+    "drop_duplicates": True,
+}
+
+# Characters that can appear in an emoji-only text besides the emoji themselves
+EMOJI_JOINERS = {"\u200d", "\ufe0f", "\ufe0e", "\u20e3"}  # ZWJ, variation selectors, keycap
+
+
+def is_emoji_only(text: str) -> bool:
+    """Whether the text has emoji/symbols but no letters or digits."""
+    has_symbol = False
+    for char in text:
+        if char.isspace() or char in EMOJI_JOINERS:
+            continue
+        category = unicodedata.category(char)
+        if category in ("So", "Sk"):
+            has_symbol = True
+        elif not category.startswith("P") and category not in ("Mn", "Cf"):
+            return False
+    return has_symbol
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+class Prefilter:
+    """Apply prefilter rules to messages, keeping per-rule counters.
+
+    Messages that mention the current user are never dropped. One instance
+    covers one run, so duplicate detection spans all of its channels.
+    """
+
+    def __init__(self, rules: Optional[PrefilterRules] = None, mention_matcher: Any = None):
+        rules = {**DEFAULT_PREFILTER_RULES, **(rules or {})}
+        self.drop_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in rules["drop_patterns"]]
+        self.keep_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in rules["keep_patterns"]]
+        self.drop_emoji_only = rules["drop_emoji_only"]
+        self.min_length = rules["min_length"]
+        self.allow_authors = {author.casefold() for author in rules["allow_authors"]}
+        self.deny_authors = {author.casefold() for author in rules["deny_authors"]}
+        self.drop_duplicates = rules["drop_duplicates"]
+        self.mention_matcher = mention_matcher
+
+        self._seen_texts = set()
+        self.checked = 0
+        self.dropped: Dict[str, int] = {}
+
+    def check(self, msg: Dict[str, Any]) -> Optional[str]:
+        """Return the rule that drops the message, or None to pass it on."""
+        text = msg.get("text", "").strip()
+        author = msg.get("author", "").casefold()
+
+        if author in self.deny_authors:
+            return "deny_author"
+        if author in self.allow_authors:
+            return None
+        if msg.get("mentioned") or (self.mention_matcher and self.mention_matcher.matches(text)):
+            return None
+        if any(pattern.search(text) for pattern in self.keep_patterns):
+            return None
+
+        if len(text) < self.min_length:
+            return "min_length"
+        if self.drop_emoji_only and is_emoji_only(text):
+            return "emoji_only"
+        if any(pattern.fullmatch(text) for pattern in self.drop_patterns):
+            return "drop_pattern"
+        if self.drop_duplicates:
+            normalized = _normalize(text)
+            if normalized in self._seen_texts:
+                return "duplicate"
+            self._seen_texts.add(normalized)
+        return None
+
+    def apply(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split messages into those passed to the LLM and those dropped."""
+        passed = []
+        dropped = []
+        for msg in messages:
+            self.checked += 1
+            reason = self.check(msg)
+            if reason is None:
+                passed.append(msg)
+            else:
+                self.dropped[reason] = self.dropped.get(reason, 0) + 1
+                dropped.append(msg)
+        return passed, dropped
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        dropped = sum(self.dropped.values())
+        return {
+            "checked": self.checked,
+            "dropped": dropped,
+            "passed": self.checked - dropped,
+            "by_rule": dict(self.dropped),
+        }
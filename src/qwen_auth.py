@@ -0,0 +1,191 @@
+"""Qwen OAuth credentials: cached loading and proactive token refresh."""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+
+# Endpoint and public client ID used by qwen-code, which writes oauth_creds.json
+QWEN_OAUTH_TOKEN_URL = "https://chat.qwen.ai/api/v1/oauth2/token"
+QWEN_OAUTH_CLIENT_ID = "f0304373b74a44d2b584a3fb70ca9e56"
+
+
+class CredentialProvider:
+    """OAuth credentials from a qwen-code credentials file.
+
+    The file is re-read only when its mtime or size changes, so a token
+    refreshed by the qwen CLI is picked up without reading it per request.
+    A token that expires within ``refresh_margin`` seconds is refreshed in
+    the background with the stored ``refresh_token``; one that expires within
+    ``min_validity`` seconds is refreshed before it is returned. Concurrent
+    refreshes are serialized behind one lock and the new token is written
+    back to the file.
+    """
+
+    def __init__(
+        self,
+        creds_path: Path,
+        get_http_client: Callable[[], httpx.AsyncClient],
+        refresh_margin: float = 300.0,
+        min_validity: float = 30.0,
+        token_url: str = QWEN_OAUTH_TOKEN_URL,
+        client_id: str = QWEN_OAUTH_CLIENT_ID,
+    ):
+        self.creds_path = Path(creds_path)
+        self.get_http_client = get_http_client
+        self.refresh_margin = refresh_margin
+        self.min_validity = min_validity
+        self.token_url = token_url
+        self.client_id = client_id
+
+        self._credentials: Optional[Dict[str, Any]] = None
+        self._file_key: Optional[Tuple[int, int]] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _reload_if_changed(self) -> Dict[str, Any]:
+        """Return the credentials, reading the file only if it changed."""
+        try:
+            stat = self.creds_path.stat()
+        except FileNotFoundError:
+            if self._credentials is not None:
+                return self._credentials
+            raise FileNotFoundError(f"Credentials file not found: {self.creds_path}")
+
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        if self._credentials is None or file_key != self._file_key:
+            logger.debug("Loading credentials from %s", self.creds_path)
+            with open(self.creds_path) as f:
+                self._credentials = json.load(f)
+            self._file_key = file_key
+            self.loads += 1
+            logger.debug("Loaded credentials: %s", list(self._credentials.keys()))
+        return self._credentials
+
+    def expires_in(self, creds: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """Seconds until the access token expires, None if unknown."""
+        creds = creds if creds is not None else self._credentials
+        expiry = (creds or {}).get("expiry_date")
+        if not isinstance(expiry, (int, float)):
+            return None
+        return expiry / 1000 - time.time()
+
+    async def get_credentials(self) -> Dict[str, Any]:
+        """Current credentials with a usable access token."""
+        creds = self._reload_if_changed()
+        expires_in = self.expires_in(creds)
+        if expires_in is None or not creds.get("refresh_token"):
+            if expires_in is not None and expires_in <= 0:
+                raise ValueError("Access token has expired and there is no refresh token")
+            return creds
+
+        if expires_in <= self.min_validity:
+            return await self.refresh(stale_token=creds.get("access_token"))
+        if expires_in <= self.refresh_margin and (self._refresh_task is None or self._refresh_task.done()):
+            # Still valid for a while: refresh without making this request wait
+            self._refresh_task = asyncio.create_task(
+                self._refresh_in_background(creds.get("access_token"))
+            )
+        return creds
+
+    async def get_token(self) -> str:
+        token = (await self.get_credentials()).get("access_token")
+        if not token:
+            raise ValueError("No access token found in credentials")
+        return token
+
+    async def _refresh_in_background(self, stale_token: Optional[str]):
+        try:
+            await self.refresh(stale_token=stale_token)
+        except Exception as e:
+            logger.warning("Background token refresh failed: %s", e)
+
+    async def refresh(self, stale_token: Optional[str] = None) -> Dict[str, Any]:
+        """Exchange the refresh token for a new access token.
+
+        With ``stale_token`` the refresh is skipped if the token has already
+        been replaced, by another caller or by the qwen CLI rewriting the file.
+        """
+        async with self._get_lock():
+            creds = self._reload_if_changed()
+            expires_in = self.expires_in(creds)
+            if (
+                stale_token is not None
+                and creds.get("access_token") != stale_token
+                and (expires_in is None or expires_in > self.min_validity)
+            ):
+                return creds
+
+            refresh_token = creds.get("refresh_token")
+            if not refresh_token:
+                raise ValueError("Authentication failed - no refresh token in credentials")
+
+            logger.info("Refreshing Qwen access token")
+            response = await self.get_http_client().post(
+                self.token_url,
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": refresh_token,
+                    "client_id": self.client_id,
+                },
+                headers={"Accept": "application/json"},
+            )
+            if response.is_error:
+                self.refresh_failures += 1
+                raise ValueError(f"Token refresh failed: {response.status_code} - {response.text}")
+
+            token_data = response.json()
+            if not token_data.get("access_token"):
+                self.refresh_failures += 1
+                raise ValueError(f"Token refresh failed: {token_data}")
+
+            new_creds = {
+                **creds,
+                "access_token": token_data["access_token"],
+                "token_type": token_data.get("token_type", creds.get("token_type")),
+                "refresh_token": token_data.get("refresh_token") or refresh_token,
+                "resource_url": token_data.get("resource_url") or creds.get("resource_url"),
+            }
+            if token_data.get("expires_in"):
+                new_creds["expiry_date"] = int((time.time() + token_data["expires_in"]) * 1000)
+            self._save(new_creds)
+            self.refreshes += 1
+            logger.info("Access token refreshed, expires in %.0fs", self.expires_in(new_creds) or 0)
+            return new_creds
+
+    def _save(self, creds: Dict[str, Any]):
+        """Write the credentials back atomically, keeping the file private."""
+        tmp_path = self.creds_path.with_suffix(".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(creds, f, indent=2)
+        tmp_path.replace(self.creds_path)
+
+        stat = self.creds_path.stat()
+        self._credentials = creds
+        self._file_key = (stat.st_mtime_ns, stat.st_size)
+
+    async def aclose(self):
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
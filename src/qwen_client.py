@@ -1,41 +1,116 @@
 """Qwen API client using OAuth credentials."""
 
+import asyncio
+import importlib.util
 import json
+import logging
+import time
 import httpx
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Any, Optional
-from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+from .metrics import LLM_REQUEST_SECONDS, LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS
+from .qwen_auth import CredentialProvider
+from . import tracing
+from .resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, RequestStats, RetryPolicy, parse_retry_after
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
 
 
 class QwenClient:
-    """Client for Qwen API using OAuth credentials."""
+    """Client for Qwen API using OAuth credentials.
+    
+    The client owns one pooled ``httpx.AsyncClient`` that is created lazily
+    and reused for every request, so keep-alive connections and TLS sessions
+    survive between messages and workflow runs. Call ``aclose()`` (or use the
+    client as an async context manager) on shutdown.
     
-    def __init__(self, creds_path: str = "/home/vyt/.qwen/oauth_creds.json"):
+    Requests are retried on 429, 5xx and timeouts with jittered exponential
+    backoff, behind a circuit breaker. Attempts in flight are capped by an
+    AIMD ``limiter`` that halves on throttling and grows back on success;
+    ``stats`` exposes the retry, latency and token counters, which are
+    also recorded in the process-wide metrics.
+    
+    Credentials come from a ``CredentialProvider`` that refreshes the OAuth
+    token before it expires; a request rejected with 401 is retried once
+    with a refreshed token.
+    """
+    
+    def __init__(
+        self,
+        creds_path: str = "/home/vyt/.qwen/oauth_creds.json",
+        max_connections: int = 10,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 120.0,
+        http2: bool = False,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ):
         self.creds_path = Path(creds_path)
-        self._credentials: Optional[Dict[str, Any]] = None
-        
-    def _load_credentials(self) -> Dict[str, Any]:
-        """Load OAuth credentials from file."""
-        print(f"[DEBUG] Loading credentials from {self.creds_path}")
         
-        if not self.creds_path.exists():
-            raise FileNotFoundError(f"Credentials file not found: {self.creds_path}")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = http2 and self._http2_available()
+        self._http_client: Optional[httpx.AsyncClient] = None
         
-        with open(self.creds_path) as f:
-            creds = json.load(f)
-        
-        print(f"[DEBUG] Loaded credentials: {list(creds.keys())}")
-        
-        # Check if token is expired
-        if "expiry_date" in creds:
-            expiry = creds["expiry_date"]
-            current_time = datetime.now().timestamp() * 1000
-            print(f"[DEBUG] Token expiry: {expiry}, current: {current_time}")
-            if isinstance(expiry, (int, float)) and expiry < current_time:
-                raise ValueError("Access token has expired")
-        
-        return creds
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.limiter = limiter or AdaptiveLimiter(limit=max_connections)
+        self.request_stats = RequestStats()
+        self.credentials = CredentialProvider(self.creds_path, self._get_http_client)
+    
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative request counters, latency and resilience state."""
+        return {
+            **self.request_stats.snapshot(),
+            "circuit_state": self.circuit_breaker.state,
+            "circuit_opened": self.circuit_breaker.times_opened,
+            "concurrency_limit": self.limiter.current_limit,
+            "token_refreshes": self.credentials.refreshes,
+        }
+    
+    @staticmethod
+    def _http2_available() -> bool:
+        """HTTP/2 needs the optional h2 package (httpx[http2])."""
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but h2 is not installed, using HTTP/1.1")
+            return False
+        return True
     
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """Return the shared pooled HTTP client, creating it on first use."""
+        if self._http_client is None or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=self.http2,
+            )
+        return self._http_client
+    
+    async def aclose(self):
+        """Close pooled connections."""
+        await self.credentials.aclose()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+    
+    async def __aenter__(self) -> "QwenClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+        
     def _get_base_url(self, creds: Dict[str, Any]) -> str:
         """Get the correct base URL from credentials."""
         resource_url = creds.get("resource_url")
@@ -44,36 +119,29 @@ class QwenClient:
             return base_url if base_url.endswith("/v1") else f"{base_url}/v1"
         return "https://dashscope.aliyuncs.com/compatible-mode/v1"
     
-    def _get_headers(self) -> Dict[str, str]:
+    async def _get_headers(self) -> Dict[str, str]:
         """Get headers with OAuth token."""
-        if not self._credentials:
-            self._credentials = self._load_credentials()
-        
-        token = self._credentials.get("access_token")
-        if not token:
-            raise ValueError("No access token found in credentials")
+        token = await self.credentials.get_token()
         
         return {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
         }
     
-    async def chat_completion(
+    async def _prepare_request(
         self,
         messages: list,
-        model: str = "qwen3-coder-plus",
-        temperature: float = 0.7,
-        max_tokens: int = 2000,
-    ) -> Dict[str, Any]:
-        """Make a chat completion request."""
-        if not self._credentials:
-            self._credentials = self._load_credentials()
-        
-        base_url = self._get_base_url(self._credentials)
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        stream: bool = False,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """URL and JSON payload of a chat completion request."""
+        base_url = self._get_base_url(await self.credentials.get_credentials())
         url = f"{base_url}/chat/completions"
         
-        print(f"[DEBUG] Making chat completion request to {url}")
-        print(f"[DEBUG] Model: {model}, Messages count: {len(messages)}")
+        logger.debug("Making chat completion request to %s", url)
+        logger.debug("Model: %s, Messages count: %d, stream: %s", model, len(messages), stream)
         
         payload = {
             "model": model,
@@ -81,28 +149,256 @@ class QwenClient:
             "temperature": temperature,
             "max_tokens": max_tokens,
         }
+        if stream:
+            payload["stream"] = True
+            # The last event then carries the token usage
+            payload["stream_options"] = {"include_usage": True}
+        return url, payload
+    
+    @contextmanager
+    def _track_request(self, mode: str, model: str) -> Iterator[tracing.AnySpan]:
+        """Record the duration and outcome of one request, retries included.
+        
+        The yielded trace span is not made current, since streamed requests
+        run in an async generator; attempts nest under it with ``use_span``.
+        """
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with tracing.span(f"llm.{mode}", tracing.SPAN_KIND_CLIENT, activate=False, model=model) as span:
+                yield span
+            status = "ok"
+        except CircuitOpenError:
+            status = "circuit_open"
+            raise
+        except GeneratorExit:
+            status = "ok"  # The caller stopped reading a stream early
+            raise
+        finally:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, mode=mode)
+            LLM_REQUESTS.inc(mode=mode, status=status)
+    
+    def _record_usage(self, usage: Optional[Dict[str, Any]], span: tracing.AnySpan = tracing.NON_RECORDING_SPAN):
+        """Count the tokens reported in a completion's ``usage`` field."""
+        if not usage:
+            return
+        for key, token_type in (("prompt_tokens", "prompt"), ("completion_tokens", "completion")):
+            tokens = usage.get(key)
+            if isinstance(tokens, int) and tokens > 0:
+                setattr(self.request_stats, key, getattr(self.request_stats, key) + tokens)
+                LLM_TOKENS.inc(tokens, type=token_type)
+                span.set_attribute(key, tokens)
+    
+    async def chat_completion(
+        self,
+        messages: list,
+        model: str = "qwen3-coder-plus",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+    ) -> Dict[str, Any]:
+        """Make a chat completion request."""
+        with self._track_request("complete", model) as span:
+            url, payload = await self._prepare_request(messages, model, temperature, max_tokens)
+            if span.recording:
+                span.set_attribute("request_bytes", len(json.dumps(payload).encode("utf-8")))
+            with tracing.use_span(span):
+                result = await self._with_retries(lambda: self._attempt(url, payload))
+            self._record_usage(result.get("usage"), span)
+        return result
+    
+    async def stream_chat_completion(
+        self,
+        messages: list,
+        model: str = "qwen3-coder-plus",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion over server-sent events, yielding content deltas.
         
-        async with httpx.AsyncClient() as client:
+        Failures before the first byte of the answer are retried like
+        ``chat_completion``; a stream broken midway raises to the caller.
+        Closing the iterator early closes the connection, which stops
+        generation on the server.
+        """
+        with self._track_request("stream", model) as span:
+            url, payload = await self._prepare_request(messages, model, temperature, max_tokens, stream=True)
+            if span.recording:
+                span.set_attribute("request_bytes", len(json.dumps(payload).encode("utf-8")))
+            with tracing.use_span(span):
+                response, started = await self._with_retries(lambda: self._open_stream(url, payload))
+            response_bytes = 0
             try:
-                print(f"[DEBUG] Sending request to {url}")
-                response = await client.post(
-                    url,
-                    headers=self._get_headers(),
-                    json=payload,
-                    timeout=30.0,
-                )
-                print(f"[DEBUG] Response status: {response.status_code}")
-                response.raise_for_status()
-                result = response.json()
-                print(f"[DEBUG] Response received successfully")
-                return result
+                async for data in iter_sse_data(response.aiter_lines()):
+                    if data == "[DONE]":
+                        break
+                    response_bytes += len(data.encode("utf-8"))
+                    chunk = json.loads(data)
+                    self._record_usage(chunk.get("usage"), span)
+                    for choice in chunk.get("choices") or []:
+                        content = (choice.get("delta") or {}).get("content")
+                        if content:
+                            yield content
+            except (httpx.TimeoutException, httpx.TransportError):
+                self.request_stats.failures += 1
+                self.circuit_breaker.record_failure()
+                raise
+            finally:
+                span.set_attribute("response_bytes", response_bytes)
+                self.request_stats.record_latency(time.monotonic() - started)
+                await response.aclose()
+                await self.limiter.release()
+    
+    async def _with_retries(self, attempt_func: Callable[[], Awaitable[T]]) -> T:
+        """Run ``attempt_func`` behind the circuit breaker, retrying transient failures."""
+        self.request_stats.requests += 1
+        attempt = 0
+        auth_retried = False
+        while True:
+            try:
+                self.circuit_breaker.allow()
+            except CircuitOpenError:
+                self.request_stats.circuit_rejections += 1
+                raise
+            
+            retry_after = None
+            try:
+                return await attempt_func()
             except httpx.HTTPStatusError as e:
-                print(f"[DEBUG] HTTP error: {e.response.status_code} - {e.response.text}")
-                if e.response.status_code == 401:
-                    # Token might be expired, reload credentials
-                    self._credentials = None
-                    raise ValueError("Authentication failed - token may be expired")
+                status = e.response.status_code
+                if status == 401 and not auth_retried:
+                    # Refresh the token once and retry right away
+                    auth_retried = True
+                    self.circuit_breaker.record_success()
+                    stale_token = e.request.headers.get("Authorization", "").removeprefix("Bearer ")
+                    try:
+                        await self.credentials.refresh(stale_token=stale_token)
+                    except (ValueError, httpx.HTTPError) as refresh_error:
+                        self.request_stats.failures += 1
+                        raise ValueError(f"Authentication failed - {refresh_error}") from e
+                    logger.info("Retrying with the refreshed token")
+                    continue
+                if not self.retry_policy.is_retryable_status(status):
+                    # The API answered, so it is up; the request itself is bad
+                    self.circuit_breaker.record_success()
+                    self.request_stats.failures += 1
+                    if status == 401:
+                        raise ValueError("Authentication failed - token may be expired")
+                    raise
+                if status == 429:
+                    self.request_stats.throttled += 1
+                    self.limiter.on_overload()
+                    # Throttling is not an outage, but a throttled probe must
+                    # hand its slot back or no call would ever probe again
+                    self.circuit_breaker.release_probe()
+                else:
+                    self.circuit_breaker.record_failure()
+                    if status == 503:
+                        self.limiter.on_overload()
+                retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+                error: Exception = e
+                reason = f"HTTP {status}"
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self.circuit_breaker.record_failure()
+                self.limiter.on_overload()
+                error = e
+                reason = type(e).__name__
+            except BaseException:
+                # Not an API outcome, e.g. a credentials error, an unparsable
+                # body or cancellation: do not leave a half-open probe behind
+                self.circuit_breaker.release_probe()
+                raise
+            
+            delay = self.retry_policy.delay(attempt, retry_after)
+            if delay is None:
+                self.request_stats.failures += 1
+                logger.warning("Giving up after %d attempts: %s", attempt + 1, reason)
+                raise error
+            attempt += 1
+            self.request_stats.retries += 1
+            LLM_RETRIES.inc(reason=reason)
+            logger.info("Attempt %d failed (%s), retrying in %.1fs", attempt, reason, delay)
+            await asyncio.sleep(delay)
+    
+    async def _attempt(self, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """One HTTP attempt, holding a limiter slot only while on the wire."""
+        client = self._get_http_client()
+        async with self.limiter:
+            self.request_stats.attempts += 1
+            started = time.monotonic()
+            try:
+                with tracing.span("llm.attempt", tracing.SPAN_KIND_CLIENT) as span:
+                    logger.debug("Sending request to %s", url)
+                    response = await client.post(
+                        url,
+                        headers=await self._get_headers(),
+                        json=payload,
+                    )
+                    logger.debug("Response status: %d", response.status_code)
+                    span.set_attributes(status_code=response.status_code, response_bytes=len(response.content))
+                    response.raise_for_status()
+                    result = response.json()
+            except httpx.HTTPStatusError as e:
+                logger.debug("HTTP error: %d - %s", e.response.status_code, e.response.text)
                 raise
             except Exception as e:
-                print(f"[DEBUG] Request failed: {e}")
+                logger.debug("Request failed: %r", e)
                 raise
+            finally:
+                self.request_stats.record_latency(time.monotonic() - started)
+        
+        self.circuit_breaker.record_success()
+        self.limiter.on_success()
+        logger.debug("Response received successfully")
+        return result
+    
+    async def _open_stream(self, url: str, payload: Dict[str, Any]) -> Tuple[httpx.Response, float]:
+        """Send a streaming request and check its status.
+        
+        On success the limiter slot stays held until the caller has read the
+        stream and released it.
+        """
+        client = self._get_http_client()
+        await self.limiter.acquire()
+        self.request_stats.attempts += 1
+        started = time.monotonic()
+        try:
+            # Ends at the response headers, the body is read by the caller
+            with tracing.span("llm.attempt", tracing.SPAN_KIND_CLIENT, stream=True) as span:
+                logger.debug("Sending streaming request to %s", url)
+                request = client.build_request("POST", url, headers=await self._get_headers(), json=payload)
+                response = await client.send(request, stream=True)
+                logger.debug("Response status: %d", response.status_code)
+                span.set_attribute("status_code", response.status_code)
+                if response.is_error:
+                    await response.aread()
+                    await response.aclose()
+                    logger.debug("HTTP error: %d - %s", response.status_code, response.text)
+                    response.raise_for_status()
+        except BaseException as e:
+            if not isinstance(e, httpx.HTTPStatusError):
+                logger.debug("Request failed: %r", e)
+            self.request_stats.record_latency(time.monotonic() - started)
+            await self.limiter.release()
+            raise
+        
+        self.circuit_breaker.record_success()
+        self.limiter.on_success()
+        return response, started
+
+
+async def iter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield the data of each server-sent event, joining multi-line data fields."""
+    data_lines: List[str] = []
+    async for line in lines:
+        if not line:
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+            continue
+        if line.startswith(":"):
+            continue  # Comment / keep-alive
+        field, _, value = line.partition(":")
+        if field == "data":
+            data_lines.append(value[1:] if value.startswith(" ") else value)
+    if data_lines:
+        yield "\n".join(data_lines)
@@ -1,11 +1,12 @@
 """LangChain integration for Qwen API."""
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage
-from langchain_core.outputs import ChatGeneration, ChatResult
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
-from pydantic import Field
+from langchain_core.runnables import RunnableConfig
+from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from pydantic import Field, PrivateAttr
 from .qwen_client import QwenClient
 
 
@@ -16,6 +17,11 @@ class QwenChatModel(BaseChatModel):
     model_name: str = Field(default="qwen3-coder-plus")
     temperature: float = Field(default=0.7)
     max_tokens: int = Field(default=2000)
+    max_concurrency: int = Field(default=4)
+    # Analysis reads answers over SSE and decodes them incrementally
+    streaming: bool = Field(default=True)
+    
+    _limiter_configured: bool = PrivateAttr(default=False)
     
     class Config:
         arbitrary_types_allowed = True
@@ -40,6 +46,12 @@ class QwenChatModel(BaseChatModel):
             converted.append({"role": role, "content": msg.content})
         return converted
     
+    def _configure_limiter(self):
+        """Cap the client's adaptive limiter at ``max_concurrency``."""
+        if not self._limiter_configured:
+            self.qwen_client.limiter.set_max_limit(max(1, self.max_concurrency))
+            self._limiter_configured = True
+    
     async def _agenerate(
         self,
         messages: List[BaseMessage],
@@ -47,14 +59,20 @@ class QwenChatModel(BaseChatModel):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
-        """Generate chat response asynchronously."""
+        """Generate chat response asynchronously.
+        
+        At most ``max_concurrency`` requests run at once, however many
+        coroutines call this concurrently; the client's adaptive limiter
+        lowers that while the API is throttling.
+        """
         converted_messages = self._convert_messages(messages)
         
+        self._configure_limiter()
         response = await self.qwen_client.chat_completion(
             messages=converted_messages,
             model=self.model_name,
             temperature=self.temperature,
-            max_tokens=self.max_tokens,
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
         )
         
         content = response["choices"][0]["message"]["content"]
@@ -63,6 +81,55 @@ class QwenChatModel(BaseChatModel):
         
         return ChatResult(generations=[generation])
     
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        """Stream the answer as it is generated.
+        
+        Closing the iterator early aborts the request, so a caller that has
+        seen enough stops paying for the rest of the answer.
+        """
+        converted_messages = self._convert_messages(messages)
+        
+        self._configure_limiter()
+        stream = self.qwen_client.stream_chat_completion(
+            messages=converted_messages,
+            model=self.model_name,
+            temperature=self.temperature,
+            max_tokens=kwargs.get("max_tokens", self.max_tokens),
+        )
+        try:
+            async for content in stream:
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=content))
+                if run_manager:
+                    await run_manager.on_llm_new_token(content, chunk=chunk)
+                yield chunk
+        finally:
+            await stream.aclose()
+    
+    async def abatch(
+        self,
+        inputs: List[Any],
+        config: Optional[RunnableConfig | Sequence[RunnableConfig]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """Run inputs concurrently, keeping at most ``max_concurrency`` in flight.
+        
+        Results are returned in input order. With ``return_exceptions=True`` a
+        failed input yields its exception without affecting the others.
+        """
+        if config is None:
+            config = {"max_concurrency": self.max_concurrency}
+        elif isinstance(config, dict) and config.get("max_concurrency") is None:
+            config = {**config, "max_concurrency": self.max_concurrency}
+        return await super().abatch(inputs, config, return_exceptions=return_exceptions, **kwargs)
+    
     def _generate(
         self,
         messages: List[BaseMessage],
@@ -0,0 +1,248 @@
+"""Retries, circuit breaking and adaptive concurrency for API calls."""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the API while the circuit breaker is open."""
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter.
+
+    Attempt ``n`` (from 0) waits a random time up to
+    ``min(max_delay, base_delay * 2**n)``. A server-provided Retry-After is
+    honored as a lower bound, up to ``max_retry_after`` seconds; longer
+    waits are not retried.
+    """
+
+    RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 120.0,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        return status_code in self.RETRY_STATUSES
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up."""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            if retry_after > self.max_retry_after:
+                return None
+            return max(retry_after, backoff)
+        return backoff
+
+
+class CircuitBreaker:
+    """Fail fast after ``failure_threshold`` consecutive failures.
+
+    While open every call is rejected; after ``reset_timeout`` seconds one
+    probe call is let through (half-open) and its outcome closes or
+    reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+        raise CircuitOpenError(f"Circuit open after {self.consecutive_failures} failures, retry in {retry_in:.0f}s")
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit breaker closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """End a probe whose outcome says nothing about the API (a bug, a bad
+        token, cancellation), so the next call probes instead."""
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning("Circuit breaker opened after %d failures", self.consecutive_failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts with AIMD.
+
+    Every success raises the limit by ``1/limit`` (about +1 per limit's worth
+    of requests); throttling or overload halves it, at most once per
+    ``decrease_cooldown`` seconds so one burst of 429s counts as one signal.
+    """
+
+    def __init__(
+        self,
+        limit: int = 4,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+    ):
+        self.max_limit = max_limit or limit
+        self.min_limit = min_limit
+        self.limit = float(min(limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def set_max_limit(self, max_limit: int):
+        """Change the ceiling, e.g. to a caller's ``max_concurrency``."""
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(max(self.limit, float(self.min_limit)), float(self.max_limit))
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.current_limit)
+            self.in_flight += 1
+
+    async def release(self):
+        condition = self._get_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def on_success(self):
+        self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+    def on_overload(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        previous = self.current_limit
+        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+        if self.current_limit < previous:
+            self.decreases += 1
+            logger.info("Concurrency limit lowered to %d", self.current_limit)
+
+
+class RequestStats:
+    """Attempt, retry, latency and token counters of an API client."""
+
+    def __init__(self, latency_window: int = 500):
+        self.requests = 0
+        self.attempts = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+        self.circuit_rejections = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+
+    def record_latency(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def _percentile(self, fraction: float) -> float:
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        latency: Dict[str, float] = {}
+        if self._latencies:
+            latency = {
+                "avg_sec": round(sum(self._latencies) / len(self._latencies), 3),
+                "p50_sec": round(self._percentile(0.5), 3),
+                "p95_sec": round(self._percentile(0.95), 3),
+                "max_sec": round(max(self._latencies), 3),
+            }
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "failures": self.failures,
+            "throttled": self.throttled,
+            "circuit_rejections": self.circuit_rejections,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency": latency,
+        }
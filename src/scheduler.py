@@ -0,0 +1,313 @@
+"""Long-running asyncio scheduler for periodic jobs."""
+
+import asyncio
+import contextlib
+import logging
+import random
+import signal
+import time
+from datetime import datetime, timedelta, tzinfo
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+from .metrics import JOB_RUN_SECONDS, JOB_RUNS
+
+
+logger = logging.getLogger(__name__)
+
+
+# What to do when a job is due while its previous run is still going
+OVERLAP_SKIP = "skip"          # Drop the tick
+OVERLAP_COALESCE = "coalesce"  # Run once more right after, however many ticks were missed
+
+
+class IntervalTrigger:
+    """Fire every ``seconds``/``minutes``/``hours``."""
+
+    def __init__(self, seconds: float = 0, minutes: float = 0, hours: float = 0):
+        self.interval = timedelta(seconds=seconds, minutes=minutes, hours=hours)
+        if self.interval <= timedelta(0):
+            raise ValueError("Interval must be positive")
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def __repr__(self) -> str:
+        return f"every {self.interval}"
+
+
+class CronTrigger:
+    """Fire on a five-field cron expression: minute hour day month weekday.
+
+    Fields accept ``*``, numbers, ranges ``a-b``, lists ``a,b`` and steps
+    ``*/n`` or ``a-b/n``; weekday 0 and 7 are Sunday. As in cron, when both
+    day and weekday are restricted a time matches if either one does.
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str, tz: Optional[tzinfo] = None):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {expression!r}")
+        self.expression = expression
+        self.tz = tz
+        minutes, hours, days, months, weekdays = [
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        self.minutes = sorted(minutes)
+        self.hours = sorted(hours)
+        self.days = days
+        self.months = months
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in field.split(","):
+            value_range, _, step_text = item.partition("/")
+            step = int(step_text) if step_text else 1
+            if value_range == "*":
+                start, end = low, high
+            elif "-" in value_range:
+                start, end = (int(value) for value in value_range.split("-", 1))
+            else:
+                start = int(value_range)
+                end = high if step_text else start
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        # Python weeks start on Monday, cron weeks on Sunday
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def next_after(self, moment: datetime) -> datetime:
+        local = moment.astimezone(self.tz) if self.tz else moment.astimezone()
+        start = (local + timedelta(minutes=1)).replace(second=0, microsecond=0)
+        day = start.replace(hour=0, minute=0)
+        # Every valid expression matches within four years (Feb 29)
+        for _ in range(4 * 366):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = day.replace(hour=hour, minute=minute)
+                        if candidate >= start:
+                            return candidate
+            day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+    def __repr__(self) -> str:
+        return f"cron {self.expression!r}"
+
+
+Trigger = Union[IntervalTrigger, CronTrigger]
+
+
+class Job:
+    """A coroutine function run on a trigger, with its run statistics."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        trigger: Trigger,
+        overlap: str = OVERLAP_SKIP,
+        jitter_seconds: float = 0.0,
+        run_immediately: bool = False,
+    ):
+        if overlap not in (OVERLAP_SKIP, OVERLAP_COALESCE):
+            raise ValueError(f"Unknown overlap policy {overlap!r}")
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.overlap = overlap
+        self.jitter_seconds = jitter_seconds
+        self.run_immediately = run_immediately
+
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+        self.last_started: Optional[datetime] = None
+        self.next_run: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rerun = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "coalesced": self.coalesced,
+            "running": self.running,
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_duration_sec": round(self.last_duration, 3),
+            "avg_duration_sec": round(self.total_duration / self.runs, 3) if self.runs else 0.0,
+            "max_duration_sec": round(self.max_duration, 3),
+        }
+
+
+class AsyncScheduler:
+    """Run jobs on one event loop for the whole life of the process.
+
+    Each job has its own timer task, and runs are started as separate tasks
+    so a slow run never delays the ticks of other jobs. With
+    ``max_concurrent_runs`` due runs beyond the limit wait for a free slot
+    (and count as running for the overlap policy). SIGTERM and SIGINT stop
+    the timers and wait up to ``shutdown_timeout`` seconds for runs in
+    progress before cancelling them.
+    """
+
+    def __init__(self, shutdown_timeout: float = 60.0, max_concurrent_runs: Optional[int] = None):
+        self.shutdown_timeout = shutdown_timeout
+        self.max_concurrent_runs = max_concurrent_runs
+        self.jobs: Dict[str, Job] = {}
+        self._stop: Optional[asyncio.Event] = None
+        self._run_slots: Optional[asyncio.Semaphore] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        trigger: Trigger,
+        overlap: str = OVERLAP_SKIP,
+        jitter_seconds: float = 0.0,
+        run_immediately: bool = False,
+    ) -> Job:
+        """Register a coroutine function to run on ``trigger``."""
+        if name in self.jobs:
+            raise ValueError(f"Job {name!r} already exists")
+        job = Job(name, func, trigger, overlap, jitter_seconds, run_immediately)
+        self.jobs[name] = job
+        return job
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: job.stats for name, job in self.jobs.items()}
+
+    def stop(self):
+        """Ask the scheduler to shut down; safe to call from a signal handler."""
+        if self._stop is not None and not self._stop.is_set():
+            logger.info("Stopping...")
+            self._stop.set()
+
+    async def _execute(self, job: Job):
+        """Run a job, once more for every coalesced batch of missed ticks."""
+        while True:
+            job._rerun = False
+            async with self._run_slots or contextlib.nullcontext():
+                job.last_started = datetime.now().astimezone()
+                started = time.monotonic()
+                status = "ok"
+                try:
+                    await job.func()
+                except asyncio.CancelledError:
+                    status = "cancelled"
+                    raise
+                except Exception as e:
+                    job.failures += 1
+                    status = "failed"
+                    logger.error("Job %s failed: %s", job.name, e)
+                finally:
+                    duration = time.monotonic() - started
+                    job.runs += 1
+                    job.last_duration = duration
+                    job.total_duration += duration
+                    job.max_duration = max(job.max_duration, duration)
+                    JOB_RUN_SECONDS.observe(duration, job=job.name)
+                    JOB_RUNS.inc(job=job.name, status=status)
+            logger.info("Job %s finished in %.1fs: %s", job.name, duration, job.stats)
+            if not job._rerun or self._stop.is_set():
+                return
+
+    def _fire(self, job: Job):
+        if not job.running:
+            job._task = asyncio.create_task(self._execute(job))
+        elif job.overlap == OVERLAP_COALESCE:
+            job.coalesced += 1
+            job._rerun = True
+            logger.info("Job %s still running, will run again after it", job.name)
+        else:
+            job.skipped += 1
+            JOB_RUNS.inc(job=job.name, status="skipped")
+            logger.warning("Job %s still running, skipping this run", job.name)
+
+    async def _timer(self, job: Job):
+        """Fire a job on its trigger until the scheduler stops."""
+        now = datetime.now().astimezone()
+        job.next_run = now if job.run_immediately else job.trigger.next_after(now)
+        while not self._stop.is_set():
+            delay = (job.next_run - datetime.now().astimezone()).total_seconds()
+            if job.jitter_seconds:
+                delay += random.uniform(0, job.jitter_seconds)
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=max(0.0, delay))
+                return
+            except asyncio.TimeoutError:
+                pass
+            self._fire(job)
+            # Follow the schedule, not the jittered firing time, so runs do
+            # not drift; ticks missed while the loop was busy or suspended
+            # are not replayed
+            now = datetime.now().astimezone()
+            job.next_run = job.trigger.next_after(job.next_run)
+            if job.next_run <= now:
+                job.next_run = job.trigger.next_after(now)
+
+    def _install_signal_handlers(self) -> List[signal.Signals]:
+        loop = asyncio.get_running_loop()
+        installed = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                # Not supported on this platform or outside the main thread
+                pass
+        return installed
+
+    async def run(self):
+        """Run all jobs until ``stop`` is called or a termination signal arrives."""
+        self._stop = asyncio.Event()
+        if self.max_concurrent_runs:
+            self._run_slots = asyncio.Semaphore(self.max_concurrent_runs)
+        installed = self._install_signal_handlers()
+        for job in self.jobs.values():
+            logger.info("Job %s: %s, overlap=%s", job.name, job.trigger, job.overlap)
+
+        timers = [asyncio.create_task(self._timer(job)) for job in self.jobs.values()]
+        try:
+            await self._stop.wait()
+        finally:
+            self._stop.set()
+            await asyncio.gather(*timers, return_exceptions=True)
+
+            running = [job._task for job in self.jobs.values() if job.running]
+            if running:
+                logger.info("Waiting for %d running jobs...", len(running))
+                done, pending = await asyncio.wait(running, timeout=self.shutdown_timeout)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            loop = asyncio.get_running_loop()
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+            logger.info("Stopped: %s", self.stats)
@@ -0,0 +1,223 @@
+"""Paced, flood-wait-aware delivery of messages through telegram-mcp."""
+
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple, TypedDict, Union
+from .mcp_session import UnknownOutcomeError
+from .metrics import TELEGRAM_FLOOD_WAIT_SECONDS, TELEGRAM_SENDS
+from . import tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+# Telegram error texts that carry the number of seconds to wait:
+# "FLOOD_WAIT_17", "SLOWMODE_WAIT_60", Telethon's "A wait of 17 seconds is
+# required", and the Bot API's "Too Many Requests: retry after 17"
+FLOOD_WAIT_RE = re.compile(
+    r"(?:FLOOD_WAIT|SLOWMODE_WAIT|FLOOD_PREMIUM_WAIT)_(\d+)"
+    r"|wait of (\d+) seconds"
+    r"|retry after (\d+)",
+    re.IGNORECASE,
+)
+SUCCESS_RE = re.compile(r"\bsent successfully\b", re.IGNORECASE)
+# A fresh server process has not seen the chat yet
+UNKNOWN_ENTITY_RE = re.compile(r"\bentity\b", re.IGNORECASE)
+
+
+class DeliveryResult(TypedDict):
+    """Outcome of sending one message."""
+    part: Optional[int]         # Part number within a summary, if any
+    chat_id: Union[int, str]
+    ok: bool
+    attempts: int
+    flood_wait_sec: float       # Time spent waiting as the server asked
+    duration_sec: float         # Including pacing and flood waits
+    error: str
+    maybe_sent: bool            # Failed after reaching the server, may have been posted
+
+
+def parse_flood_wait(text: str) -> Optional[int]:
+    """Seconds the server asks to wait, or None if the text is not a flood error."""
+    match = FLOOD_WAIT_RE.search(text or "")
+    if not match:
+        return None
+    return int(next(group for group in match.groups() if group is not None))
+
+
+class TokenBucket:
+    """Allow ``burst`` sends at once, refilled at ``rate`` sends per second."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = max(self.updated_at, now)
+
+    def block(self, seconds: float):
+        """Hold every send for ``seconds``, then allow exactly one (after a flood wait)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 1.0
+        self.updated_at = self.blocked_until
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                await asyncio.sleep(self.blocked_until - now)
+                continue
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendQueue:
+    """Deliver messages in order per chat over the client's shared session.
+
+    Sends to one chat are serialized in call order and paced by a token
+    bucket (Telegram allows about 20 messages a minute in a group).
+    FLOOD_WAIT-style errors are waited out for exactly the requested time,
+    up to ``max_flood_wait`` seconds, and the send is repeated; other
+    failures are reported, not retried, except session errors before the
+    message was sent, which are retried up to ``max_attempts`` times. A send
+    cut off by a lost session is reported as ``maybe_sent`` and not repeated.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        messages_per_minute: float = 20,
+        burst: int = 3,
+        max_flood_wait: float = 300,
+        max_attempts: int = 3,
+    ):
+        self.client = client
+        self.rate = messages_per_minute / 60
+        self.burst = burst
+        self.max_flood_wait = max_flood_wait
+        self.max_attempts = max_attempts
+        self._buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._locks: Dict[Union[int, str], asyncio.Lock] = {}
+        self.stats: Dict[str, Any] = {"sent": 0, "failed": 0, "flood_waits": 0, "flood_wait_sec": 0.0}
+
+    def _bucket(self, key: Union[int, str]) -> TokenBucket:
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return self._buckets[key]
+
+    def _lock(self, key: Union[int, str]) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    async def _send_once(self, chat: Dict[str, Any], message: str) -> Tuple[bool, str]:
+        """One send_message call; returns (sent, result text)."""
+        for attempt in range(2):
+            result = await self.client.call_tool("send_message", {
+                "chat_id": chat["id"],
+                "message": message
+            }, idempotent=False)
+            result_text = result.content[0].text if result.content else ""
+            logger.debug("Send result: %s", result_text)
+            if getattr(result, "isError", False):
+                return False, result_text
+            if SUCCESS_RE.search(result_text):
+                return True, result_text
+            if attempt == 0 and UNKNOWN_ENTITY_RE.search(result_text):
+                # The directory was loaded from disk, listing chats populates
+                # the server's entity cache
+                logger.info("Discovering channel %s and retrying...", chat["id"])
+                await self.client.chat_directory.refresh(force=True)
+                continue
+            return False, result_text
+        return False, result_text
+
+    async def send(self, chat_id: Union[int, str], message: str, part: Optional[int] = None) -> DeliveryResult:
+        """Send one message; ``chat_id`` may be a title or any form of the ID."""
+        started = time.monotonic()
+        result: DeliveryResult = {
+            "part": part, "chat_id": chat_id, "ok": False,
+            "attempts": 0, "flood_wait_sec": 0.0, "duration_sec": 0.0, "error": "",
+            "maybe_sent": False
+        }
+        with tracing.span(
+            "telegram.send", chat_id=str(chat_id), part=part or 0, bytes=len(message.encode("utf-8"))
+        ) as span:
+            try:
+                chat = await self.client.chat_directory.resolve(chat_id)
+            except Exception as e:
+                chat = None
+                result["error"] = f"Failed to resolve chat: {e}"
+            if chat is None:
+                result["error"] = result["error"] or f"Chat {chat_id} not found in chat directory"
+            else:
+                async with self._lock(chat["id"]):
+                    await self._deliver(chat, message, result)
+            span.set_attributes(
+                ok=result["ok"], attempts=result["attempts"], flood_wait_sec=result["flood_wait_sec"]
+            )
+            if result["error"]:
+                span.set_attribute("error", result["error"])
+
+        result["duration_sec"] = round(time.monotonic() - started, 3)
+        self.stats["sent" if result["ok"] else "failed"] += 1
+        TELEGRAM_SENDS.inc(status="ok" if result["ok"] else "failed")
+        if not result["ok"]:
+            logger.warning("Send failed: %s", result["error"])
+        return result
+
+    async def _deliver(self, chat: Dict[str, Any], message: str, result: DeliveryResult):
+        bucket = self._bucket(chat["id"])
+        session_errors = 0
+        while True:
+            await bucket.acquire()
+            result["attempts"] += 1
+            try:
+                sent, result_text = await self._send_once(chat, message)
+            except UnknownOutcomeError as e:
+                # Sending again could post the message twice
+                result["error"] = str(e)
+                result["maybe_sent"] = True
+                return
+            except Exception as e:
+                session_errors += 1
+                result["error"] = str(e)
+                if session_errors >= self.max_attempts:
+                    return
+                await asyncio.sleep(session_errors)
+                continue
+
+            if sent:
+                result["ok"] = True
+                result["error"] = ""
+                return
+
+            result["error"] = result_text
+            wait = parse_flood_wait(result_text)
+            if wait is None:
+                return
+            if wait > self.max_flood_wait:
+                result["error"] = f"Flood wait of {wait}s exceeds {self.max_flood_wait:.0f}s: {result_text}"
+                return
+            logger.warning("Flood wait for chat %s: sleeping %ds", chat["id"], wait)
+            self.stats["flood_waits"] += 1
+            self.stats["flood_wait_sec"] += wait
+            TELEGRAM_FLOOD_WAIT_SECONDS.inc(wait)
+            result["flood_wait_sec"] += wait
+            bucket.block(wait)
+
+    async def send_all(self, chat_id: Union[int, str], parts: List[str]) -> List[DeliveryResult]:
+        """Send summary parts in order, numbered from 1; a failed part does not stop the rest."""
+        results = []
+        for number, text in enumerate(parts, 1):
+            results.append(await self.send(chat_id, text, part=number))
+        return results
@@ -0,0 +1,278 @@
+"""Formatting of processed messages into Telegram-sized summary parts."""
+
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+MSK = timezone(timedelta(hours=3))
+
+# BitKogan / Development group ID, for links to messages without a chat_id
+LINK_CHAT_ID = 2083014011
+
+# Telegram's limit: 4096 UTF-16 code units of text after Markdown parsing,
+# so markup and link URLs do not count
+TELEGRAM_MAX_LENGTH = 4096
+# Room for the "Часть 12/34" label put in front of numbered parts
+PART_LABEL_RESERVE = 24
+MAX_PART_LENGTH = TELEGRAM_MAX_LENGTH - PART_LABEL_RESERVE
+
+# Markdown entities of Telethon's parser; the last named group of a match
+# is the text that stays visible once the markup is parsed
+MARKDOWN_ENTITY_RE = re.compile(
+    r"\[(?P<link>[^\]]+)\]\([^)]+\)"
+    r"|```(?P<pre>.+?)```"
+    r"|\*\*(?P<bold>.+?)\*\*"
+    r"|__(?P<italic>.+?)__"
+    r"|~~(?P<strike>.+?)~~"
+    r"|`(?P<code>[^`]+)`",
+    re.DOTALL,
+)
+# Most messages have no markup at all
+MARKDOWN_CHAR_RE = re.compile(r"[\[*_~`]")
+
+# Places to split an oversized message, most preferred first:
+# paragraph, line, sentence and word breaks
+BREAK_RES = (
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?…])\s+"),
+    re.compile(r"\s+"),
+)
+
+
+def utf16_length(text: str) -> int:
+    """Length in UTF-16 code units; emoji outside the BMP count as two."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _visible_text(match: re.Match) -> str:
+    return match.group(match.lastgroup)
+
+
+def strip_markdown(text: str) -> str:
+    """Text as Telegram shows it, without markup and link URLs."""
+    if not MARKDOWN_CHAR_RE.search(text):
+        return text
+    return MARKDOWN_ENTITY_RE.sub(_visible_text, text)
+
+
+def telegram_length(text: str) -> int:
+    """Length Telegram checks against its limit for Markdown ``text``."""
+    return utf16_length(strip_markdown(text))
+
+
+def format_period_text(time_period_minutes: Optional[int], now: Optional[datetime] = None) -> str:
+    """Describe the summarized period as "с HH:MM до HH:MM MSK"."""
+    now_msk = (now or datetime.now(timezone.utc)).astimezone(MSK)
+
+    if time_period_minutes:
+        # Custom period
+        start_time = now_msk - timedelta(minutes=time_period_minutes)
+    else:
+        # Default: from 8 AM MSK today, or yesterday before 8 AM
+        start_time = now_msk.replace(hour=8, minute=0, second=0, microsecond=0)
+        if now_msk < start_time:
+            start_time -= timedelta(days=1)
+
+    return f"с {start_time.strftime('%H:%M')} до {now_msk.strftime('%H:%M')} MSK"
+
+
+def summary_title(source_channels: List[str], period_text: str) -> str:
+    return f"Сводка сообщений из {', '.join(source_channels)} {period_text}"
+
+
+def format_message_date(date_str: str) -> str:
+    """Convert a UTC message date to "YYYY-MM-DD HH:MM MSK"."""
+    if not date_str:
+        return "Unknown MSK"
+    try:
+        utc_dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        return utc_dt.astimezone(MSK).strftime("%Y-%m-%d %H:%M MSK")
+    except ValueError:
+        return date_str[:16].replace('T', ' ') + " MSK"
+
+
+def _entry_fragments(msg: Dict[str, Any], index: int, link_chat_id: int) -> Tuple[str, str, str, int, int]:
+    """Header, text and link tail of a summary entry, with the Telegram
+    lengths of the header and the tail."""
+    author = msg.get("author", "Unknown")
+    text = msg.get("text", "")
+    msg_id = msg.get("id", "")
+    mention_prefix = "🔔 " if msg.get("mentioned", False) else ""
+
+    link = f"https://t.me/c/{msg.get('chat_id') or link_chat_id}/{msg_id}" if msg_id else ""
+    link_text = f" [Ссылка]({link})" if link else ""
+
+    date = format_message_date(msg.get('date', ''))
+    header = f"{mention_prefix}{index}. **{author}** ({date}):\n"
+    # The markup added here is known, only the author needs parsing
+    header_length = telegram_length(f"{mention_prefix}{index}. {author} ({date}):\n")
+    tail_length = utf16_length(" Ссылка\n\n" if link else "\n\n")
+    return header, text, f"{link_text}\n\n", header_length, tail_length
+
+
+def format_message_entry(msg: Dict[str, Any], index: int, link_chat_id: int = LINK_CHAT_ID) -> str:
+    """Numbered summary entry with author, date and a link to the original."""
+    return "".join(_entry_fragments(msg, index, link_chat_id)[:3])
+
+
+def split_text(text: str, max_length: int) -> List[str]:
+    """Split text into pieces of at most ``max_length`` by ``telegram_length``.
+
+    Each piece ends at the last paragraph, line, sentence or word break that
+    fits, and never inside a Markdown entity; an entity too long for a piece
+    by itself is left without its markup. Text without any break is cut at
+    the limit, which never falls between the halves of a surrogate pair.
+    """
+    max_length = max(max_length, 1)
+    text = MARKDOWN_ENTITY_RE.sub(
+        lambda m: _visible_text(m) if telegram_length(m.group(0)) > max_length else m.group(0), text
+    )
+
+    # Visible UTF-16 units of each character, zero for markup
+    weights = [2 if char > "\uffff" else 1 for char in text]
+    spans = []
+    for match in MARKDOWN_ENTITY_RE.finditer(text):
+        visible = match.lastgroup
+        for pos in list(range(match.start(), match.start(visible))) + list(range(match.end(visible), match.end())):
+            weights[pos] = 0
+        spans.append((match.start(), match.end()))
+    span_starts = [start for start, _ in spans]
+    prefix = list(accumulate(weights, initial=0))
+
+    def inside_entity(pos: int) -> bool:
+        index = bisect_left(span_starts, pos) - 1
+        return index >= 0 and spans[index][1] > pos
+
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = bisect_right(prefix, prefix[start] + max_length) - 1
+        if end >= len(text):
+            pieces.append(text[start:])
+            break
+        end = max(end, start + 1)
+
+        cut = None
+        for pattern in BREAK_RES:
+            for match in pattern.finditer(text, start, end + 1):
+                if match.start() > start and not inside_entity(match.start()):
+                    cut = match
+            # Only a word break may leave a piece less than half full
+            if cut is not None and (pattern is BREAK_RES[-1] or prefix[cut.start()] - prefix[start] >= max_length // 2):
+                break
+            cut = None
+
+        if cut is not None:
+            pieces.append(text[start:cut.start()])
+            start = cut.end()
+        else:
+            index = bisect_left(span_starts, end) - 1
+            if index >= 0 and spans[index][0] > start and spans[index][1] > end:
+                end = spans[index][0]
+            pieces.append(text[start:end])
+            start = end
+
+    return [piece.strip() for piece in pieces if piece.strip()]
+
+
+class SummaryChunker:
+    """Build summary parts incrementally as messages arrive.
+
+    A part is kept as a list of fragments with its running length as
+    Telegram counts it, and joined once when complete, so building a
+    summary takes time linear in its size. Entries are never split between
+    parts, except a message too long for a part by itself: its text is cut
+    by ``split_text`` and each piece gets the entry's header, the link
+    going with the last one.
+
+    ``add`` returns the parts completed by a message, so parts can be sent
+    before all messages are known; ``finish`` returns the last, partially
+    filled part.
+    """
+
+    def __init__(self, title: str, max_length: int = MAX_PART_LENGTH, link_chat_id: int = LINK_CHAT_ID):
+        self.title = title
+        self.max_length = max_length
+        self.link_chat_id = link_chat_id
+        self.count = 0
+        self.parts = 0
+        self._continuation = f"{title} (продолжение)\n\n"
+        self._continuation_length = telegram_length(self._continuation)
+        self._start(f"{title}\n\n")
+
+    def _start(self, heading: str):
+        self._fragments = [heading]
+        self._length = telegram_length(heading)
+        self._has_entries = False
+
+    def _append(self, fragments: Tuple[str, ...], length: int):
+        self._fragments.extend(fragments)
+        self._length += length
+        self._has_entries = True
+
+    def _flush(self) -> str:
+        part = "".join(self._fragments).strip()
+        self.parts += 1
+        self._start(self._continuation)
+        return part
+
+    def add(self, msg: Dict[str, Any]) -> List[str]:
+        """Add a message; returns the parts it completed, usually none."""
+        self.count += 1
+        header, text, tail, header_length, tail_length = _entry_fragments(msg, self.count, self.link_chat_id)
+        length = header_length + telegram_length(text) + tail_length
+
+        completed = []
+        if self._has_entries and self._length + length > self.max_length:
+            completed.append(self._flush())
+        if self._length + length <= self.max_length:
+            self._append((header, text, tail), length)
+            return completed
+
+        # Too long for a part of its own: spread the text over several
+        room = self.max_length - self._continuation_length - header_length - tail_length
+        pieces = split_text(text, room)
+        for number, piece in enumerate(pieces, 1):
+            if self._has_entries:
+                completed.append(self._flush())
+            piece_tail = tail if number == len(pieces) else "\n\n"
+            self._append(
+                (header, piece, piece_tail),
+                header_length + telegram_length(piece) + telegram_length(piece_tail)
+            )
+        return completed
+
+    def finish(self) -> Optional[str]:
+        """Return the last part, or None if no message was added to it."""
+        if not self._has_entries:
+            return None
+        part = "".join(self._fragments).strip()
+        self.parts += 1
+        self._fragments = []
+        self._length = 0
+        self._has_entries = False
+        return part
+
+
+def split_summary(messages: List[Dict[str, Any]], title: str, max_length: int = MAX_PART_LENGTH) -> List[str]:
+    """Format all messages into parts labeled "Часть i/N" when there are several."""
+    chunker = SummaryChunker(title, max_length)
+    parts = []
+    for msg in messages:
+        parts.extend(chunker.add(msg))
+    last_part = chunker.finish()
+    if last_part is not None:
+        parts.append(last_part)
+
+    if len(parts) > 1:
+        parts = [f"Часть {number}/{len(parts)}\n\n{part}" for number, part in enumerate(parts, 1)]
+    return parts
+
+
+def resolve_target_chat(target_channel: str) -> Union[int, str]:
+    """Chat ID to send to; "infotest" is the test channel's ID."""
+    return 2514401938 if target_channel == "infotest" else target_channel
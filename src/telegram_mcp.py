@@ -1,5 +1,6 @@
 """Telegram MCP client for fetching messages."""
 
+import logging
 import subprocess
 import json
 import asyncio
@@ -7,6 +8,9 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
 
+logger = logging.getLogger(__name__)
+
+
 class TelegramMCPClient:
     """Client for interacting with Telegram MCP server."""
     
@@ -20,7 +24,7 @@ class TelegramMCPClient:
         if params is None:
             params = {}
         
-        print(f"[DEBUG] Running MCP command: {method} with params: {params}")
+        logger.debug("Running MCP command: %s with params: %s", method, params)
         
         # Create MCP request
         request = {
@@ -31,7 +35,7 @@ class TelegramMCPClient:
         }
         
         try:
-            print(f"[DEBUG] Starting MCP process: {' '.join(self.mcp_command)}")
+            logger.debug("Starting MCP process: %s", " ".join(self.mcp_command))
             
             # Run the MCP server command
             process = await asyncio.create_subprocess_exec(
@@ -41,16 +45,16 @@ class TelegramMCPClient:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            print(f"[DEBUG] Sending request: {json.dumps(request)}")
+            logger.debug("Sending request: %s", json.dumps(request))
             
             # Send request and get response
             stdout, stderr = await process.communicate(
                 input=json.dumps(request).encode()
             )
             
-            print(f"[DEBUG] Process return code: {process.returncode}")
-            print(f"[DEBUG] Stdout: {stdout.decode()[:500]}...")
-            print(f"[DEBUG] Stderr: {stderr.decode()[:500]}...")
+            logger.debug("Process return code: %s", process.returncode)
+            logger.debug("Stdout: %.500s...", stdout.decode())
+            logger.debug("Stderr: %.500s...", stderr.decode())
             
             if process.returncode != 0:
                 raise RuntimeError(f"MCP command failed: {stderr.decode()}")
@@ -63,7 +67,7 @@ class TelegramMCPClient:
             return response.get("result", {})
         
         except Exception as e:
-            print(f"[DEBUG] Exception in MCP command: {e}")
+            logger.warning("Exception in MCP command: %s", e)
             raise RuntimeError(f"Failed to run MCP command: {e}")
     
     async def get_recent_messages(
@@ -2,16 +2,38 @@
 
 import asyncio
 import json
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from mcp import ClientSession, StdioServerParameters
-from mcp.client.stdio import stdio_client
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
+from mcp import StdioServerParameters
+from .mcp_session import MCPSessionManager
+from .chat_directory import ChatDirectory, ChatEntry
+from .identity import IdentityCache
+from .hydration import HydrationStats, hydrate_messages, plan_windows
+from .message_store import MessageStore
+from .metrics import MCP_CALL_SECONDS, MCP_CALLS
+from . import tracing
+from .send_queue import SendQueue
+from .parsers import MessageRecord, parse_message_context, parse_message_list, parse_user_info
+
+
+logger = logging.getLogger(__name__)
+
+# Tool arguments recorded on trace spans; message texts are left out
+TRACED_ARGUMENTS = ("chat_id", "message_id", "page", "page_size", "limit", "context_size")
 
 
 class TelegramMCPClient:
     """MCP client for interacting with telegram-mcp server."""
     
-    def __init__(self, server_path: str = None):
+    def __init__(
+        self,
+        server_path: str = None,
+        hydration_radius: int = 20,
+        max_concurrent_hydrations: int = 3,
+        message_store: Optional[MessageStore] = None,
+        hydration_min_length: Optional[int] = None
+    ):
         import os
         from dotenv import load_dotenv
         load_dotenv()
@@ -22,237 +44,330 @@ class TelegramMCPClient:
             command="uv",
             args=["--directory", server_path, "run", "main.py"]
         )
+        # One warm server process shared by every call of this client
+        self.session_manager = MCPSessionManager(self.server_params)
+        self.chat_directory = ChatDirectory(self)
+        self.identity = IdentityCache(self)
+        self.send_queue = SendQueue(self)
+        # get_message_context windows used to load full texts of long messages
+        self.hydration_radius = hydration_radius
+        self.max_concurrent_hydrations = max_concurrent_hydrations
+        # Also hydrate texts this long, for a server that cuts without a marker
+        self.hydration_min_length = hydration_min_length
+        # Totals across all fetches of this client
+        self.hydration_stats: Dict[str, int] = {
+            "requested": 0, "hydrated": 0, "missing": 0, "calls": 0, "failed_calls": 0
+        }
+        # Every fetched message is kept locally to resolve later replies
+        self.message_store = message_store or MessageStore()
+        self.reply_stats: Dict[str, int] = {
+            "replies": 0, "in_batch": 0, "from_store": 0, "fetched": 0, "unresolved": 0
+        }
+    
+    async def call_tool(self, name: str, arguments: Dict[str, Any] = None, idempotent: bool = True) -> Any:
+        """Call a telegram-mcp tool over the shared session.
+
+        Pass ``idempotent=False`` for a call that must not be repeated after
+        a reconnect (see ``MCPSessionManager.call_tool``).
+        """
+        traced_arguments = {
+            key: value for key, value in (arguments or {}).items() if key in TRACED_ARGUMENTS
+        }
+        with tracing.span(f"mcp.{name}", tracing.SPAN_KIND_CLIENT, tool=name, **traced_arguments) as span:
+            with MCP_CALL_SECONDS.time(tool=name):
+                try:
+                    result = await self.session_manager.call_tool(name, arguments, idempotent=idempotent)
+                except Exception:
+                    MCP_CALLS.inc(tool=name, status="exception")
+                    raise
+            is_error = getattr(result, "isError", False)
+            MCP_CALLS.inc(tool=name, status="error" if is_error else "ok")
+            if span.recording:
+                span.set_attributes(
+                    is_error=bool(is_error),
+                    response_bytes=sum(
+                        len(getattr(item, "text", "").encode("utf-8")) for item in result.content or []
+                    ),
+                )
+        return result
+    
+    async def close(self):
+        """Shut down the shared MCP session."""
+        await self.session_manager.close()
+        self.message_store.close()
+    
+    async def __aenter__(self) -> "TelegramMCPClient":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    @staticmethod
+    def _parse_date(date_str: str) -> Optional[datetime]:
+        """Parse a message date, treating naive dates as UTC."""
+        try:
+            parsed = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    
+    async def iter_message_pages(
+        self,
+        chat_id: int,
+        start_time: datetime,
+        min_id: Optional[int] = None,
+        page_size: int = 50,
+        max_pages: int = 200
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Walk a chat's history backwards page by page, newest first.
+        
+        Yields each page's messages dated at or after ``start_time`` (and
+        newer than ``min_id``), and stops once a page crosses either
+        boundary, so callers can start processing before the whole range
+        is fetched.
+        """
+        seen_ids = set()
+        
+        for page in range(1, max_pages + 1):
+            result = await self.call_tool("get_messages", {
+                "chat_id": chat_id,
+                "page": page,
+                "page_size": page_size
+            })
+            
+            page_messages = []
+            if result.content and len(result.content) > 0:
+                page_messages = parse_message_list(result.content[0].text)
+            
+            crossed = False
+            selected = []
+            for msg in page_messages:
+                msg_date = self._parse_date(msg["date"])
+                if msg_date is not None and msg_date < start_time:
+                    crossed = True
+                    continue
+                if min_id is not None and int(msg["id"]) <= min_id:
+                    crossed = True
+                    continue
+                # New messages arriving between pages shift the offsets
+                if msg["id"] in seen_ids:
+                    continue
+                seen_ids.add(msg["id"])
+                # Only messages with actual text content are processed
+                if msg["text"]:
+                    selected.append(dict(msg))
+            
+            logger.debug("Page %d: %d messages, %d in range", page, len(page_messages), len(selected))
+            if selected:
+                yield selected
+            
+            # Deleted and service messages can make pages short, so only an
+            # empty page reliably marks the end of the history
+            if crossed or not page_messages:
+                return
+        
+        logger.warning("Stopped after %d pages of chat %s", max_pages, chat_id)
+    
+    async def _resolve_chat(self, chat_name: str) -> ChatEntry:
+        """Resolve a source chat through the cached directory instead of listing chats."""
+        chat = await self.chat_directory.resolve(chat_name)
+        if chat is None:
+            logger.warning("Chat '%s' not found in chat directory", chat_name)
+            raise ValueError(f"Chat '{chat_name}' not found")
+        logger.debug("Found chat ID: %s", chat["id"])
+        return chat
+    
+    async def _prepare_messages(self, chat: ChatEntry, messages: List[Dict[str, Any]]):
+        """Load full texts and reply context of fetched messages, in place."""
+        if not messages:
+            return
+        
+        # Summary links point at the source chat of each message
+        for msg in messages:
+            msg.setdefault("chat_id", chat["id"])
+        
+        # Replace truncated texts with full ones from context windows
+        stats = await self.hydrate_messages(chat["canonical_id"], messages)
+        logger.debug("Hydration: %s", stats)
+        
+        # Resolve what each message replies to, from the batch or the store
+        self.message_store.put_many(chat["canonical_id"], messages)
+        await self._build_reply_context(chat["canonical_id"], messages)
     
     async def get_recent_messages(
         self, 
         chat_name: str = "BitKogan / Development",
         minutes_back: int = 10,
-        limit: int = 50
+        limit: Optional[int] = None,
+        min_id: Optional[int] = None,
+        page_size: int = 50
     ) -> List[Dict[str, Any]]:
-        """Get recent messages from a Telegram chat."""
+        """Get recent messages from a Telegram chat.
         
-        print(f"[MCP] Getting messages from {chat_name} for last {minutes_back} minutes")
+        History is fetched in pages of ``page_size`` until the exact start of
+        the ``minutes_back`` window. With ``min_id`` only messages newer than
+        that ID are returned, so already processed messages are not hydrated
+        or analyzed again. ``limit`` optionally caps the number of messages.
+        """
         
-        async with stdio_client(self.server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                # Initialize the session
-                await session.initialize()
-                
-                # List available tools
-                tools = await session.list_tools()
-                print(f"[MCP] Available tools: {[tool.name for tool in tools.tools]}")
-                
-                # First, get list of chats to find the target chat
-                try:
-                    chats_result = await session.call_tool("list_chats", {"limit": 100})
-                    print(f"[MCP] Chats result type: {type(chats_result)}")
-                    
-                    # Handle text response format from telegram-mcp
-                    if chats_result.content and len(chats_result.content) > 0:
-                        content_text = chats_result.content[0].text
-                        print(f"[MCP] Raw content: {content_text[:200]}...")
-                        
-                        # Parse text format: "Chat ID: 123, Title: Name, Type: group"
-                        target_chat_id = None
-                        for line in content_text.split('\n'):
-                            if f"Title: {chat_name}" in line and "Type: group" in line:
-                                # Extract chat ID from line like "Chat ID: 2083014011, Title: BitKogan / Development, Type: group"
-                                parts = line.split(', ')
-                                for part in parts:
-                                    if part.startswith('Chat ID: '):
-                                        target_chat_id = int(part.replace('Chat ID: ', ''))
-                                        break
-                                break
-                        
-                        if not target_chat_id:
-                            print(f"[MCP] Chat '{chat_name}' not found in response")
-                            raise ValueError(f"Chat '{chat_name}' not found")
-                        
-                        print(f"[MCP] Found chat ID: {target_chat_id}")
-                        
-                        # Calculate time range
-                        end_time = datetime.now()
-                        start_time = end_time - timedelta(minutes=minutes_back)
-                        
-                        # Get messages from the chat
-                        messages_result = await session.call_tool(
-                            "list_messages",
-                            {
-                                "chat_id": target_chat_id,
-                                "limit": limit,
-                                "from_date": start_time.strftime("%Y-%m-%d"),
-                                "to_date": end_time.strftime("%Y-%m-%d")
-                            }
-                        )
-                        
-                        print(f"[MCP] Messages result type: {type(messages_result)}")
-                        
-                        # Parse messages from text format
-                        messages = []
-                        if messages_result.content and len(messages_result.content) > 0:
-                            messages_text = messages_result.content[0].text
-                            print(f"[MCP] Raw messages: {messages_text[:200]}...")
-                            
-                            # Parse format: "ID: 12094 | Егор Тютюрин | Date: 2025-12-12 08:03:16+00:00 | Message: текст"
-                            for line in messages_text.split('\n'):
-                                line = line.strip()
-                                if line and line.startswith('ID:') and '|' in line:
-                                    # Parse the line to extract structured data
-                                    parts = line.split(" | ")
-                                    if len(parts) >= 4:
-                                        msg_id = parts[0].replace("ID: ", "").strip()
-                                        author = parts[1].strip()
-                                        date_str = parts[2].replace("Date: ", "").strip()
-                                        # Keep full message text without truncation
-                                        message_text = " | ".join(parts[3:]).replace("Message: ", "").strip()
-                                        
-                                        if message_text:  # Only include messages with actual text content
-                                            messages.append({
-                                                "id": msg_id,
-                                                "author": author,
-                                                "date": date_str,
-                                                "text": message_text  # This might be truncated
-                                            })
-                        
-                        print(f"[MCP] Parsed {len(messages)} messages")
-                        
-                        # Get full text for all messages in one batch using the first message ID
-                        if messages:
-                            print(f"[MCP] Getting full text for {len(messages)} messages in batch...")
-                            try:
-                                full_texts = await self._get_full_messages_batch(session, target_chat_id, messages)
-                                for msg in messages:
-                                    if msg["id"] in full_texts:
-                                        msg["text"] = full_texts[msg["id"]]
-                                        print(f"[MCP] Updated message {msg['id']} with full text ({len(msg['text'])} chars)")
-                            except Exception as e:
-                                print(f"[MCP] Could not get full texts in batch: {e}")
-                        
-                        # Build context from the batch of messages
-                        self._build_context_from_batch(messages)
-                        
-                        return messages
-                    
-                    else:
-                        print("[MCP] No content in chats_result")
-                        return []
-                    
-                except Exception as e:
-                    print(f"[MCP] Error calling tools: {e}")
-                    raise RuntimeError(f"Failed to get messages via MCP: {e}")
+        logger.info("Getting messages from %s for last %d minutes", chat_name, minutes_back)
+        
+        try:
+            chat = await self._resolve_chat(chat_name)
+            
+            # Calculate time range
+            start_time = datetime.now(timezone.utc) - timedelta(minutes=minutes_back)
+            
+            messages = []
+            async for page in self.iter_message_pages(chat["id"], start_time, min_id, page_size):
+                messages.extend(page)
+                if limit is not None and len(messages) >= limit:
+                    messages = messages[:limit]
+                    break
+            
+            logger.info("Fetched %d messages since %s", len(messages), start_time.isoformat())
+            
+            await self._prepare_messages(chat, messages)
+            return messages
+        
+        except Exception as e:
+            logger.error("Error calling tools: %s", e)
+            raise RuntimeError(f"Failed to get messages via MCP: {e}")
     
-    def _build_context_from_batch(self, messages: List[Dict[str, Any]]):
-        """Build context for messages from the batch itself."""
+    async def iter_recent_messages(
+        self,
+        chat_name: str = "BitKogan / Development",
+        minutes_back: int = 10,
+        min_id: Optional[int] = None,
+        page_size: int = 50
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Like ``get_recent_messages``, but yield each page once it is ready.
+        
+        Every page is hydrated and given reply context on its own, so the
+        first messages can be analyzed while older pages are still fetched.
+        """
+        logger.info("Streaming messages from %s for last %d minutes", chat_name, minutes_back)
+        
+        try:
+            chat = await self._resolve_chat(chat_name)
+            start_time = datetime.now(timezone.utc) - timedelta(minutes=minutes_back)
+            
+            async for page in self.iter_message_pages(chat["id"], start_time, min_id, page_size):
+                await self._prepare_messages(chat, page)
+                yield page
+        
+        except Exception as e:
+            logger.error("Error calling tools: %s", e)
+            raise RuntimeError(f"Failed to get messages via MCP: {e}")
+    
+    async def _build_reply_context(self, chat_id: int, messages: List[Dict[str, Any]]):
+        """Set each message's context to the message it replies to.
+        
+        Replied-to messages are looked up in the batch itself, then in the
+        local message store; only the remaining ones are fetched from
+        telegram-mcp, with as few context windows as possible.
+        """
         # Create a mapping of message ID to message for quick lookup
         msg_map = {msg["id"]: msg for msg in messages}
+        reply_ids = {msg["reply_to"] for msg in messages if msg.get("reply_to")}
+        
+        in_batch = {reply_id for reply_id in reply_ids if reply_id in msg_map}
+        replied = self.message_store.get_many(chat_id, reply_ids - in_batch)
+        from_store = len(replied)
+        
+        missing = [int(reply_id) for reply_id in reply_ids - in_batch - set(replied) if reply_id.isdigit()]
+        fetched = 0
+        if missing:
+            for window in plan_windows(missing, self.hydration_radius):
+                try:
+                    records = await self.get_message_context(chat_id, window["message_id"], window["context_size"])
+                except Exception as e:
+                    logger.warning("Could not fetch replied-to messages around %s: %s", window["message_id"], e)
+                    continue
+                self.message_store.put_many(chat_id, records.values())
+                for message_id in window["ids"]:
+                    record = records.get(str(message_id))
+                    if record and record["text"]:
+                        replied[str(message_id)] = record
+                        fetched += 1
+        
+        replied.update((reply_id, msg_map[reply_id]) for reply_id in in_batch)
         
         for msg in messages:
             context_parts = []
-            text = msg["text"]
+            reply_id = msg.get("reply_to")
             
-            # Look for "reply to XXXXX" pattern in the text
-            if "reply to " in text:
-                import re
-                reply_matches = re.findall(r'reply to (\d+)', text)
-                
-                for reply_id in reply_matches:
-                    if reply_id in msg_map:
-                        replied_msg = msg_map[reply_id]
-                        # Show the actual content of the replied message
-                        replied_text = replied_msg['text'].replace(f"reply to {reply_id} | ", "")
-                        context_parts.append(f"Отвечает на: {replied_msg['author']}: {replied_text}")
+            if reply_id and reply_id in replied:
+                replied_msg = replied[reply_id]
+                # Show the actual content of the replied message
+                context_parts.append(f"Отвечает на: {replied_msg['author']}: {replied_msg['text']}")
             
             # Set context for the message
             msg["context"] = " | ".join(context_parts) if context_parts else ""
-
-    async def _get_full_messages_batch(self, session: ClientSession, chat_id: int, messages: List[Dict[str, Any]]) -> Dict[str, str]:
-        """Get full text of multiple messages in one batch request."""
-        try:
-            # Convert chat_id to proper format for supergroups
-            if chat_id > 0:
-                chat_id = -1000000000000 - chat_id
-            
-            # Find the middle message ID and use large context to get all messages
-            message_ids = [int(msg["id"]) for msg in messages]
-            min_id = min(message_ids)
-            max_id = max(message_ids)
-            middle_id = min_id + (max_id - min_id) // 2
-            
-            # Use large context size to capture all messages in range
-            context_size = len(messages) + 5  # Add some buffer
-            
-            result = await session.call_tool("get_message_context", {
-                "chat_id": chat_id,
-                "message_id": middle_id,
-                "context_size": context_size
-            })
-            
-            full_texts = {}
-            
-            if result.content and len(result.content) > 0:
-                context_text = result.content[0].text
-                
-                # Parse the context to extract full message texts
-                lines = context_text.split('\n')
-                current_msg_id = None
-                current_content = []
-                
-                for line in lines:
-                    if line.startswith("ID: ") and "|" in line:
-                        # Save previous message if exists
-                        if current_msg_id and current_content:
-                            full_texts[current_msg_id] = "\n".join(current_content).strip()
-                        
-                        # Extract message ID
-                        parts = line.split(" | ")
-                        if len(parts) > 0:
-                            msg_id_part = parts[0].replace("ID: ", "").strip()
-                            current_msg_id = msg_id_part
-                            current_content = []
-                    elif current_msg_id and line.strip() and not line.startswith("Context for message"):
-                        current_content.append(line)
-                
-                # Save last message
-                if current_msg_id and current_content:
-                    full_texts[current_msg_id] = "\n".join(current_content).strip()
-            
-            return full_texts
-        except Exception as e:
-            print(f"[MCP] Error getting full messages batch: {e}")
-            return {}
+        
+        stats = {
+            "replies": len(reply_ids),
+            "in_batch": len(in_batch),
+            "from_store": from_store,
+            "fetched": fetched,
+            "unresolved": len(reply_ids) - len(in_batch) - from_store - fetched
+        }
+        for key, value in stats.items():
+            self.reply_stats[key] += value
+        if reply_ids:
+            logger.debug("Reply context: %s, store %s", stats, self.message_store.stats)
+    
+    async def get_message_context(
+        self,
+        chat_id: int,
+        message_id: int,
+        context_size: int
+    ) -> Dict[str, MessageRecord]:
+        """Fetch the messages around ``message_id``, keyed by message ID."""
+        result = await self.call_tool("get_message_context", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "context_size": context_size
+        })
+        if result.content and len(result.content) > 0:
+            return parse_message_context(result.content[0].text)
+        return {}
+    
+    async def hydrate_messages(self, chat_id: int, messages: List[Dict[str, Any]]) -> HydrationStats:
+        """Load full texts of truncated messages with the fewest context calls."""
+        async def fetch_context(message_id: int, context_size: int) -> Dict[str, MessageRecord]:
+            records = await self.get_message_context(chat_id, message_id, context_size)
+            # Neighbours come with full texts, keep them for reply resolution
+            self.message_store.put_many(chat_id, records.values())
+            return records
+        
+        stats = await hydrate_messages(
+            fetch_context,
+            messages,
+            radius=self.hydration_radius,
+            max_concurrent=self.max_concurrent_hydrations,
+            min_length=self.hydration_min_length
+        )
+        for key, value in stats.items():
+            self.hydration_stats[key] += value
+        return stats
     
     async def get_current_user(self) -> Dict[str, Any]:
         """Get current user information."""
         try:
-            async with stdio_client(self.server_params) as (read, write):
-                async with ClientSession(read, write) as session:
-                    await session.initialize()
-                    
-                    result = await session.call_tool("get_me", {})
-                    
-                    if result.content and len(result.content) > 0:
-                        user_text = result.content[0].text
-                        print(f"[MCP] Raw user info: {user_text}")
-                        
-                        # Parse JSON format
-                        import json
-                        try:
-                            user_info = json.loads(user_text)
-                            print(f"[MCP] Parsed user info: {user_info}")
-                            return user_info
-                        except json.JSONDecodeError:
-                            # Fallback to line parsing
-                            user_info = {}
-                            for line in user_text.split('\n'):
-                                if ':' in line:
-                                    key, value = line.split(':', 1)
-                                    key_clean = key.strip().lower().replace(' ', '_')
-                                    user_info[key_clean] = value.strip()
-                            return user_info
-                    
-                    return {}
+            result = await self.call_tool("get_me", {})
+
+            if result.content and len(result.content) > 0:
+                user_text = result.content[0].text
+                logger.debug("Raw user info: %s", user_text)
+
+                user_info = parse_user_info(user_text)
+                logger.debug("Parsed user info: %s", user_info)
+                return user_info
+
+            return {}
         except Exception as e:
-            print(f"[MCP] Error getting current user: {e}")
+            logger.warning("Error getting current user: %s", e)
             return {}
     
     def format_messages_for_summary(self, messages: List[Dict[str, Any]]) -> str:
@@ -267,21 +382,15 @@ class TelegramMCPClient:
             content = msg.get("text", "")
             
             if content and "ID:" in content and "|" in content:
-                # Parse format: "ID: 12094 | Егор Тютюрин | Date: 2025-12-12 08:03:16+00:00 | Message: текст"
-                parts = content.split(" | ")
-                if len(parts) >= 4:
-                    msg_id = parts[0].replace("ID: ", "").strip()
-                    author = parts[1].strip()
-                    date_str = parts[2].replace("Date: ", "").strip()
-                    message_text = " | ".join(parts[3:]).replace("Message: ", "").strip()
-                    
-                    if message_text:  # Only include messages with actual text content
-                        formatted.append(f"[{date_str}] {author}: {message_text}")
+                # Raw "ID: 12094 | Егор Тютюрин | Date: ... | Message: текст" records
+                for record in parse_message_list(content):
+                    if record["text"]:  # Only include messages with actual text content
+                        formatted.append(f"[{record['date']}] {record['author']}: {record['text']}")
                         message_data.append({
-                            "id": msg_id,
-                            "author": author,
-                            "date": date_str,
-                            "text": message_text
+                            "id": record["id"],
+                            "author": record["author"],
+                            "date": record["date"],
+                            "text": record["text"]
                         })
         
         if not formatted:
@@ -291,53 +400,19 @@ class TelegramMCPClient:
         result = "\n".join(formatted)
         if message_data:
             # Store message data as JSON for later parsing
-            import json
             result += f"\n\n[MESSAGE_DATA: {json.dumps(message_data)}]"
         
         return result
     
-    async def send_message_to_channel(self, chat_id: int, message: str) -> bool:
-        """Send message to a Telegram channel using the same session."""
-        print(f"[MCP] Sending message to channel {chat_id}")
+    async def send_message_to_channel(self, chat_id: Union[int, str], message: str) -> bool:
+        """Send message to a Telegram channel over the shared session.
         
-        async with stdio_client(self.server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                # Initialize the session
-                await session.initialize()
-                
-                try:
-                    # First, "discover" the channel by listing chats to populate entity cache
-                    print(f"[MCP] Discovering channel {chat_id} first...")
-                    chats_result = await session.call_tool("list_chats", {"limit": 200})
-                    
-                    # Check if our target channel is in the list
-                    channel_found = False
-                    if chats_result.content and len(chats_result.content) > 0:
-                        content_text = chats_result.content[0].text
-                        if f"Chat ID: {chat_id}" in content_text:
-                            channel_found = True
-                            print(f"[MCP] Channel {chat_id} found in chat list")
-                    
-                    if not channel_found:
-                        print(f"[MCP] Channel {chat_id} not found in chat list")
-                        return False
-                    
-                    # Now try to send the message
-                    result = await session.call_tool("send_message", {
-                        "chat_id": chat_id,
-                        "message": message
-                    })
-                    
-                    print(f"[MCP] Send result: {result.content[0].text}")
-                    
-                    # Check if message was sent successfully
-                    if "successfully" in result.content[0].text.lower():
-                        print(f"[MCP] Message sent successfully to channel {chat_id}")
-                        return True
-                    else:
-                        print(f"[MCP] Send failed: {result.content[0].text}")
-                        return False
-                        
-                except Exception as e:
-                    print(f"[MCP] Error sending message: {e}")
-                    return False
+        ``chat_id`` may be a chat title or any form of the chat ID. Sends go
+        through ``send_queue``, which paces them and waits out flood limits;
+        use it directly for the structured ``DeliveryResult``.
+        """
+        logger.debug("Sending message to channel %s", chat_id)
+        result = await self.send_queue.send(chat_id, message)
+        if result["ok"]:
+            logger.info("Message sent successfully to channel %s", chat_id)
+        return result["ok"]
@@ -1,9 +1,13 @@
 """Mock Telegram client for testing."""
 
+import logging
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 
 
+logger = logging.getLogger(__name__)
+
+
 class TelegramMockClient:
     """Mock client for testing without real Telegram connection."""
     
@@ -18,7 +22,7 @@ class TelegramMockClient:
     ) -> List[Dict[str, Any]]:
         """Get mock recent messages."""
         
-        print(f"[MOCK] Getting messages from {chat_name} for last {minutes_back} minutes")
+        logger.info("Getting mock messages from %s for last %d minutes", chat_name, minutes_back)
         
         # Generate some mock messages
         now = datetime.now()
@@ -0,0 +1,227 @@
+"""Report on one run from a trace file written by ``tracing``.
+
+    python -m src.trace_report traces.jsonl --list
+    python -m src.trace_report traces.jsonl [--trace ID] [--top 15]
+
+Without ``--trace`` the most recent run is shown: its critical path, the
+chain of spans the run actually waited on, then the slowest spans and the
+self time (not covered by child spans) per span name.
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TypedDict
+
+
+class SpanRecord(TypedDict):
+    trace_id: str
+    span_id: str
+    parent_id: str
+    name: str
+    start: float            # Unix seconds
+    end: float
+    attributes: Dict[str, Any]
+    error: str
+
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "arrayValue" in value:
+        return [_attribute_value(item) for item in value["arrayValue"].get("values", [])]
+    for key in ("stringValue", "boolValue", "doubleValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def load_spans(path: Path) -> List[SpanRecord]:
+    """Spans of every OTLP/JSON request in a JSON-lines file."""
+    spans: List[SpanRecord] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            for resource_spans in request.get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    for span in scope_spans.get("spans", []):
+                        status = span.get("status") or {}
+                        spans.append({
+                            "trace_id": span["traceId"],
+                            "span_id": span["spanId"],
+                            "parent_id": span.get("parentSpanId", ""),
+                            "name": span["name"],
+                            "start": int(span["startTimeUnixNano"]) / 1e9,
+                            "end": int(span["endTimeUnixNano"]) / 1e9,
+                            "attributes": {
+                                item["key"]: _attribute_value(item["value"])
+                                for item in span.get("attributes", [])
+                            },
+                            "error": status.get("message", "") if status.get("code") == 2 else "",
+                        })
+    return spans
+
+
+def group_traces(spans: Iterable[SpanRecord]) -> Dict[str, List[SpanRecord]]:
+    traces: Dict[str, List[SpanRecord]] = defaultdict(list)
+    for span in spans:
+        traces[span["trace_id"]].append(span)
+    return traces
+
+
+def find_root(spans: List[SpanRecord]) -> SpanRecord:
+    """The root span, or the longest one whose parent is missing from the file."""
+    ids = {span["span_id"] for span in spans}
+    orphans = [span for span in spans if span["parent_id"] not in ids]
+    return max(orphans or spans, key=lambda span: span["end"] - span["start"])
+
+
+def children_by_parent(spans: List[SpanRecord]) -> Dict[str, List[SpanRecord]]:
+    children: Dict[str, List[SpanRecord]] = defaultdict(list)
+    for span in spans:
+        if span["parent_id"]:
+            children[span["parent_id"]].append(span)
+    return children
+
+
+def self_time(span: SpanRecord, children: List[SpanRecord]) -> float:
+    """Duration of ``span`` not covered by any of its (possibly concurrent) children."""
+    covered = 0.0
+    cursor = span["start"]
+    for child in sorted(children, key=lambda child: child["start"]):
+        start = max(child["start"], cursor)
+        end = min(child["end"], span["end"])
+        if end > start:
+            covered += end - start
+            cursor = end
+    return max(0.0, span["end"] - span["start"] - covered)
+
+
+def critical_path(
+    span: SpanRecord,
+    children: Dict[str, List[SpanRecord]],
+    depth: int = 0,
+) -> List[Tuple[SpanRecord, int, float]]:
+    """``(span, depth, time on the path)`` of the chain the root waited on.
+
+    Walking back from the end of a span, the child that finished last is on
+    the path; before its start, the child that finished last before that,
+    and so on. Concurrent children that finished earlier are off the path.
+    Time on the path is the part of a span not spent in such children.
+    """
+    chosen: List[SpanRecord] = []
+    cursor = span["end"]
+    # Children outliving the span (background tasks) count up to its end
+    ends = {child["span_id"]: min(child["end"], span["end"]) for child in children.get(span["span_id"], [])}
+    for child in sorted(children.get(span["span_id"], []), key=lambda child: ends[child["span_id"]], reverse=True):
+        if ends[child["span_id"]] <= cursor and child["start"] < cursor:
+            chosen.append(child)
+            cursor = child["start"]
+    on_path = _duration(span) - sum(ends[child["span_id"]] - max(child["start"], span["start"]) for child in chosen)
+    path = [(span, depth, max(0.0, on_path))]
+    for child in reversed(chosen):
+        path.extend(critical_path(child, children, depth + 1))
+    return path
+
+
+def _duration(span: SpanRecord) -> float:
+    return span["end"] - span["start"]
+
+
+def _describe(span: SpanRecord, width: int = 60) -> str:
+    """Name with its most useful attributes, shortened to ``width``."""
+    details = ", ".join(
+        f"{key}={value}" for key, value in span["attributes"].items()
+        if key not in ("node", "message_ids") and value not in ("", None)
+    )
+    text = f"{span['name']} ({details})" if details else span["name"]
+    if span["error"]:
+        text += f" ERROR: {span['error']}"
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:10.1f}ms"
+
+
+def list_traces(traces: Dict[str, List[SpanRecord]]) -> List[str]:
+    rows = []
+    for trace_id, spans in sorted(traces.items(), key=lambda item: find_root(item[1])["start"]):
+        root = find_root(spans)
+        started = datetime.fromtimestamp(root["start"]).strftime("%Y-%m-%d %H:%M:%S")
+        rows.append(f"{trace_id}  {started}  {_ms(_duration(root))}  {len(spans):5d} spans  {_describe(root)}")
+    return rows
+
+
+def format_report(spans: List[SpanRecord], top: int = 15) -> List[str]:
+    root = find_root(spans)
+    children = children_by_parent(spans)
+    total = _duration(root) or 1e-9
+    started = datetime.fromtimestamp(root["start"]).strftime("%Y-%m-%d %H:%M:%S")
+    lines = [
+        f"Trace {root['trace_id']}, started {started}, {len(spans)} spans",
+        f"{_describe(root, 120)}: {_duration(root):.3f}s",
+        "",
+        "Critical path (total, on path, share of the run):",
+    ]
+    for span, depth, on_path in critical_path(root, children):
+        lines.append(
+            f"{_ms(_duration(span))} {_ms(on_path)} {on_path / total:6.1%}  {'  ' * depth}{_describe(span)}"
+        )
+
+    lines += ["", f"Top {top} slowest spans (total, self):"]
+    for span in sorted(spans, key=_duration, reverse=True)[:top]:
+        lines.append(
+            f"{_ms(_duration(span))} {_ms(self_time(span, children.get(span['span_id'], [])))}  {_describe(span)}"
+        )
+
+    by_name: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    for span in spans:
+        entry = by_name[span["name"]]
+        entry[0] += 1
+        entry[1] += _duration(span)
+        entry[2] += self_time(span, children.get(span["span_id"], []))
+    lines += ["", "Self time by span name (count, total, self):"]
+    for name, (count, duration, own) in sorted(by_name.items(), key=lambda item: item[1][2], reverse=True)[:top]:
+        lines.append(f"{count:6d} {_ms(duration)} {_ms(own)}  {name}")
+    return lines
+
+
+def select_trace(traces: Dict[str, List[SpanRecord]], trace_id: Optional[str]) -> Optional[List[SpanRecord]]:
+    """Spans of the trace whose ID starts with ``trace_id``, or of the latest one."""
+    if not traces:
+        return None
+    if trace_id is None:
+        return max(traces.values(), key=lambda spans: find_root(spans)["start"])
+    matches = [spans for key, spans in traces.items() if key.startswith(trace_id)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Critical path and slowest spans of a traced run")
+    parser.add_argument("trace_file", type=Path, help="JSON-lines file set as trace_file in the config")
+    parser.add_argument("--trace", help="Trace ID or a unique prefix of it, the latest run by default")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest spans to show")
+    parser.add_argument("--list", action="store_true", help="List the traces in the file")
+    args = parser.parse_args(argv)
+
+    traces = group_traces(load_spans(args.trace_file))
+    if args.list:
+        print("\n".join(list_traces(traces)))
+        return 0
+    spans = select_trace(traces, args.trace)
+    if spans is None:
+        problem = f"No single trace matches {args.trace}" if traces else "No traces"
+        print(f"{problem} in {args.trace_file}", file=sys.stderr)
+        return 1
+    print("\n".join(format_report(spans, args.top)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+"""Lightweight tracing of workflow runs into an OTLP-shaped JSON-lines file.
+
+Spans nest through a context variable, so a span opened in a workflow node
+is the parent of the MCP and LLM calls made under it, including those made
+by tasks started there. Finished spans are buffered and appended to the
+trace file when a root span ends, one OTLP/JSON ``ExportTraceServiceRequest``
+per line, the format of the OpenTelemetry Collector's file exporter.
+Tracing is off until ``TRACER.configure`` is given a file; until then
+``span`` costs one attribute check. ``python -m src.trace_report`` reads the
+file back.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+
+logger = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+SERVICE_NAME = "telegram-summary-bot"
+
+
+class Span:
+    """A timed operation with attributes, part of one trace."""
+
+    __slots__ = (
+        "name", "kind", "trace_id", "span_id", "parent_id", "attributes",
+        "start_ns", "end_ns", "_started", "error",
+    )
+    recording = True
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.error = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.end_ns is not None:
+            return
+        # Wall-clock start, monotonic duration
+        self.end_ns = self.start_ns + time.perf_counter_ns() - self._started
+        if error is not None and not isinstance(error, GeneratorExit):
+            self.error = str(error) or type(error).__name__
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_UNSET},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NonRecordingSpan:
+    """Stands in for a span while tracing is off."""
+
+    recording = False
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, **attributes: Any):
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+AnySpan = Union[Span, _NonRecordingSpan]
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Create spans and export finished ones to a JSON-lines file."""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, max_buffered: int = 1000):
+        self.path: Optional[Path] = None
+        self.max_buffered = max_buffered
+        self._finished: List[Span] = []
+        self.exported = 0
+        self.configure(path)
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def configure(self, path: Optional[Union[str, Path]]):
+        """Export to ``path`` from now on; an empty path turns tracing off."""
+        self.flush()
+        self.path = Path(path) if path else None
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+    ) -> Span:
+        """A span under the current one, or the root of a new trace."""
+        parent = _current_span.get()
+        if parent is None:
+            return Span(name, kind, os.urandom(16).hex(), None, attributes or {})
+        return Span(name, kind, parent.trace_id, parent.span_id, attributes or {})
+
+    def end_span(self, span: Span, error: Optional[BaseException] = None):
+        span.finish(error)
+        self._finished.append(span)
+        if span.parent_id is None:
+            logger.debug("Trace %s: %s took %.3fs", span.trace_id, span.name, (span.end_ns - span.start_ns) / 1e9)
+        # Spans of background tasks may end after their root, they go out
+        # with the next trace
+        if span.parent_id is None or len(self._finished) >= self.max_buffered:
+            self.flush()
+
+    def flush(self):
+        if not self._finished:
+            return
+        spans, self._finished = self._finished, []
+        if self.path is None:
+            return
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        }
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            self.exported += len(spans)
+        except OSError as e:
+            logger.warning("Could not write %d spans to %s: %s", len(spans), self.path, e)
+
+
+TRACER = Tracer()
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: int = SPAN_KIND_INTERNAL,
+    activate: bool = True,
+    **attributes: Any,
+) -> Iterator[AnySpan]:
+    """Time the ``with`` block as a span, recording an exception as its error.
+
+    With ``activate`` the span is the parent of spans started inside the
+    block. Pass ``activate=False`` in async generators, whose body runs in the
+    consumer's context between yields, and use ``use_span`` around the parts
+    that should nest.
+    """
+    if not TRACER.enabled:
+        yield NON_RECORDING_SPAN
+        return
+    current = TRACER.start_span(name, kind, attributes)
+    token = _current_span.set(current) if activate else None
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if token is not None:
+            _current_span.reset(token)
+        TRACER.end_span(current, error)
+
+
+@contextmanager
+def use_span(current: AnySpan) -> Iterator[AnySpan]:
+    """Make ``current`` the parent of spans started inside the block."""
+    if not isinstance(current, Span):
+        yield current
+        return
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+def current_span() -> AnySpan:
+    return _current_span.get() or NON_RECORDING_SPAN
+
+
+def set_attributes(**attributes: Any):
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)
@@ -0,0 +1,89 @@
+"""Persistent per-channel watermarks for incremental processing."""
+
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict
+from .paths import get_cache_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+class Watermark(TypedDict):
+    """Newest source message already delivered to a target."""
+    last_message_id: int
+    last_date: str
+    updated_at: float
+
+
+class WatermarkStore:
+    """Track the last delivered message per (source, target) pair.
+
+    Watermarks only move forward, and callers advance them only after the
+    target channel has accepted the summary, so a failed run is retried on
+    the next tick instead of being skipped.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else get_cache_dir() / "watermarks.json"
+        self._watermarks: Dict[str, Watermark] = {}
+        self._load()
+
+    @staticmethod
+    def _key(source: str, target: Any) -> str:
+        return f"{source} -> {target}"
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                self._watermarks = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not load watermarks: %s", e)
+
+    def _save(self):
+        """Persist watermarks atomically."""
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self._watermarks, f, ensure_ascii=False, indent=2)
+        tmp_path.replace(self.path)
+
+    def get(self, source: str, target: Any) -> Optional[Watermark]:
+        return self._watermarks.get(self._key(source, target))
+
+    def get_min_id(self, source: str, target: Any) -> Optional[int]:
+        """ID of the newest processed message, fetch only messages above it."""
+        watermark = self.get(source, target)
+        return watermark["last_message_id"] if watermark else None
+
+    def advance(self, source: str, target: Any, message_id: int, date: str = "") -> bool:
+        """Move the watermark forward; returns False if it is already past ``message_id``."""
+        key = self._key(source, target)
+        current = self._watermarks.get(key)
+        if current and current["last_message_id"] >= message_id:
+            return False
+
+        self._watermarks[key] = {
+            "last_message_id": message_id,
+            "last_date": date,
+            "updated_at": time.time(),
+        }
+        self._save()
+        logger.debug("Watermark %s advanced to message %s", key, message_id)
+        return True
+
+    def advance_from_messages(self, target: Any, messages: List[Dict[str, Any]]):
+        """Advance each source channel's watermark to its newest message."""
+        newest: Dict[str, Dict[str, Any]] = {}
+        for msg in messages:
+            channel = msg.get("channel")
+            if not channel or not str(msg.get("id", "")).isdigit():
+                continue
+            if channel not in newest or int(msg["id"]) > int(newest[channel]["id"]):
+                newest[channel] = msg
+
+        for channel, msg in newest.items():
+            self.advance(channel, target, int(msg["id"]), msg.get("date", ""))
@@ -1,12 +1,41 @@
 """LangGraph workflow for Telegram message processing."""
 
-from typing import Dict, Any, TypedDict, List
+import asyncio
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Any, Optional, TypedDict, List
 from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, SystemMessage
 from .qwen_langchain import QwenChatModel
+from .llm_cache import DecisionCache
+from .watermarks import WatermarkStore
+from .outbox import Outbox, deferred_result, deliver_parts
+from .identity import MentionMatcher
+from .prefilter import Prefilter
+from .metrics import MESSAGES, WORKFLOW_NODE_RUNS, WORKFLOW_NODE_SECONDS
+from . import tracing
+from .summary import (
+    SummaryChunker,
+    format_period_text,
+    resolve_target_chat,
+    split_summary,
+    summary_title,
+)
+from .analysis import (
+    analyze_batch,
+    analyze_messages_concurrently,
+    apply_decision,
+    apply_decisions,
+    build_batch_system_prompt,
+    build_system_prompt,
+    pack_batches,
+)
 from .telegram_mcp import TelegramMCPClient
 
 
+logger = logging.getLogger(__name__)
+
+
 class ProcessingState(TypedDict):
     """State for the message processing workflow."""
     source_channels: List[str]  # List of channel names/IDs to fetch from
@@ -17,284 +46,788 @@ class ProcessingState(TypedDict):
     error: str
     mcp_session: Any           # Store MCP session for reuse
     custom_filter_rules: List[str]  # Custom filtering rules
+    max_concurrent_fetches: int     # How many channels to fetch at once
+    fetch_stats: List[Dict]         # Per-channel timing, message count and error
+    hydration_stats: Dict           # Full-text hydration coverage of this fetch
+    reply_stats: Dict               # How reply contexts of this fetch were resolved
+    analysis_mode: str              # "batch" or "single" LLM requests
+    batch_token_budget: int         # Estimated message tokens per batch request
+    max_concurrent_llm_requests: int  # LLM requests in flight at once
+    llm: Any                        # Shared QwenChatModel for reuse
+    llm_cache: Any                  # Shared DecisionCache for reuse
+    use_llm_cache: bool             # False bypasses the decision cache
+    llm_cache_stats: Dict           # Decision cache hit/miss counters
+    llm_stats: Dict                 # Retries, throttling and latency of LLM requests
+    watermarks: Any                 # WatermarkStore, None disables incremental fetching
+    mention_matcher: Any            # MentionMatcher for the current user
+    stream_queue_size: int          # Pages buffered between stages in streaming mode
+    stream_stats: Dict              # Streaming counters and time to the first part
+    use_prefilter: bool             # Drop trivial messages locally before the LLM
+    prefilter_rules: Dict           # PrefilterRules overriding the defaults
+    prefiltered_messages: List[Dict]  # Messages left for the LLM, None before prefiltering
+    prefilter_stats: Dict           # Dropped messages per rule and LLM calls saved
+    delivery_results: List[Dict]    # DeliveryResult of every summary part sent
+    outbox: Any                     # Outbox persisting parts until delivered, None sends directly
+
+
+async def _fetch_channel(
+    telegram_client: Any,
+    channel: str,
+    time_period: int,
+    semaphore: asyncio.Semaphore,
+    min_id: int = None
+) -> Dict[str, Any]:
+    """Fetch one channel, returning its messages and stats instead of raising."""
+    async with semaphore:
+        logger.debug("Fetching from channel: %s", channel)
+        started = time.monotonic()
+        with tracing.span("fetch_channel", channel=channel, min_id=min_id or 0) as span:
+            try:
+                messages = await telegram_client.get_recent_messages(
+                    chat_name=channel,
+                    minutes_back=time_period,
+                    min_id=min_id
+                )
+                error = ""
+            except Exception as e:
+                logger.error("Error fetching channel %s: %s", channel, e)
+                messages = []
+                error = str(e)
+                span.set_attribute("error", error)
+            span.set_attribute("messages", len(messages))
+        
+        for msg in messages:
+            msg.setdefault("channel", channel)
+        
+        return {
+            "messages": messages,
+            "stats": {
+                "channel": channel,
+                "messages": len(messages),
+                "duration_sec": round(time.monotonic() - started, 3),
+                "error": error
+            }
+        }
+
+
+async def _load_mention_matcher(telegram_client: Any) -> MentionMatcher:
+    """Mention matcher for the current user, empty if the identity is unavailable."""
+    identity = getattr(telegram_client, "identity", None)
+    if identity is None:
+        return MentionMatcher()
+    try:
+        return await identity.get_matcher()
+    except Exception as e:
+        logger.warning("Could not get user info: %s", e)
+        return MentionMatcher()
+
+
+def _stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    """Counters accumulated by a client during this run."""
+    return {key: value - before.get(key, 0) for key, value in after.items()}
+
+
+# Cumulative QwenClient counters reported per run
+LLM_COUNTERS = (
+    "requests", "attempts", "retries", "failures", "throttled", "circuit_rejections",
+    "prompt_tokens", "completion_tokens",
+)
+
+
+def _llm_request_stats(llm: Any) -> Dict[str, Any]:
+    return dict(getattr(getattr(llm, "qwen_client", None), "stats", {}))
+
+
+def _llm_stats_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Request counters of this run, with the client's current latency and limits."""
+    stats = dict(after)
+    for key in LLM_COUNTERS:
+        if key in after:
+            stats[key] = after[key] - before.get(key, 0)
+    return stats
 
 
 async def fetch_messages_from_channels_node(state: ProcessingState) -> Dict[str, Any]:
-    """Fetch messages from specified Telegram channels for given time period."""
-    print("[DEBUG] Starting fetch_messages_from_channels_node")
+    """Fetch messages from specified Telegram channels for given time period.
+    
+    Channels are fetched concurrently, at most ``max_concurrent_fetches`` at a
+    time. A failing channel is reported in ``fetch_stats`` without dropping
+    the messages of the other channels.
+    """
+    logger.debug("Starting fetch_messages_from_channels_node")
     
     try:
-        from .telegram_mcp_client import TelegramMCPClient
-        telegram_client = TelegramMCPClient()
+        # Reuse the warm client passed in by the caller, if any
+        telegram_client = state.get("mcp_session")
+        if telegram_client is None:
+            from .telegram_mcp_client import TelegramMCPClient
+            telegram_client = TelegramMCPClient()
         
-        all_messages = []
         source_channels = state.get("source_channels", ["BitKogan / Development"])
         time_period = state.get("time_period_minutes", 10)
+        semaphore = asyncio.Semaphore(max(1, state.get("max_concurrent_fetches") or 5))
+        
+        # Skip messages already delivered to this target by earlier runs
+        watermarks = state.get("watermarks")
+        target_channel = state.get("target_channel", "infotest")
         
-        for channel in source_channels:
-            print(f"[DEBUG] Fetching from channel: {channel}")
-            messages = await telegram_client.get_recent_messages(
-                chat_name=channel,
-                minutes_back=time_period
+        hydration_before = dict(getattr(telegram_client, "hydration_stats", {}))
+        replies_before = dict(getattr(telegram_client, "reply_stats", {}))
+        # Identity is cached, on a cold start get_me runs next to the fetches
+        matcher_task = asyncio.create_task(_load_mention_matcher(telegram_client))
+        results = await asyncio.gather(*[
+            _fetch_channel(
+                telegram_client, channel, time_period, semaphore,
+                min_id=watermarks.get_min_id(channel, target_channel) if watermarks else None
             )
-            all_messages.extend(messages)
+            for channel in source_channels
+        ])
         
-        print(f"[DEBUG] Total messages fetched: {len(all_messages)}")
+        # Keep the order of source_channels regardless of completion order
+        all_messages = []
+        fetch_stats = []
+        for result in results:
+            all_messages.extend(result["messages"])
+            fetch_stats.append(result["stats"])
+            logger.debug("Channel stats: %s", result["stats"])
+        
+        logger.info("Total messages fetched: %d", len(all_messages))
+        MESSAGES.inc(len(all_messages), stage="fetched")
+        mention_matcher = await matcher_task
+        
+        hydration_stats = _stats_delta(hydration_before, getattr(telegram_client, "hydration_stats", {}))
+        reply_stats = _stats_delta(replies_before, getattr(telegram_client, "reply_stats", {}))
+        logger.debug("Hydration stats: %s", hydration_stats)
+        logger.debug("Reply stats: %s", reply_stats)
+        
+        failed = [stats["channel"] for stats in fetch_stats if stats["error"]]
+        error = ""
+        if failed and len(failed) == len(fetch_stats):
+            error = "Failed to fetch messages: " + "; ".join(
+                f"{stats['channel']}: {stats['error']}" for stats in fetch_stats
+            )
         
         return {
             "raw_messages": all_messages,
-            "error": "",
+            "fetch_stats": fetch_stats,
+            "hydration_stats": hydration_stats,
+            "reply_stats": reply_stats,
+            "mention_matcher": mention_matcher,
+            "error": error,
             "mcp_session": telegram_client
         }
         
     except Exception as e:
-        print(f"[DEBUG] Error fetching messages: {e}")
+        logger.error("Error fetching messages: %s", e)
         return {
             "raw_messages": [],
-            "error": f"Failed to fetch messages: {str(e)}",
-            "mcp_session": None
+            "error": f"Failed to fetch messages: {str(e)}"
         }
 
 
-async def analyze_messages_node(state: ProcessingState) -> Dict[str, Any]:
-    """Analyze each message individually: rephrase or filter out."""
-    print("[DEBUG] Starting analyze_messages_node")
+def _estimate_llm_calls(messages: List[Dict], analysis_mode: str, batch_token_budget: int) -> int:
+    """LLM requests needed to analyze the messages, ignoring the decision cache."""
+    if analysis_mode == "batch":
+        return len(pack_batches(messages, batch_token_budget or 1500))
+    return len(messages)
+
+
+async def prefilter_messages_node(state: ProcessingState) -> Dict[str, Any]:
+    """Drop trivial messages with local rules so they never reach the LLM."""
+    logger.debug("Starting prefilter_messages_node")
     
     raw_messages = state.get("raw_messages", [])
+    if not state.get("use_prefilter", True) or not raw_messages:
+        return {"prefiltered_messages": raw_messages, "prefilter_stats": {}}
+    
+    prefilter = Prefilter(state.get("prefilter_rules"), state.get("mention_matcher"))
+    passed, dropped = prefilter.apply(raw_messages)
+    MESSAGES.inc(len(dropped), stage="prefiltered")
+    
+    mode = state.get("analysis_mode", "batch")
+    budget = state.get("batch_token_budget") or 1500
+    prefilter_stats = prefilter.stats
+    prefilter_stats["llm_calls_saved"] = (
+        _estimate_llm_calls(raw_messages, mode, budget) - _estimate_llm_calls(passed, mode, budget)
+    )
+    logger.info("Prefilter stats: %s", prefilter_stats)
+    
+    return {"prefiltered_messages": passed, "prefilter_stats": prefilter_stats}
+
+
+async def _analyze_messages(
+    messages: List[Dict],
+    llm: Any,
+    llm_cache: Any,
+    mention_matcher: MentionMatcher,
+    custom_filter_rules: List[str],
+    analysis_mode: str = "batch",
+    batch_token_budget: int = 1500,
+    on_message: Optional[Callable[[int, Optional[Dict]], None]] = None
+) -> List[Dict]:
+    """Analyze messages with cached decisions where possible; returns kept messages.
+    
+    ``on_message(index, processed)`` is called once per message with the
+    processed message, or None if it was filtered out: in batch mode as soon
+    as its decision arrives, otherwise once all are analyzed.
+    """
+    user_mentions = mention_matcher.aliases
+    
+    # Local matching also catches inflected names the model may miss
+    for msg in messages:
+        if mention_matcher.matches(msg.get("text", "")):
+            msg["mentioned"] = True
+    
+    system_prompt = build_system_prompt(user_mentions, custom_filter_rules)
+    
+    # Reuse decisions from earlier runs over overlapping windows
+    keys = []
+    cached = {}
+    if llm_cache is not None:
+        keys = [
+            DecisionCache.make_key(
+                system_prompt, llm.model_name, llm.temperature,
+                msg.get("text", ""), msg.get("context", "")
+            )
+            for msg in messages
+        ]
+        cached = llm_cache.get_many(keys)
+    
+    pending = [index for index in range(len(messages)) if not keys or keys[index] not in cached]
+    pending_messages = [messages[index] for index in pending]
+    logger.info("%d decisions from cache, %d to analyze", len(messages) - len(pending), len(pending))
+    
+    reported = set()
+    
+    def report(index: int, analysis: Optional[Dict[str, Any]]):
+        if on_message is None or index in reported:
+            return
+        reported.add(index)
+        on_message(index, messages[index] if analysis is None else apply_decision(messages[index], analysis))
+    
+    for index, key in enumerate(keys):
+        if key in cached:
+            report(index, cached[key])
+    
+    new_decisions = []
+    if pending_messages and analysis_mode == "batch":
+        batch_prompt = build_batch_system_prompt(user_mentions, custom_filter_rules)
+        batches = pack_batches(pending_messages, batch_token_budget or 1500)
+        logger.info("Analyzing %d messages in %d batches", len(pending_messages), len(batches))
+        
+        # Batches run concurrently, the model caps requests in flight
+        batch_calls = []
+        offset = 0
+        for batch in batches:
+            batch_indices = pending[offset:offset + len(batch)]
+            batch_calls.append(analyze_batch(
+                llm, batch_prompt, system_prompt, batch,
+                lambda index, analysis, batch_indices=batch_indices: report(batch_indices[index], analysis)
+            ))
+            offset += len(batch)
+        batch_results = await asyncio.gather(*batch_calls)
+        new_decisions = [analysis for batch_result in batch_results for analysis in batch_result]
+    elif pending_messages:
+        new_decisions = await analyze_messages_concurrently(llm, system_prompt, pending_messages)
+    
+    decisions = [cached.get(key) for key in keys] if keys else [None] * len(messages)
+    for index, analysis in zip(pending, new_decisions):
+        decisions[index] = analysis
+    
+    if llm_cache is not None:
+        # Failed analyses are not cached so the next run retries them
+        llm_cache.put_many({
+            keys[index]: analysis
+            for index, analysis in zip(pending, new_decisions)
+            if analysis is not None
+        })
+    
+    for index, analysis in enumerate(decisions):
+        report(index, analysis)
+    return apply_decisions(messages, decisions)
+
+
+async def analyze_messages_node(state: ProcessingState) -> Dict[str, Any]:
+    """Analyze messages: rephrase or filter out each one.
+    
+    In ``batch`` mode (default) as many messages as fit into
+    ``batch_token_budget`` are analyzed per LLM request; ``single`` mode
+    sends one request per message.
+    """
+    logger.debug("Starting analyze_messages_node")
+    
+    # Messages dropped by the prefilter are not analyzed
+    raw_messages = state.get("prefiltered_messages")
+    if raw_messages is None:
+        raw_messages = state.get("raw_messages", [])
     if not raw_messages:
         return {"processed_messages": []}
     
-    print(f"[DEBUG] First message structure: {raw_messages[0] if raw_messages else 'No messages'}")
+    logger.debug("First message structure: %s", raw_messages[0])
     
     try:
-        # Get current user info for mention detection
-        mcp_session = state.get("mcp_session")
-        user_mentions = []
-        if mcp_session:
-            try:
-                user_info = await mcp_session.get_current_user()
-                if user_info.get('username'):
-                    user_mentions.append(f"@{user_info['username']}")
-                if user_info.get('first_name'):
-                    user_mentions.append(user_info['first_name'])
-                if user_info.get('name'):
-                    user_mentions.append(user_info['name'])
-                user_mentions = [m for m in user_mentions if m and m != '@']
-                print(f"[DEBUG] User mentions to check: {user_mentions}")
-            except Exception as e:
-                print(f"[DEBUG] Could not get user info: {e}")
+        # The fetch node loads the identity alongside the messages
+        mention_matcher = state.get("mention_matcher")
+        if mention_matcher is None:
+            mention_matcher = await _load_mention_matcher(state.get("mcp_session"))
+        logger.debug("User mentions to check: %s", mention_matcher.aliases)
         
-        llm = QwenChatModel()
-        processed_messages = []
+        # Reuse the caller's model so its pooled HTTP connections stay warm
+        llm = state.get("llm") or QwenChatModel(
+            max_concurrency=state.get("max_concurrent_llm_requests") or 4
+        )
         
-        mentions_text = ", ".join(user_mentions) if user_mentions else "не указаны"
+        llm_cache = state.get("llm_cache")
+        owns_cache = llm_cache is None and state.get("use_llm_cache", True)
+        if owns_cache:
+            llm_cache = DecisionCache()
         
-        # Build custom filter rules text
-        custom_rules_text = ""
-        custom_filter_rules = state.get("custom_filter_rules", [])
-        if custom_filter_rules:
-            custom_rules_text = "\n\nДОПОЛНИТЕЛЬНЫЕ ПРАВИЛА ФИЛЬТРАЦИИ:\n" + "\n".join(f"- {rule}" for rule in custom_filter_rules)
-        
-        system_prompt = f"""Ты анализируешь сообщения из IT-чата разработчиков. Для каждого сообщения выполни одно из действий:
-
-1. ПЕРЕФРАЗИРОВАТЬ - если сообщение содержит полезную информацию (включая реакции на важные темы, планы, решения)
-2. ОТФИЛЬТРОВАТЬ - только если сообщение явно бесполезное (спам, одиночные эмодзи, "ок", "да", "+1")
-
-ВАЖНО: 
-- Реакции на важные темы, обещания изучить что-то, планы встреч - это полезная информация, НЕ фильтруй их
-- "прод" = "продакшн" (production), не "продажа"
-- Сохраняй IT-терминологию: релиз, хотфикс, бэкенд, эндпоинт, аппрув и т.д.
-- Используй ТОЛЬКО русский язык, английский допустим только для устоявшихся IT-терминов (API, backend, frontend, deploy и т.д.)
-- Сохраняй английские слова из оригинального сообщения, но не добавляй новые английские слова
-- При перефразировании используй только русские слова: "впечатляющий" вместо "impressive", "отзыв" вместо "feedback"
-- ОБЯЗАТЕЛЬНО сохраняй все упоминания пользователей (@username) из оригинального сообщения
-- НЕ используй квадратные скобки [ ] в тексте - они мешают Markdown ссылкам{custom_rules_text}
-
-ДОПОЛНИТЕЛЬНО: Определи, упомянут ли ТОЧНО текущий пользователь в сообщении.
-Текущий пользователь может быть упомянут как: {mentions_text}
-ВНИМАНИЕ: Ставь mentioned=true ТОЛЬКО если в тексте есть ТОЧНОЕ совпадение с одним из вариантов выше.
-
-Отвечай ТОЛЬКО в формате JSON:
-{{"action": "rephrase", "text": "исправленный текст", "mentioned": true/false}}
-или
-{{"action": "filter", "reason": "причина фильтрации", "mentioned": false}}
-
-Перефразируй на правильном русском языке, сохраняя смысл и IT-контекст."""
-        
-        for msg in raw_messages:
-            try:
-                message_text = msg.get('text', '')
-                context = msg.get('context', '')
-                
-                # Prepare full context for analysis
-                full_context = f"Сообщение: {message_text}"
-                if context:
-                    full_context += f"\nКонтекст (на что отвечает): {context}"
-                
-                chat_messages = [
-                    SystemMessage(content=system_prompt),
-                    HumanMessage(content=full_context)
-                ]
-                
-                result = await llm._agenerate(chat_messages)
-                response = result.generations[0].message.content
-                
-                import json
-                analysis = json.loads(response)
-                
-                print(f"[DEBUG] Message from {msg.get('author')}: {msg.get('text')[:50]}...")
-                print(f"[DEBUG] AI decision: {analysis}")
-                
-                if analysis.get("action") == "rephrase":
-                    processed_msg = msg.copy()
-                    processed_msg["text"] = analysis["text"]
-                    processed_msg["mentioned"] = analysis.get("mentioned", False)
-                    processed_messages.append(processed_msg)
-                else:
-                    print(f"[DEBUG] Filtered out: {analysis.get('reason', 'No reason')}")
-                    
-            except Exception as e:
-                print(f"[DEBUG] Error analyzing message: {e}")
-                # Keep original message if analysis fails
-                processed_messages.append(msg)
+        llm_before = _llm_request_stats(llm)
+        try:
+            processed_messages = await _analyze_messages(
+                raw_messages,
+                llm,
+                llm_cache,
+                mention_matcher,
+                state.get("custom_filter_rules", []),
+                state.get("analysis_mode", "batch"),
+                state.get("batch_token_budget") or 1500
+            )
+        finally:
+            cache_stats = {}
+            if llm_cache is not None:
+                cache_stats = llm_cache.stats
+                logger.info("LLM cache stats: %s", cache_stats)
+                if owns_cache:
+                    llm_cache.close()
+            llm_stats = _llm_stats_delta(llm_before, _llm_request_stats(llm))
+            logger.info("LLM request stats: %s", llm_stats)
         
-        print(f"[DEBUG] Processed {len(processed_messages)} out of {len(raw_messages)} messages")
+        logger.info("Processed %d out of %d messages", len(processed_messages), len(raw_messages))
         
-        return {"processed_messages": processed_messages}
+        return {
+            "processed_messages": processed_messages,
+            "llm_cache_stats": cache_stats,
+            "llm_stats": llm_stats
+        }
         
     except Exception as e:
-        print(f"[DEBUG] Error in analyze_messages_node: {e}")
+        logger.error("Error in analyze_messages_node: %s", e)
         return {"processed_messages": raw_messages}  # Fallback to original messages
 
 
 async def send_results_node(state: ProcessingState) -> Dict[str, Any]:
     """Send processed messages to target Telegram channel."""
-    print("[DEBUG] Starting send_results_node")
+    logger.debug("Starting send_results_node")
     
     processed_messages = state.get("processed_messages", [])
     target_channel = state.get("target_channel", "infotest")
     mcp_session = state.get("mcp_session")
+    watermarks = state.get("watermarks")
     
     if not processed_messages:
-        print("[DEBUG] No processed messages to send")
+        logger.info("No processed messages to send")
+        if watermarks:
+            # Everything fetched was filtered out, nothing is left to deliver
+            watermarks.advance_from_messages(target_channel, state.get("raw_messages", []))
         return {"error": "No messages to send"}
     
     if not mcp_session:
-        print("[DEBUG] No MCP session available")
+        logger.error("No MCP session available")
         return {"error": "No MCP session available"}
     
     try:
-        # Calculate time period info
-        from datetime import datetime, timezone, timedelta
-        now_msk = datetime.now(timezone(timedelta(hours=3)))
-        
-        # Always show period as "from X to Y" format
-        if state.get("time_period_minutes"):
-            # Custom period
-            start_time = now_msk - timedelta(minutes=state["time_period_minutes"])
-            period_text = f"с {start_time.strftime('%H:%M')} до {now_msk.strftime('%H:%M')} MSK"
-        else:
-            # Default: from 8 AM MSK today
-            today_8am = now_msk.replace(hour=8, minute=0, second=0, microsecond=0)
-            if now_msk < today_8am:
-                # If it's before 8 AM, use yesterday 8 AM
-                today_8am -= timedelta(days=1)
-            period_text = f"с {today_8am.strftime('%H:%M')} до {now_msk.strftime('%H:%M')} MSK"
-        
-        # Get source channel name
-        source_channels = state.get("source_channels", ["BitKogan / Development"])
-        channel_text = ", ".join(source_channels)
+        title = summary_title(
+            state.get("source_channels", ["BitKogan / Development"]),
+            format_period_text(state.get("time_period_minutes"))
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            for msg in processed_messages:
+                logger.debug("Message %s: mentioned=%s", msg.get("id", ""), msg.get("mentioned", False))
+        message_parts = split_summary(processed_messages, title)
+        MESSAGES.inc(len(processed_messages), stage="summarized")
         
-        # Format messages for sending
-        formatted_text = f"Сводка сообщений из {channel_text} {period_text}\n\n"
+        target_chat_id = resolve_target_chat(target_channel)
+        outbox = state.get("outbox")
+        part_ids = None
+        if outbox is not None:
+            # Persisted parts are delivered by the outbox even if sending
+            # fails now, so these messages never need analyzing again
+            part_ids = outbox.enqueue(target_chat_id, message_parts)
+            if watermarks:
+                watermarks.advance_from_messages(target_channel, state.get("raw_messages", []))
         
-        chat_id = 2083014011  # BitKogan / Development group ID for links
-        
-        message_parts = []
-        current_part = formatted_text
+        # All parts go through one paced queue, in order
+        delivery_results = await deliver_parts(
+            outbox, mcp_session.send_queue, target_chat_id, message_parts, part_ids
+        )
+        for delivery in delivery_results:
+            if delivery["ok"]:
+                logger.debug("Successfully sent part %d/%d", delivery["part"], len(message_parts))
+            else:
+                logger.warning(
+                    "Failed to send part %d/%d: %s", delivery["part"], len(message_parts), delivery["error"]
+                )
         
-        for i, msg in enumerate(processed_messages, 1):
-            author = msg.get("author", "Unknown")
-            text = msg.get("text", "")
-            date_str = msg.get("date", "")
-            msg_id = msg.get("id", "")
-            is_mentioned = msg.get("mentioned", False)  # Use AI-determined mention flag
-            
-            mention_prefix = "🔔 " if is_mentioned else ""
-            
-            print(f"[DEBUG] Message {msg_id}: mentioned={is_mentioned} (AI-determined)")
+        failed_count = sum(1 for delivery in delivery_results if not delivery["ok"])
+        if not failed_count:
+            logger.info(
+                "Successfully sent all %d parts with %d messages to %s",
+                len(message_parts), len(processed_messages), target_channel
+            )
+            if watermarks and outbox is None:
+                # Filtered messages were processed too, advance past all fetched ones
+                watermarks.advance_from_messages(target_channel, state.get("raw_messages", []))
+            return {"error": "", "delivery_results": delivery_results}
+        else:
+            error = f"Failed to send {failed_count} out of {len(message_parts)} parts"
+            if outbox is not None:
+                error = (
+                    f"Sent {len(message_parts) - failed_count} out of {len(message_parts)} parts, "
+                    "the rest are queued in the outbox for retry"
+                )
+            return {"error": error, "delivery_results": delivery_results}
             
-            # Convert UTC to MSK and format
-            if date_str:
-                from datetime import datetime, timezone, timedelta
+    except Exception as e:
+        logger.error("Error in send_results_node: %s", e)
+        return {"error": f"Failed to send results: {str(e)}"}
+
+
+async def stream_messages_node(state: ProcessingState) -> Dict[str, Any]:
+    """Fetch, analyze and send messages as one pipeline.
+    
+    Each fetched page goes through a bounded queue to analysis workers, and
+    the analyzed messages are fed in fetch order into an incremental chunker
+    that sends every summary part as soon as it is full. In batch mode a
+    message is passed on as soon as its decision arrives, not once its
+    whole page is analyzed. At most
+    ``stream_queue_size`` pages are in flight, however long the window.
+    """
+    logger.debug("Starting stream_messages_node")
+    started = time.monotonic()
+    
+    telegram_client = state.get("mcp_session")
+    if telegram_client is None:
+        from .telegram_mcp_client import TelegramMCPClient
+        telegram_client = TelegramMCPClient()
+    
+    llm = state.get("llm") or QwenChatModel(
+        max_concurrency=state.get("max_concurrent_llm_requests") or 4
+    )
+    llm_cache = state.get("llm_cache")
+    owns_cache = llm_cache is None and state.get("use_llm_cache", True)
+    if owns_cache:
+        llm_cache = DecisionCache()
+    
+    source_channels = state.get("source_channels", ["BitKogan / Development"])
+    target_channel = state.get("target_channel", "infotest")
+    time_period = state.get("time_period_minutes", 10)
+    watermarks = state.get("watermarks")
+    queue_size = max(1, state.get("stream_queue_size") or 4)
+    worker_count = max(1, state.get("max_concurrent_llm_requests") or 4)
+    
+    fetch_semaphore = asyncio.Semaphore(max(1, state.get("max_concurrent_fetches") or 5))
+    # Pages between fetch and send, including those waiting to be reordered
+    in_flight = asyncio.Semaphore(queue_size + worker_count)
+    fetched_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    analyzed_queue: asyncio.Queue = asyncio.Queue()
+    
+    matcher_task = asyncio.create_task(_load_mention_matcher(telegram_client))
+    hydration_before = dict(getattr(telegram_client, "hydration_stats", {}))
+    replies_before = dict(getattr(telegram_client, "reply_stats", {}))
+    llm_before = _llm_request_stats(llm)
+    
+    fetch_stats = {}
+    newest: Dict[str, Dict] = {}  # Newest fetched message per channel, for watermarks
+    next_page = 0
+    stream_stats = {
+        "fetched": 0, "processed": 0, "parts_sent": 0, "parts_failed": 0,
+        "llm_calls_saved": 0, "first_part_sec": None, "duration_sec": 0.0
+    }
+    
+    async def fetch_channel(channel: str):
+        nonlocal next_page
+        async with fetch_semaphore:
+            channel_started = time.monotonic()
+            count = 0
+            error = ""
+            min_id = watermarks.get_min_id(channel, target_channel) if watermarks else None
+            # Includes waiting for the analysis to take pages when it falls behind
+            with tracing.span("fetch_channel", channel=channel, min_id=min_id or 0) as span:
                 try:
-                    # Parse UTC datetime
-                    utc_dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-                    # Convert to MSK (UTC+3)
-                    msk_dt = utc_dt.astimezone(timezone(timedelta(hours=3)))
-                    date_formatted = msk_dt.strftime("%Y-%m-%d %H:%M MSK")
-                except:
-                    date_formatted = date_str[:16].replace('T', ' ') + " MSK"
-            else:
-                date_formatted = "Unknown MSK"
-            
-            # Create Telegram link
-            link = f"https://t.me/c/{chat_id}/{msg_id}" if msg_id else ""
-            link_text = f" [Ссылка]({link})" if link else ""
+                    async for page in telegram_client.iter_recent_messages(
+                        chat_name=channel,
+                        minutes_back=time_period,
+                        min_id=min_id
+                    ):
+                        for msg in page:
+                            msg.setdefault("channel", channel)
+                            if channel not in newest or int(msg["id"]) > int(newest[channel]["id"]):
+                                newest[channel] = msg
+                        count += len(page)
+                        await in_flight.acquire()
+                        # Number the page before waiting on the queue, other
+                        # channels put pages while this one waits
+                        page_number = next_page
+                        next_page += 1
+                        await fetched_queue.put((page_number, page))
+                except Exception as e:
+                    logger.error("Error fetching channel %s: %s", channel, e)
+                    error = str(e)
+                    span.set_attribute("error", error)
+                    # Older pages of the window were not fetched, keep the
+                    # watermark so the next run fetches them
+                    newest.pop(channel, None)
+                span.set_attribute("messages", count)
+            fetch_stats[channel] = {
+                "channel": channel,
+                "messages": count,
+                "duration_sec": round(time.monotonic() - channel_started, 3),
+                "error": error
+            }
+            stream_stats["fetched"] += count
+            MESSAGES.inc(count, stage="fetched")
+    
+    async def produce():
+        await asyncio.gather(*[fetch_channel(channel) for channel in source_channels])
+        for _ in range(worker_count):
+            await fetched_queue.put(None)
+    
+    prefilter = None
+    mode = state.get("analysis_mode", "batch")
+    budget = state.get("batch_token_budget") or 1500
+    
+    async def analyze_worker():
+        nonlocal prefilter
+        mention_matcher = await matcher_task
+        if prefilter is None and state.get("use_prefilter", True):
+            # One instance for the whole run, so duplicates across pages are caught
+            prefilter = Prefilter(state.get("prefilter_rules"), mention_matcher)
+        while True:
+            item = await fetched_queue.get()
+            if item is None:
+                await analyzed_queue.put(None)
+                return
+            page_number, page = item
+            candidates = page
+            if prefilter is not None:
+                candidates, dropped = prefilter.apply(page)
+                MESSAGES.inc(len(dropped), stage="prefiltered")
+                stream_stats["llm_calls_saved"] += (
+                    _estimate_llm_calls(page, mode, budget) - _estimate_llm_calls(candidates, mode, budget)
+                )
+            decided = set()
             
-            message_entry = f"{mention_prefix}{i}. **{author}** ({date_formatted}):\n{text}{link_text}\n\n"
+            def on_message(index: int, processed: Optional[Dict]):
+                # Passed on at once, the sender does not wait for the whole page
+                decided.add(index)
+                analyzed_queue.put_nowait((page_number, index, processed))
             
-            # Check if adding this message would exceed Telegram's limit (4096 chars)
-            if len(current_part + message_entry) > 4000:  # Leave some margin
-                message_parts.append(current_part.strip())
-                current_part = f"Сводка сообщений из {channel_text} {period_text} (продолжение)\n\n" + message_entry
+            try:
+                if candidates:
+                    await _analyze_messages(
+                        candidates,
+                        llm,
+                        llm_cache,
+                        mention_matcher,
+                        state.get("custom_filter_rules", []),
+                        mode,
+                        budget,
+                        on_message
+                    )
+            except Exception as e:
+                logger.error("Error analyzing page %d: %s", page_number, e)
+                # Fallback to original messages
+                for index, msg in enumerate(candidates):
+                    if index not in decided:
+                        on_message(index, msg)
+            # The page is complete
+            await analyzed_queue.put((page_number, None, None))
+    
+    target_chat_id = resolve_target_chat(target_channel)
+    chunker = SummaryChunker(summary_title(source_channels, format_period_text(time_period)))
+    
+    delivery_results = []
+    outbox = state.get("outbox")
+    batch_id = outbox.new_batch_id() if outbox is not None else None
+    
+    async def send_part(part_text: str, labeled: bool = True):
+        part_number = len(delivery_results) + 1
+        if labeled:
+            part_text = f"Часть {part_number}\n\n{part_text}"
+        if outbox is None:
+            delivery = await telegram_client.send_queue.send(target_chat_id, part_text, part=part_number)
+        else:
+            part_ids = outbox.enqueue(target_chat_id, [part_text], batch_id, first_part=part_number)
+            if stream_stats["parts_failed"]:
+                # The drainer delivers the rest of the summary in order
+                outbox.release(part_ids)
+                delivery = deferred_result(target_chat_id, part_number)
             else:
-                current_part += message_entry
-        
-        # Add the last part
-        if current_part.strip():
-            message_parts.append(current_part.strip())
-        
-        # Send all parts
-        target_chat_id = 2514401938 if target_channel == "infotest" else target_channel
-        success_count = 0
-        
-        for part_num, part_text in enumerate(message_parts, 1):
-            if len(message_parts) > 1:
-                part_header = f"Часть {part_num}/{len(message_parts)}\n\n"
-                part_text = part_header + part_text
-            
-            success = await mcp_session.send_message_to_channel(target_chat_id, part_text)
-            if success:
-                success_count += 1
-                print(f"[DEBUG] Successfully sent part {part_num}/{len(message_parts)}")
+                delivery = (await deliver_parts(
+                    outbox, telegram_client.send_queue, target_chat_id, [part_text], part_ids, part_number
+                ))[0]
+        delivery_results.append(delivery)
+        if delivery["ok"]:
+            stream_stats["parts_sent"] += 1
+            if stream_stats["first_part_sec"] is None:
+                stream_stats["first_part_sec"] = round(time.monotonic() - started, 3)
+            logger.info("Streamed part %d to %s", part_number, target_channel)
+        else:
+            stream_stats["parts_failed"] += 1
+            logger.warning("Failed to send part %d: %s", part_number, delivery["error"])
+    
+    async def send():
+        # Analyzed messages of each page by index, None if filtered out
+        pending: Dict[int, Dict[int, Optional[Dict]]] = {}
+        complete = set()
+        next_to_send = 0
+        next_message = 0
+        finished_workers = 0
+        while finished_workers < worker_count:
+            item = await analyzed_queue.get()
+            if item is None:
+                finished_workers += 1
+                continue
+            page_number, index, processed = item
+            if index is None:
+                complete.add(page_number)
             else:
-                print(f"[DEBUG] Failed to send part {part_num}/{len(message_parts)}")
+                pending.setdefault(page_number, {})[index] = processed
+            # Keep fetch order, whichever worker finishes first; within a
+            # page a message goes on once every earlier one is decided
+            while True:
+                decided = pending.get(next_to_send, {})
+                while next_message in decided:
+                    msg = decided.pop(next_message)
+                    next_message += 1
+                    if msg is None:
+                        continue
+                    stream_stats["processed"] += 1
+                    for part in chunker.add(msg):
+                        # A full part always has a continuation after it
+                        await send_part(part)
+                if next_to_send not in complete:
+                    break
+                complete.discard(next_to_send)
+                pending.pop(next_to_send, None)
+                next_to_send += 1
+                next_message = 0
+                in_flight.release()
         
-        if success_count == len(message_parts):
-            print(f"[DEBUG] Successfully sent all {len(message_parts)} parts with {len(processed_messages)} messages to {target_channel}")
-            return {"error": ""}
-        else:
-            return {"error": f"Failed to send {len(message_parts) - success_count} out of {len(message_parts)} parts"}
-            
+        last_part = chunker.finish()
+        if last_part is not None:
+            await send_part(last_part, labeled=chunker.parts > 1)
+    
+    tasks = [
+        asyncio.create_task(produce()),
+        *[asyncio.create_task(analyze_worker()) for _ in range(worker_count)],
+        asyncio.create_task(send())
+    ]
+    try:
+        await asyncio.gather(*tasks)
     except Exception as e:
-        print(f"[DEBUG] Error in send_results_node: {e}")
-        return {"error": f"Failed to send results: {str(e)}"}
+        for task in tasks:
+            task.cancel()
+        logger.error("Error in stream_messages_node: %s", e)
+        return {"error": f"Failed to stream messages: {str(e)}", "mcp_session": telegram_client}
+    finally:
+        if llm_cache is not None:
+            logger.info("LLM cache stats: %s", llm_cache.stats)
+            if owns_cache:
+                llm_cache.close()
+    
+    stream_stats["duration_sec"] = round(time.monotonic() - started, 3)
+    MESSAGES.inc(stream_stats["processed"], stage="summarized")
+    logger.info("Stream stats: %s", stream_stats)
+    
+    result = {
+        "fetch_stats": [fetch_stats[channel] for channel in source_channels if channel in fetch_stats],
+        "hydration_stats": _stats_delta(hydration_before, getattr(telegram_client, "hydration_stats", {})),
+        "reply_stats": _stats_delta(replies_before, getattr(telegram_client, "reply_stats", {})),
+        "llm_cache_stats": llm_cache.stats if llm_cache is not None else {},
+        "llm_stats": _llm_stats_delta(llm_before, _llm_request_stats(llm)),
+        "stream_stats": stream_stats,
+        "delivery_results": delivery_results,
+        "prefilter_stats": {
+            **prefilter.stats, "llm_calls_saved": stream_stats["llm_calls_saved"]
+        } if prefilter is not None else {},
+        "mcp_session": telegram_client,
+        "error": ""
+    }
+    
+    failed = [stats for stats in result["fetch_stats"] if stats["error"]]
+    if failed and len(failed) == len(result["fetch_stats"]):
+        result["error"] = "Failed to fetch messages: " + "; ".join(
+            f"{stats['channel']}: {stats['error']}" for stats in failed
+        )
+    elif stream_stats["parts_failed"]:
+        total = stream_stats["parts_sent"] + stream_stats["parts_failed"]
+        result["error"] = f"Failed to send {stream_stats['parts_failed']} out of {total} parts"
+        if outbox is not None:
+            result["error"] = (
+                f"Sent {stream_stats['parts_sent']} out of {total} parts, "
+                "the rest are queued in the outbox for retry"
+            )
+            if watermarks:
+                # Every part is persisted, the outbox finishes the delivery
+                watermarks.advance_from_messages(target_channel, list(newest.values()))
+    else:
+        if not stream_stats["processed"]:
+            logger.info("No processed messages to send")
+            result["error"] = "No messages to send"
+        if watermarks:
+            # Filtered messages were processed too, advance past all fetched ones
+            watermarks.advance_from_messages(target_channel, list(newest.values()))
+    
+    return result
+
 
+def _instrumented(
+    name: str,
+    node: Callable[[ProcessingState], Awaitable[Dict[str, Any]]]
+) -> Callable[[ProcessingState], Awaitable[Dict[str, Any]]]:
+    """Wrap a node to record its duration and outcome in the metrics and a trace span."""
+    @functools.wraps(node)
+    async def run(state: ProcessingState) -> Dict[str, Any]:
+        status = "exception"
+        try:
+            with tracing.span(name, node=name) as span, WORKFLOW_NODE_SECONDS.time(node=name):
+                result = await node(state)
+                if result.get("error"):
+                    span.set_attribute("error", result["error"])
+            status = "error" if result.get("error") else "ok"
+            return result
+        finally:
+            WORKFLOW_NODE_RUNS.inc(node=name, status=status)
+    return run
 
-def create_processing_workflow():
-    """Create the LangGraph workflow for message processing."""
+
+def create_processing_workflow(streaming: bool = False):
+    """Create the LangGraph workflow for message processing.
+    
+    With ``streaming`` the three stages run as one pipelined node, so the
+    first summary parts are sent while older messages are still processed.
+    """
     
     workflow = StateGraph(ProcessingState)
     
+    if streaming:
+        workflow.add_node("stream_messages", _instrumented("stream_messages", stream_messages_node))
+        workflow.set_entry_point("stream_messages")
+        workflow.add_edge("stream_messages", END)
+        return workflow.compile()
+    
     # Add nodes
-    workflow.add_node("fetch_messages", fetch_messages_from_channels_node)
-    workflow.add_node("analyze_messages", analyze_messages_node)
-    workflow.add_node("send_results", send_results_node)
+    workflow.add_node("fetch_messages", _instrumented("fetch_messages", fetch_messages_from_channels_node))
+    workflow.add_node("prefilter_messages", _instrumented("prefilter_messages", prefilter_messages_node))
+    workflow.add_node("analyze_messages", _instrumented("analyze_messages", analyze_messages_node))
+    workflow.add_node("send_results", _instrumented("send_results", send_results_node))
     
     # Define the flow
     workflow.set_entry_point("fetch_messages")
-    workflow.add_edge("fetch_messages", "analyze_messages")
+    workflow.add_edge("fetch_messages", "prefilter_messages")
+    workflow.add_edge("prefilter_messages", "analyze_messages")
     workflow.add_edge("analyze_messages", "send_results")
     workflow.add_edge("send_results", END)
     
@@ -305,9 +838,33 @@ async def run_processing_workflow(
     source_channels: List[str] = None,
     time_period_minutes: int = None,  # None = from 8 AM MSK today
     target_channel: str = "infotest",
-    custom_filter_rules: List[str] = None
+    custom_filter_rules: List[str] = None,
+    telegram_client: Any = None,
+    max_concurrent_fetches: int = 5,
+    analysis_mode: str = "batch",
+    batch_token_budget: int = 1500,
+    max_concurrent_llm_requests: int = 4,
+    llm: QwenChatModel = None,
+    llm_cache: DecisionCache = None,
+    use_llm_cache: bool = True,
+    watermarks: WatermarkStore = None,
+    use_watermarks: bool = True,
+    streaming: bool = False,
+    stream_queue_size: int = 4,
+    use_prefilter: bool = True,
+    prefilter_rules: Dict[str, Any] = None,
+    outbox: Outbox = None,
+    use_outbox: bool = True
 ) -> str:
-    """Run the complete message processing workflow."""
+    """Run the complete message processing workflow.
+    
+    Pass a long-lived ``telegram_client`` and ``llm`` to keep one warm MCP
+    session and one pooled Qwen HTTP client across runs; otherwise they are
+    created for this run and closed afterwards. ``streaming`` sends summary
+    parts while messages are still being fetched and analyzed. Parts are
+    persisted in the ``outbox`` before sending, so undelivered ones are
+    retried by ``OutboxDrainer`` without analyzing the messages again.
+    """
     
     if source_channels is None:
         source_channels = ["BitKogan / Development"]
@@ -321,7 +878,23 @@ async def run_processing_workflow(
             today_8am -= timedelta(days=1)
         time_period_minutes = int((now_msk - today_8am).total_seconds() / 60)
     
-    workflow = create_processing_workflow()
+    owns_client = telegram_client is None
+    if owns_client:
+        from .telegram_mcp_client import TelegramMCPClient
+        telegram_client = TelegramMCPClient()
+    
+    if watermarks is None and use_watermarks:
+        watermarks = WatermarkStore()
+    
+    owns_outbox = outbox is None and use_outbox
+    if owns_outbox:
+        outbox = Outbox()
+    
+    owns_llm = llm is None
+    if owns_llm:
+        llm = QwenChatModel(max_concurrency=max_concurrent_llm_requests)
+    
+    workflow = create_processing_workflow(streaming)
     
     initial_state: ProcessingState = {
         "source_channels": source_channels,
@@ -330,14 +903,54 @@ async def run_processing_workflow(
         "raw_messages": [],
         "processed_messages": [],
         "error": "",
-        "mcp_session": None,
-        "custom_filter_rules": custom_filter_rules or []
+        "mcp_session": telegram_client,
+        "custom_filter_rules": custom_filter_rules or [],
+        "max_concurrent_fetches": max_concurrent_fetches,
+        "fetch_stats": [],
+        "llm_stats": {},
+        "analysis_mode": analysis_mode,
+        "batch_token_budget": batch_token_budget,
+        "max_concurrent_llm_requests": max_concurrent_llm_requests,
+        "llm": llm,
+        "llm_cache": llm_cache if use_llm_cache else None,
+        "use_llm_cache": use_llm_cache,
+        "watermarks": watermarks if use_watermarks else None,
+        "mention_matcher": None,
+        "stream_queue_size": stream_queue_size,
+        "stream_stats": {},
+        "use_prefilter": use_prefilter,
+        "prefilter_rules": prefilter_rules or {},
+        "prefiltered_messages": None,
+        "prefilter_stats": {},
+        "delivery_results": [],
+        "outbox": outbox if use_outbox else None
     }
     
-    result = await workflow.ainvoke(initial_state)
+    try:
+        with tracing.span(
+            "run_processing_workflow",
+            source_channels=source_channels,
+            target_channel=target_channel,
+            streaming=streaming,
+            analysis_mode=analysis_mode,
+        ) as span:
+            result = await workflow.ainvoke(initial_state)
+            span.set_attributes(
+                messages=sum(stats["messages"] for stats in result.get("fetch_stats") or []),
+                parts=len(result.get("delivery_results") or []),
+            )
+    finally:
+        if owns_client:
+            await telegram_client.close()
+        if owns_llm:
+            await llm.qwen_client.aclose()
+        if owns_outbox:
+            outbox.close()
     
     if result.get("error"):
         return f"Error: {result['error']}"
     
     processed_count = len(result.get("processed_messages", []))
+    if streaming:
+        processed_count = result.get("stream_stats", {}).get("processed", 0)
     return f"Successfully processed and sent {processed_count} messages"
@@ -2,6 +2,7 @@
 """Test script for MCP Telegram client."""
 
 import asyncio
+import logging
 from src.telegram_mcp_client import TelegramMCPClient
 
 
@@ -31,4 +32,5 @@ async def test_mcp_client():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(test_mcp_client())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Regression tests for outbox delivery, with a fake send queue."""
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+from src.outbox import Outbox, OutboxDrainer, deliver_parts
+
+
+class SlowSendQueue:
+    """Takes ``delay`` seconds per send, one at a time, like a paced chat.
+
+    Parts whose text is in ``fail_once`` fail on their first send.
+    """
+
+    def __init__(self, delay: float, fail_once=()):
+        self.delay = delay
+        self.fail_once = set(fail_once)
+        self.sent = []
+        self._lock = asyncio.Lock()
+
+    async def send(self, chat_id, message, part=None):
+        async with self._lock:
+            await asyncio.sleep(self.delay)
+            ok = message not in self.fail_once
+            self.fail_once.discard(message)
+            if ok:
+                self.sent.append(message)
+            return {
+                "part": part, "chat_id": chat_id, "ok": ok, "attempts": 1,
+                "flood_wait_sec": 0.0, "duration_sec": self.delay, "error": "" if ok else "FLOOD",
+                "maybe_sent": False
+            }
+
+
+def make_outbox() -> Outbox:
+    return Outbox(Path(tempfile.mkdtemp()) / "outbox.sqlite3", base_delay=0.1, max_delay=0.1)
+
+
+async def deliver_with_drainer(outbox: Outbox, send_queue: SlowSendQueue, parts):
+    drainer = OutboxDrainer(outbox, send_queue, interval=0.05)
+    part_ids = outbox.enqueue(1, parts)
+    drainer.start()
+    results = await deliver_parts(outbox, send_queue, 1, parts, part_ids)
+    # Let the drainer retry whatever was left to it
+    for _ in range(100):
+        if not outbox.stats["pending"]:
+            break
+        await asyncio.sleep(0.05)
+    await drainer.stop()
+    return results
+
+
+def test_slow_sends_are_not_sent_twice_by_the_drainer():
+    outbox = make_outbox()
+    send_queue = SlowSendQueue(delay=0.3)
+    parts = [f"p{i}" for i in range(5)]
+    results = asyncio.run(deliver_with_drainer(outbox, send_queue, parts))
+    assert send_queue.sent == parts
+    assert all(result["ok"] for result in results)
+    assert outbox.stats == {"sending": 0, "pending": 0, "sent": 5, "dead": 0}
+
+
+def test_parts_after_a_failure_are_delivered_once_in_order():
+    outbox = make_outbox()
+    send_queue = SlowSendQueue(delay=0.01, fail_once={"p1"})
+    parts = [f"p{i}" for i in range(5)]
+    results = asyncio.run(deliver_with_drainer(outbox, send_queue, parts))
+    assert [result["ok"] for result in results] == [True, False, False, False, False]
+    assert send_queue.sent == parts
+    assert outbox.stats["sent"] == 5
+
+
+def test_claims_of_a_dead_process_are_taken_over():
+    outbox = make_outbox()
+    outbox.enqueue(1, ["p0", "p1"])
+    outbox.close()
+
+    async def restart():
+        send_queue = SlowSendQueue(delay=0.01)
+        drainer = OutboxDrainer(Outbox(outbox.path), send_queue, interval=0.05)
+        drainer.start()
+        await asyncio.sleep(0.3)
+        await drainer.stop()
+        return send_queue.sent
+
+    assert asyncio.run(restart()) == ["p0", "p1"]
+
+
+if __name__ == "__main__":
+    test_slow_sends_are_not_sent_twice_by_the_drainer()
+    test_parts_after_a_failure_are_delivered_once_in_order()
+    test_claims_of_a_dead_process_are_taken_over()
+    print("OK")
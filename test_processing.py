@@ -2,6 +2,7 @@
 """Test script for the new message processing workflow."""
 
 import asyncio
+import logging
 from src.workflow import run_processing_workflow
 
 
@@ -19,4 +20,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(main())
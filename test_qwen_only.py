@@ -2,6 +2,7 @@
 """Test script for Qwen API only."""
 
 import asyncio
+import logging
 from src.qwen_client import QwenClient
 
 
@@ -35,4 +36,5 @@ async def test_qwen_api():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(test_qwen_api())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Regression tests for the Qwen client's circuit breaker, with stubbed attempts."""
+
+import asyncio
+import time
+
+import httpx
+
+from src.qwen_client import QwenClient
+from src.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+def http_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.invalid/v1/chat/completions")
+    return httpx.HTTPStatusError(
+        f"HTTP {status}", request=request, response=httpx.Response(status, request=request)
+    )
+
+
+class StubAttempts:
+    """Raise the HTTP errors in ``statuses`` in turn, then answer.
+
+    Like ``QwenClient._attempt``, an answer is recorded as a success.
+    """
+
+    def __init__(self, client: QwenClient, *statuses: int):
+        self.client = client
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.statuses:
+            raise http_error(self.statuses.pop(0))
+        self.client.circuit_breaker.record_success()
+        return {"choices": []}
+
+
+def make_client(max_attempts: int = 1) -> QwenClient:
+    return QwenClient(
+        creds_path="/nonexistent/oauth_creds.json",
+        retry_policy=RetryPolicy(max_attempts=max_attempts, base_delay=0.01),
+        circuit_breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1),
+    )
+
+
+async def open_breaker(client: QwenClient):
+    try:
+        # A retry, if any, is rejected by the breaker it opened
+        await client._with_retries(StubAttempts(client, 503))
+    except (httpx.HTTPStatusError, CircuitOpenError):
+        pass
+    assert client.circuit_breaker.state == CircuitBreaker.OPEN
+    stub = StubAttempts(client)
+    try:
+        await client._with_retries(stub)
+    except CircuitOpenError:
+        pass
+    assert stub.calls == 0
+    time.sleep(client.circuit_breaker.reset_timeout)
+
+
+def test_throttled_probe_lets_the_next_call_probe():
+    client = make_client()
+
+    async def scenario():
+        await open_breaker(client)
+        try:
+            await client._with_retries(StubAttempts(client, 429))
+        except httpx.HTTPStatusError:
+            pass
+        stub = StubAttempts(client)
+        assert await client._with_retries(stub) == {"choices": []}
+        assert stub.calls == 1
+
+    asyncio.run(scenario())
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_throttled_probe_is_retried():
+    client = make_client(max_attempts=2)
+
+    async def scenario():
+        await open_breaker(client)
+        stub = StubAttempts(client, 429)
+        assert await client._with_retries(stub) == {"choices": []}
+        assert stub.calls == 2
+
+    asyncio.run(scenario())
+    assert client.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+if __name__ == "__main__":
+    test_throttled_probe_lets_the_next_call_probe()
+    test_throttled_probe_is_retried()
+    print("OK")
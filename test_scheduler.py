@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Regression tests for the job scheduler timing."""
+
+import asyncio
+import time
+
+from src.scheduler import AsyncScheduler, IntervalTrigger
+
+
+def run_for(scheduler: AsyncScheduler, seconds: float):
+    async def main():
+        asyncio.get_running_loop().call_later(seconds, scheduler.stop)
+        await scheduler.run()
+    asyncio.run(main())
+
+
+def test_jitter_does_not_shift_the_schedule():
+    scheduler = AsyncScheduler()
+    scheduled = []
+
+    async def record():
+        # The timer has already scheduled the following run
+        scheduled.append(job.next_run)
+
+    job = scheduler.add_job("tick", record, IntervalTrigger(seconds=0.2), jitter_seconds=0.1)
+    run_for(scheduler, 1.1)
+    assert len(scheduled) >= 4
+    # Every run is due one interval after the previous one, however late it fired
+    for earlier, later in zip(scheduled, scheduled[1:]):
+        assert later - earlier == IntervalTrigger(seconds=0.2).interval
+
+
+def test_missed_intervals_are_not_replayed():
+    scheduler = AsyncScheduler()
+    runs = []
+
+    async def block_the_loop():
+        runs.append(job.next_run)
+        if len(runs) == 1:
+            time.sleep(0.5)
+
+    job = scheduler.add_job("tick", block_the_loop, IntervalTrigger(seconds=0.1))
+    run_for(scheduler, 0.85)
+    # The blocked 0.5s held back about four ticks, none of them runs late
+    assert 3 <= len(runs) <= 5
+
+
+if __name__ == "__main__":
+    test_jitter_does_not_shift_the_schedule()
+    test_missed_intervals_are_not_replayed()
+    print("OK")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Regression tests for sends cut off by a lost MCP session, with fake sessions."""
+
+import asyncio
+import tempfile
+from pathlib import Path
+
+from mcp import StdioServerParameters
+
+from src.mcp_session import MCPSessionManager, UnknownOutcomeError
+from src.outbox import Outbox, OutboxDrainer, deliver_parts
+from src.send_queue import SendQueue
+
+
+class DyingSession:
+    """Carries out every call, then loses the connection before answering."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def call_tool(self, name, arguments):
+        self.calls.append(name)
+        raise ConnectionError("server exited")
+
+
+class DeadServerManager(MCPSessionManager):
+    """Hands out the same session and reports the server dead."""
+
+    def __init__(self):
+        super().__init__(StdioServerParameters(command="true"))
+        self.session = DyingSession()
+
+    async def get_session(self):
+        self._session = self.session
+        return self.session
+
+    async def _ping(self, session):
+        return False
+
+
+class FakeChatDirectory:
+    async def resolve(self, chat_id):
+        return {"id": 1}
+
+
+class LostSessionClient:
+    """Fails every send after it reached the server."""
+
+    def __init__(self):
+        self.chat_directory = FakeChatDirectory()
+        self.sends = 0
+
+    async def call_tool(self, name, arguments=None, idempotent=True):
+        self.sends += 1
+        raise UnknownOutcomeError(f"'{name}' failed after it was sent, it may have taken effect")
+
+
+def test_only_idempotent_calls_are_replayed_after_a_reconnect():
+    manager = DeadServerManager()
+
+    async def call(name, idempotent):
+        try:
+            await manager.call_tool(name, {}, idempotent=idempotent)
+        except Exception as e:
+            return type(e)
+
+    assert asyncio.run(call("send_message", idempotent=False)) is UnknownOutcomeError
+    assert manager.session.calls == ["send_message"]
+    assert asyncio.run(call("get_messages", idempotent=True)) is ConnectionError
+    assert manager.session.calls == ["send_message", "get_messages", "get_messages"]
+
+
+def test_send_cut_off_by_a_lost_session_is_not_repeated():
+    client = LostSessionClient()
+    send_queue = SendQueue(client, messages_per_minute=6000)
+    outbox = Outbox(Path(tempfile.mkdtemp()) / "outbox.sqlite3", base_delay=0.01, max_delay=0.01)
+
+    async def deliver():
+        drainer = OutboxDrainer(outbox, send_queue, interval=0.05)
+        drainer.start()
+        results = await deliver_parts(outbox, send_queue, 1, ["p0"], outbox.enqueue(1, ["p0"]))
+        await asyncio.sleep(0.3)
+        await drainer.stop()
+        return results
+
+    results = asyncio.run(deliver())
+    assert results[0]["maybe_sent"] and results[0]["attempts"] == 1
+    assert client.sends == 1
+    assert outbox.stats["dead"] == 1
+
+
+if __name__ == "__main__":
+    test_only_idempotent_calls_are_replayed_after_a_reconnect()
+    test_send_cut_off_by_a_lost_session_is_not_repeated()
+    print("OK")
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Regression tests for the streaming pipeline, with fake Telegram and Qwen clients."""
+
+import asyncio
+import json
+import os
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("BOT_CACHE_DIR", tempfile.mkdtemp())
+
+from src.analysis import analyze_batch
+from src.qwen_client import QwenClient
+from src.qwen_langchain import QwenChatModel
+from src.watermarks import WatermarkStore
+from src.workflow import stream_messages_node
+
+
+class FakeQwenClient(QwenClient):
+    """Answers every batch by rephrasing each message unchanged."""
+
+    async def chat_completion(self, messages, **kwargs):
+        items = json.loads(messages[-1]["content"])
+        decisions = [
+            {"id": item["id"], "action": "rephrase", "text": item["text"], "mentioned": False}
+            for item in items
+        ]
+        return {"choices": [{"message": {"content": json.dumps(decisions)}}]}
+
+
+class HalfwayStreamingModel:
+    """Streams a batch answer of two decisions, noting what was decided in between."""
+
+    streaming = True
+    max_tokens = 100
+
+    def __init__(self):
+        self.decided = []
+        self.decided_mid_answer = None
+
+    async def _astream(self, messages, **kwargs):
+        yield SimpleNamespace(message=SimpleNamespace(
+            content='[{"id": 1, "action": "rephrase", "text": "first", "mentioned": false},'
+        ))
+        self.decided_mid_answer = list(self.decided)
+        yield SimpleNamespace(message=SimpleNamespace(content='{"id": 2, "action": "filter", "reason": "noise"}]'))
+
+
+class SlowIdentity:
+    async def get_matcher(self):
+        # Analysis starts late, so fetchers pile up on the full queue
+        await asyncio.sleep(0.2)
+        from src.identity import MentionMatcher
+        return MentionMatcher()
+
+
+class FakeSendQueue:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, chat_id, message, part=None):
+        self.sent.append(message)
+        return {
+            "part": part, "chat_id": chat_id, "ok": True, "attempts": 1,
+            "flood_wait_sec": 0.0, "duration_sec": 0.0, "error": "",
+            "maybe_sent": False
+        }
+
+
+class FakeTelegramClient:
+    """Serves ``pages_per_channel`` pages of 5 messages for every channel.
+
+    A channel listed in ``fail_after_first_page`` raises after its first page.
+    """
+
+    def __init__(self, pages_per_channel: int = 4, fail_after_first_page=()):
+        self.pages_per_channel = pages_per_channel
+        self.fail_after_first_page = set(fail_after_first_page)
+        self.identity = SlowIdentity()
+        self.send_queue = FakeSendQueue()
+
+    async def iter_recent_messages(self, chat_name, minutes_back=None, min_id=None):
+        base = 1000 * (int(chat_name[-1]) + 1)
+        for page in range(self.pages_per_channel):
+            if page and chat_name in self.fail_after_first_page:
+                raise RuntimeError("connection lost")
+            await asyncio.sleep(0)
+            # Newest first, as get_messages returns them
+            first = base + 100 - page * 5
+            yield [
+                {"id": first - i, "author": "A", "date": "2025-12-12T08:03:16+00:00", "text": f"message {first - i}"}
+                for i in range(5)
+            ]
+
+
+def make_state(client, watermarks=None, **overrides):
+    state = {
+        "source_channels": ["channel-0", "channel-1", "channel-2"],
+        "time_period_minutes": 60,
+        "target_channel": "infotest",
+        "mcp_session": client,
+        "custom_filter_rules": [],
+        "llm": QwenChatModel(qwen_client=FakeQwenClient(), streaming=False),
+        "llm_cache": None,
+        "use_llm_cache": False,
+        "watermarks": watermarks,
+        "use_prefilter": False,
+        "stream_queue_size": 1,
+        # Room for several pages in flight, so fetchers wait on the queue together
+        "max_concurrent_llm_requests": 4,
+        "max_concurrent_fetches": 3,
+        "analysis_mode": "batch",
+        "outbox": None,
+    }
+    state.update(overrides)
+    return state
+
+
+def test_pages_of_concurrent_channels_get_unique_numbers():
+    client = FakeTelegramClient()
+    result = asyncio.run(asyncio.wait_for(stream_messages_node(make_state(client)), timeout=10))
+    assert result["error"] == ""
+    assert result["stream_stats"]["processed"] == 3 * 4 * 5
+    summary = "\n".join(client.send_queue.sent)
+    for channel in range(3):
+        for page in range(4):
+            assert f"message {1000 * (channel + 1) + 100 - page * 5}" in summary
+
+
+def test_failed_channel_keeps_its_watermark():
+    client = FakeTelegramClient(fail_after_first_page={"channel-1"})
+    watermarks = WatermarkStore(Path(tempfile.mkdtemp()) / "watermarks.json")
+    result = asyncio.run(asyncio.wait_for(
+        stream_messages_node(make_state(client, watermarks)), timeout=10
+    ))
+    assert [stats["channel"] for stats in result["fetch_stats"] if stats["error"]] == ["channel-1"]
+    assert watermarks.get_min_id("channel-0", "infotest") == 1100
+    assert watermarks.get_min_id("channel-1", "infotest") is None
+    assert watermarks.get_min_id("channel-2", "infotest") == 3100
+
+
+def test_batch_decisions_are_passed_on_as_they_arrive():
+    llm = HalfwayStreamingModel()
+    messages = [{"id": 10, "text": "first"}, {"id": 11, "text": "second"}]
+    decisions = asyncio.run(analyze_batch(
+        llm, "batch prompt", "single prompt", messages, lambda index, analysis: llm.decided.append(index)
+    ))
+    assert llm.decided_mid_answer == [0]
+    assert llm.decided == [0, 1]
+    assert [analysis["action"] for analysis in decisions] == ["rephrase", "filter"]
+
+
+if __name__ == "__main__":
+    test_pages_of_concurrent_channels_get_unique_numbers()
+    test_failed_channel_keeps_its_watermark()
+    test_batch_decisions_are_passed_on_as_they_arrive()
+    print("OK")
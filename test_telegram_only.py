@@ -2,6 +2,7 @@
 """Test script for Telegram MCP only."""
 
 import asyncio
+import logging
 from src.telegram_mcp import TelegramMCPClient
 
 
@@ -31,4 +32,5 @@ async def test_telegram_mcp():
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
     asyncio.run(test_telegram_mcp())